@@ -1,7 +1,9 @@
 import os
 from dotenv import load_dotenv
 from datetime import datetime
+import threading
 import traceback
+import time
 import plotly.graph_objects as go
 import pandas as pd
 import streamlit.components.v1 as components
@@ -186,8 +188,9 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
 from config.settings import validate_api_keys, rag_memory
-from app.rag_utils import VectorStore
+from app.rag_utils import get_vector_store
 from app.fetch_news import fetch_news
+from app.analysis_cache import get_analysis_cache
 from app.analyze_news import NewsAnalyzer
 from app.stock_news import fetch_stock_news, get_stock_info, DEFAULT_TICKERS
 
@@ -196,8 +199,12 @@ if not validate_api_keys():
     st.warning("⚠️ Please configure your API keys to continue")
     st.stop()
 
-# Initialize vector store
-vector_store = VectorStore()
+# Shared across reruns and sessions; only reloaded when the index changes on disk
+try:
+    vector_store = get_vector_store()
+except Exception as e:
+    print(f"[App] Vector store unavailable: {str(e)}")
+    vector_store = None
 
 # Custom CSS
 st.markdown("""
@@ -253,11 +260,33 @@ with st.sidebar:
     with col3:
         st.markdown("Vector Store:")
     with col4:
-        if vector_store and hasattr(vector_store, 'index'):
+        if vector_store is not None:
             st.success("✓ Ready")
         else:
             st.warning("⚠ Not Initialized")
-    
+
+    if vector_store is not None and vector_store.embedding_cache is not None:
+        cache_stats = vector_store.embedding_cache.stats()
+        st.caption(
+            f"Embedding cache: {cache_stats['hit_rate']:.0%} hit rate "
+            f"({cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+            f"{cache_stats['entries']}/{cache_stats['capacity']} entries)"
+        )
+    analysis_cache = get_analysis_cache()
+    if analysis_cache is not None:
+        cache_stats = analysis_cache.stats()
+        st.caption(
+            f"Analysis cache: {cache_stats['hit_rate']:.0%} hit rate "
+            f"({cache_stats['hits']} hits / {cache_stats['misses']} misses, "
+            f"{cache_stats['entries']}/{cache_stats['capacity']} entries)"
+        )
+    if vector_store is not None:
+        memory = vector_store.memory_stats()
+        st.caption(
+            f"Index: {memory['index_type']} / {memory['compression']}, "
+            f"{memory['documents']} docs, {memory['bytes_per_doc'] / 1024:.1f} KB per doc"
+        )
+
     st.markdown("---")
     
     # Theme selection
@@ -381,27 +410,49 @@ with tab1:
                 analyzer = NewsAnalyzer()
                 # Combine domain and context for better analysis
                 business_context = f"{domain} - {context}" if context else domain
-                results = analyzer.analyze_articles(
-                    st.session_state.selected_articles,
-                    business_context=business_context  # Pass the combined context
-                )
-                
+                selected = st.session_state.selected_articles
+
+                # One panel per article, filled in as its analysis streams in
+                panels = []
+                for article in selected:
+                    with st.expander(f"📝 Analysis for: {article.get('title', 'Untitled')}", expanded=True):
+                        panels.append((st.empty(), st.container()))
+                texts = [""] * len(selected)
+                rendered_at = [0.0] * len(selected)
+                results = [None] * len(selected)
+
+                for event in analyzer.stream_articles(selected, business_context=business_context):
+                    idx = event['index']
+                    body, footer = panels[idx]
+                    if event['type'] == 'delta':
+                        texts[idx] += event['text']
+                        if time.monotonic() - rendered_at[idx] >= 0.1:  # re-render at most 10 times a second
+                            body.markdown(texts[idx])
+                            rendered_at[idx] = time.monotonic()
+                        continue
+
+                    result, metrics = event['result'], event['metrics']
+                    results[idx] = result
+                    if 'error' in result:
+                        body.error(result['error'])
+                        continue
+                    # Display the raw analysis text
+                    body.markdown(result['analysis'])
+                    if 'extraction_error' in result:
+                        footer.warning(result['extraction_error'])
+
+                    # Show metadata
+                    footer.info(f"Source: {result['source']}")
+                    if result['analysis_file']:
+                        footer.success(f"Analysis saved to: {result['analysis_file']}")
+                    footer.caption(
+                        "Served from the analysis cache" if metrics['cached'] else
+                        f"First token {metrics['ttft'] or 0:.1f}s · first section {metrics['first_section']:.1f}s · "
+                        f"complete {metrics['total']:.1f}s"
+                    )
+
                 # Store results in session state for persistence
-                st.session_state.analysis_results = results
-                
-                # Display analysis results
-                for result in results:
-                    with st.expander(f"📝 Analysis for: {result['title']}", expanded=True):
-                        if 'error' in result:
-                            st.error(result['error'])
-                        else:
-                            # Display the raw analysis text
-                            st.markdown(result['analysis'])
-                            
-                            # Show metadata
-                            st.info(f"Source: {result['source']}")
-                            if result['analysis_file']:
-                                st.success(f"Analysis saved to: {result['analysis_file']}")
+                st.session_state.analysis_results = [result for result in results if result is not None]
                 
                 st.success("Analysis complete!")
                 
@@ -424,9 +475,8 @@ with tab2:
             """.format(len(st.session_state.analysis_results)), unsafe_allow_html=True)
             
         with col2:
-            sentiment_score = sum(1 for r in st.session_state.analysis_results 
-                                if "positive" in r.get('analysis', '').lower())
-            sentiment_percentage = (sentiment_score / len(st.session_state.analysis_results)) * 100
+            positive_count = sum(1 for r in st.session_state.analysis_results if r.get('sentiment') == 'POSITIVE')
+            sentiment_percentage = (positive_count / len(st.session_state.analysis_results)) * 100
             st.markdown(f"""
                 <div class="card animate-fade-up">
                     <div class="stat-number">{sentiment_percentage:.1f}%</div>
@@ -435,9 +485,14 @@ with tab2:
             """, unsafe_allow_html=True)
             
         with col3:
-            st.markdown("""
+            market_scores = [r['impact']['market'] for r in st.session_state.analysis_results if r.get('impact')]
+            market_impact = "N/A"
+            if market_scores:
+                average_impact = sum(market_scores) / len(market_scores)
+                market_impact = "High" if average_impact >= 0.67 else "Medium" if average_impact >= 0.34 else "Low"
+            st.markdown(f"""
                 <div class="card animate-fade-up">
-                    <div class="stat-number">High</div>
+                    <div class="stat-number">{market_impact}</div>
                     <div class="stat-label">Market Impact</div>
                 </div>
             """, unsafe_allow_html=True)
@@ -448,10 +503,12 @@ with tab2:
                 if 'error' in result:
                     st.error(result['error'])
                 else:
+                    if 'extraction_error' in result:
+                        st.warning(result['extraction_error'])
                     try:
-                        # Extract sentiment and create visualization
-                        analysis_text = result['analysis'].lower()
-                        sentiment_score = 0.8 if "positive" in analysis_text else 0.2 if "negative" in analysis_text else 0.5
+                        # Scores were extracted once at analysis time
+                        impact = result.get('impact') or {}
+                        sentiment_score = result.get('sentiment_score')
                         
                         col1, col2 = st.columns([2, 1])
                         
@@ -465,21 +522,35 @@ with tab2:
                             
                         with col2:
                             # Impact score chart
-                            fig = go.Figure(go.Bar(
-                                x=['Market', 'Tech', 'Financial', 'Sentiment'],
-                                y=[0.8, 0.6, 0.7, sentiment_score],
-                                marker_color=['#2ecc71', '#3498db', '#e74c3c', 
-                                            '#27ae60' if sentiment_score > 0.5 else '#c0392b']
-                            ))
-                            fig.update_layout(
-                                title="Impact Analysis",
-                                paper_bgcolor='rgba(0,0,0,0)',
-                                plot_bgcolor='rgba(0,0,0,0)',
-                                font=dict(color='#ffffff'),
-                                showlegend=False
-                            )
-                            st.plotly_chart(fig, use_container_width=True)
+                            if impact and sentiment_score is not None:
+                                fig = go.Figure(go.Bar(
+                                    x=['Market', 'Tech', 'Financial', 'Sentiment'],
+                                    y=[impact['market'], impact['technology'], impact['financial'], sentiment_score],
+                                    marker_color=['#2ecc71', '#3498db', '#e74c3c', 
+                                                '#27ae60' if sentiment_score > 0.5 else '#c0392b']
+                                ))
+                                fig.update_layout(
+                                    title="Impact Analysis",
+                                    paper_bgcolor='rgba(0,0,0,0)',
+                                    plot_bgcolor='rgba(0,0,0,0)',
+                                    font=dict(color='#ffffff'),
+                                    showlegend=False
+                                )
+                                st.plotly_chart(fig, use_container_width=True)
+                            else:
+                                st.caption("Impact scores unavailable for this analysis")
+                            
+                            # Structured findings
+                            if result.get('key_facts') or result.get('stakeholders'):
+                                st.markdown(f"""
+                                    <div class="card">
+                                        <p><strong>Sentiment:</strong> {result.get('sentiment', 'UNKNOWN')}</p>
+                                        <p><strong>Key Facts:</strong> {'; '.join(result.get('key_facts', [])) or 'N/A'}</p>
+                                        <p><strong>Stakeholders:</strong> {', '.join(result.get('stakeholders', [])) or 'N/A'}</p>
+                                    </div>
+                                """, unsafe_allow_html=True)
                             
+
                             # Source and metadata
                             st.markdown(f"""
                                 <div class="card">
@@ -578,23 +649,48 @@ with tab3:
         
         # Chat input
         if prompt := st.chat_input("Ask about the analyzed articles..."):
+            # A new message stops the reply still streaming from a previous run
+            if st.session_state.get("chat_cancel") is not None:
+                st.session_state.chat_cancel.set()
+            cancel = st.session_state.chat_cancel = threading.Event()
+
             # Add user message to chat history
             st.session_state.chat_history.append({"role": "user", "content": prompt})
             
             with st.chat_message("user"):
                 st.markdown(prompt)
             
-            # Get response from Claude
+            # Stream the response from Claude into the message as it is generated
             with st.chat_message("assistant"):
-                with st.spinner("Thinking..."):
-                    from app.chat import get_chat_response
-                    response = get_chat_response(
-                        prompt,
-                        st.session_state.current_articles_context,
-                        st.session_state.chat_history
-                    )
-                    st.markdown(response)
-                    st.session_state.chat_history.append({"role": "assistant", "content": response})
+                from app.chat import stream_chat_response
+                body, footer = st.empty(), st.empty()
+                body.markdown("Thinking...")
+                reply, rendered_at = "", 0.0
+                events = stream_chat_response(
+                    prompt,
+                    st.session_state.current_articles_context,
+                    st.session_state.chat_history,
+                    cancel=cancel
+                )
+                try:
+                    for event in events:
+                        if event['type'] == 'delta':
+                            reply += event['text']
+                            if time.monotonic() - rendered_at >= 0.1:  # re-render at most 10 times a second
+                                body.markdown(reply + " ▌")
+                                rendered_at = time.monotonic()
+                            continue
+                        response, metrics = event['text'], event['metrics']
+                        body.markdown(response)
+                        if metrics['ttft'] is not None:
+                            footer.caption(
+                                f"First token {metrics['ttft']:.1f}s · {metrics['tokens_per_sec'] or 0:.0f} tokens/s · "
+                                f"{metrics['total']:.1f}s{' · stopped' if metrics['cancelled'] else ''}"
+                            )
+                        st.session_state.chat_history.append({"role": "assistant", "content": response,
+                                                              "metrics": metrics})
+                finally:
+                    events.close()  # a rerun interrupting this loop closes the stream and its connection
         
         # Clear chat button with custom styling
         col1, col2 = st.columns([4, 1])
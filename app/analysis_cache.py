@@ -0,0 +1,149 @@
+"""Durable cache of article analyses, shared by every session and process.
+
+Analyzing an article is a full Claude call taking tens of seconds, and the
+same article is often analyzed again for the same business context (after a
+"Start New Analysis" reset, or by another user). Results are stored in a
+SQLite database keyed by a hash of
+
+- the normalised article content,
+- the business context,
+- the model and the version of the analysis prompt,
+
+so changing the prompt or the model never serves stale analyses. Entries
+expire after ``ttl_days`` and the least recently used ones are evicted
+beyond ``max_entries``. Hit/miss counters are persisted alongside.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from app.embedding_cache import normalize_text
+
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "analysis_output/analysis_cache.sqlite")  # empty disables the cache
+ANALYSIS_CACHE_TTL_DAYS = float(os.getenv("ANALYSIS_CACHE_TTL_DAYS", "30"))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "5000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+"""
+
+
+class AnalysisCache:
+    def __init__(self, path: str, ttl_days: float = ANALYSIS_CACHE_TTL_DAYS,
+                 max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES):
+        """Open (or create) the cache database at ``path``"""
+        self.path = path
+        self.ttl = ttl_days * 86400
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # One connection shared by the analysis threads; WAL lets other processes read while one writes
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(content: str, business_context: str, model: str, prompt_version: int) -> str:
+        """Cache key of an analysis of ``content`` for ``business_context``"""
+        payload = f"{model}\0{prompt_version}\0{normalize_text(business_context)}\0{normalize_text(content)}"
+        return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _count(self, name: str, amount: int = 1):
+        self._db.execute("UPDATE stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached value for ``key``, or None if missing or expired"""
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._db.execute("SELECT value, created_at FROM analyses WHERE key = ?", (key,)).fetchone()
+                if row is not None and now - row[1] > self.ttl:
+                    self._db.execute("DELETE FROM analyses WHERE key = ?", (key,))
+                    self._count("evictions")
+                    row = None
+                if row is None:
+                    self._count("misses")
+                    return None
+                self._db.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (now, key))
+                self._count("hits")
+                return json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"[analysis_cache] Lookup failed: {str(e)}")
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store ``value`` and evict expired and least recently used entries"""
+        now = time.time()
+        try:
+            with self._lock:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    self._db.execute("INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?)",
+                                     (key, json.dumps(value), now, now))
+                    evicted = self._db.execute("DELETE FROM analyses WHERE created_at < ?", (now - self.ttl,)).rowcount
+                    evicted += self._db.execute(
+                        "DELETE FROM analyses WHERE key IN "
+                        "(SELECT key FROM analyses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,)
+                    ).rowcount
+                    if evicted:
+                        self._count("evictions", evicted)
+                    self._db.execute("COMMIT")
+                except Exception:
+                    self._db.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            print(f"[analysis_cache] Store failed: {str(e)}")
+
+    def stats(self) -> Dict[str, float]:
+        """Cumulative hit/miss counters (persisted across processes)"""
+        with self._lock:
+            counters = dict(self._db.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._db.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "evictions": counters["evictions"],
+            "entries": entries,
+            "capacity": self.max_entries,
+        }
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock:
+            self._db.execute("DELETE FROM analyses")
+            self._db.execute("UPDATE stats SET value = 0")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_shared_caches: Dict[str, AnalysisCache] = {}
+_shared_lock = threading.Lock()
+
+
+def get_analysis_cache(path: str = ANALYSIS_CACHE_PATH) -> Optional[AnalysisCache]:
+    """Process-wide cache at ``path`` (None when caching is disabled)"""
+    if not path:
+        return None
+    with _shared_lock:
+        cache = _shared_caches.get(path)
+        if cache is None:
+            cache = _shared_caches[path] = AnalysisCache(path)
+        return cache
@@ -0,0 +1,94 @@
+"""Structured fields extracted from an article analysis.
+
+Alongside the markdown analysis, Claude is asked to call the
+``record_analysis`` tool once with the sentiment, key facts, stakeholders
+and impact scores of the article. The tool input is validated against
+``ANALYSIS_SCHEMA`` here, once, at analysis time, so the dashboards only read
+precomputed fields instead of searching the analysis text on every rerun.
+"""
+from typing import Any, Dict, List, Optional
+
+SENTIMENTS = ("POSITIVE", "NEGATIVE", "NEUTRAL")
+IMPACT_AREAS = ("market", "technology", "financial")
+
+_SCORE = {"type": "number", "minimum": 0, "maximum": 1}
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentiment": {"type": "string", "enum": list(SENTIMENTS)},
+        "sentiment_score": {**_SCORE, "description": "0 = very negative, 0.5 = neutral, 1 = very positive"},
+        "key_facts": {"type": "array", "items": {"type": "string"}, "description": "Key facts and figures"},
+        "stakeholders": {"type": "array", "items": {"type": "string"}, "description": "Key stakeholders mentioned"},
+        "impact": {
+            "type": "object",
+            "description": "Impact of the news on the business, 0 = none, 1 = very high",
+            "properties": {area: _SCORE for area in IMPACT_AREAS},
+            "required": list(IMPACT_AREAS),
+        },
+    },
+    "required": ["sentiment", "sentiment_score", "key_facts", "stakeholders", "impact"],
+}
+ANALYSIS_TOOL = {
+    "name": "record_analysis",
+    "description": "Record the structured findings of the article analysis.",
+    "input_schema": ANALYSIS_SCHEMA,
+}
+
+
+def empty_fields() -> Dict[str, Any]:
+    """Result fields for an analysis without valid structured output"""
+    return {"sentiment": "UNKNOWN", "sentiment_score": None, "key_facts": [], "stakeholders": [], "impact": {}}
+
+
+def _score(value: Any, name: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= 1:
+        raise ValueError(f"{name} must be a number between 0 and 1, got {value!r}")
+    return float(value)
+
+
+def _strings(value: Any, name: str) -> List[str]:
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"{name} must be a list of strings")
+    return [item.strip() for item in value if item.strip()]
+
+
+def validate_analysis(data: Any) -> Dict[str, Any]:
+    """Check a ``record_analysis`` input against ``ANALYSIS_SCHEMA``.
+
+    Returns:
+        The result fields (``sentiment``, ``sentiment_score``, ``key_facts``,
+        ``stakeholders``, ``impact``)
+
+    Raises:
+        ValueError: If the data does not match the schema
+    """
+    if not isinstance(data, dict):
+        raise ValueError("analysis must be an object")
+    missing = [field for field in ANALYSIS_SCHEMA["required"] if field not in data]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    sentiment = data["sentiment"].upper() if isinstance(data["sentiment"], str) else data["sentiment"]
+    if sentiment not in SENTIMENTS:
+        raise ValueError(f"sentiment must be one of {', '.join(SENTIMENTS)}, got {data['sentiment']!r}")
+    impact = data["impact"]
+    if not isinstance(impact, dict):
+        raise ValueError("impact must be an object")
+    return {
+        "sentiment": sentiment,
+        "sentiment_score": _score(data["sentiment_score"], "sentiment_score"),
+        "key_facts": _strings(data["key_facts"], "key_facts"),
+        "stakeholders": _strings(data["stakeholders"], "stakeholders"),
+        "impact": {area: _score(impact.get(area), f"impact.{area}") for area in IMPACT_AREAS},
+    }
+
+
+def structured_fields(tool_input: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validated result fields, or ``empty_fields()`` if the tool was not called or its input is invalid"""
+    if tool_input is None:
+        print("[analysis_schema] No structured analysis in the response")
+        return empty_fields()
+    try:
+        return validate_analysis(tool_input)
+    except ValueError as e:
+        print(f"[analysis_schema] Invalid structured analysis: {str(e)}")
+        return empty_fields()
@@ -1,126 +1,404 @@
-from typing import List, Dict, Any
-from datetime import datetime
-import os
-import traceback
-from anthropic import Anthropic
-
-def save_message_content(content: str, filename: str) -> None:
-    """Save the given content to a file."""
-    try:
-        # Create output directory if it doesn't exist
-        os.makedirs("analysis_output", exist_ok=True)
-        filepath = os.path.join("analysis_output", filename)
-        
-        with open(filepath, "a", encoding="utf-8") as file:
-            file.write(f"\n{'='*50}\n{datetime.now().isoformat()}\n{'='*50}\n")
-            file.write(content + "\n")
-        print(f"[save_message_content] Successfully saved analysis to {filepath}")
-        return filepath
-    except Exception as e:
-        print(f"[save_message_content] Error saving analysis to file: {str(e)}")
-        traceback.print_exc()
-        return None
-
-class NewsAnalyzer:
-    def __init__(self):
-        """Initialize News Analyzer with Claude"""
-        print("[NewsAnalyzer] Initializing...")
-        from config.settings import get_api_key
-        api_key = get_api_key("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in configuration")
-        self.client = Anthropic(api_key=api_key)
-        print("[NewsAnalyzer] Initialized with Claude Sonnet")
-
-    def analyze_articles(self, selected_articles: List[Dict[str, Any]], business_context: str) -> List[Dict[str, Any]]:
-        """Analyze selected articles using Claude Sonnet"""
-        print(f"[analyze_articles] Starting analysis of {len(selected_articles)} articles")
-        results = []
-        for idx, article in enumerate(selected_articles, 1):
-            try:
-                print(f"[analyze_articles] Processing article {idx}/{len(selected_articles)}")
-                result = self.analyze_article(article, business_context)
-                results.append(result)
-                print(f"[analyze_articles] Successfully analyzed article {idx}")
-            except Exception as e:
-                print(f"[analyze_articles] Error analyzing article {idx}: {str(e)}")
-                traceback.print_exc()
-                continue
-        return results
-
-    def analyze_article(self, article: Dict[str, Any], business_context: str) -> Dict[str, Any]:
-        """Analyze a single article using Claude Sonnet"""
-        title = article.get('title', 'Untitled')
-        content = article.get('content', '')
-        
-        print(f"[analyze_article] Starting analysis for: {title}")
-        print(f"[analyze_article] Business context: {business_context}")
-
-        try:
-            # Create more detailed system prompt for richer analysis
-            system_prompt = (
-                f"Analyze this news article in the context of {business_context}. Provide:\n"
-                "1. Overall sentiment (clearly state POSITIVE/NEGATIVE/NEUTRAL)\n"
-                "2. Key facts and figures extracted from the article\n"
-                "3. Main implications for the business/industry\n"
-                "4. Strategic recommendations\n"
-                "5. Key stakeholders mentioned\n"
-                "6. Related industry trends\n"
-                "Format the analysis in clear sections with markdown headings."
-            )
-            
-            # Create message for Claude
-            response = self.client.messages.create(
-                model="claude-sonnet-4-20250514",
-                max_tokens=2000,
-                temperature=0.7,
-                system=system_prompt,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": f"News Article: {content}\nBusiness Context: {business_context}"
-                            }
-                        ]
-                    }
-                ]
-            )
-            
-            # Extract and save analysis
-            analysis_text = response.content[0].text
-            print(f"[analyze_article] Got response length: {len(analysis_text)}")
-            
-            # Save to file with timestamp
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"analysis_{timestamp}_{title[:30]}.txt"
-            saved_path = save_message_content(analysis_text, filename)
-            
-            # Extract key information for chat context
-            result = {
-                'title': title,
-                'source': article.get('source', 'Unknown'),
-                'url': article.get('url', ''),
-                'content': content,  # Include full content for chat context
-                'analysis': analysis_text,
-                'analysis_file': saved_path,
-                'timestamp': datetime.now().isoformat(),
-                'key_facts': [],  # Will be populated in future versions
-                'sentiment': 'UNKNOWN'  # Will be populated in future versions
-            }
-            
-            print(f"[analyze_article] Analysis complete for: {title}")
-            return result
-            
-        except Exception as e:
-            error_msg = str(e)
-            print(f"[analyze_article] Error during analysis: {error_msg}")
-            traceback.print_exc()
-            return {
-                'title': title,
-                'error': f"Analysis failed: {error_msg}",
-                'source': article.get('source', 'Unknown'),
-                'url': article.get('url', ''),
-                'content': content  # Include content even if analysis fails
-            }
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+
+from app.analysis_cache import AnalysisCache, get_analysis_cache
+from app.analysis_schema import ANALYSIS_TOOL, empty_fields, structured_fields
+from app.clients import get_anthropic_client, messages_args, stream_attempts
+from app.chunking import chunk_text, count_tokens
+from app.scheduler import BULK, get_scheduler, request_tokens
+from config.settings import ANALYSIS_RAW_CONTENT
+
+ANALYSIS_MODEL = "claude-sonnet-4-20250514"
+ANALYSIS_PROMPT_VERSION = 4  # bump whenever analysis_request's prompt changes, so cached analyses are not reused
+MAX_CONCURRENT_ANALYSES = int(os.getenv("ANALYSIS_MAX_CONCURRENCY", "4"))  # 1 analyzes articles one at a time
+# Articles longer than this are analyzed map-reduce: each chunk is condensed to notes, then the notes are analyzed
+ANALYSIS_MAX_ARTICLE_TOKENS = int(os.getenv("ANALYSIS_MAX_ARTICLE_TOKENS", "8000"))
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", "4000"))
+ANALYSIS_CHUNK_MODEL = os.getenv("ANALYSIS_CHUNK_MODEL", "claude-haiku-4-5-20251001")
+CHUNK_NOTES_MAX_TOKENS = 600
+# Output budget of an analysis: the six-section markdown analysis, then the record_analysis call after it
+ANALYSIS_MAX_TOKENS = int(os.getenv("ANALYSIS_MAX_TOKENS", "4096"))
+
+_HEADING = re.compile(r"^#{1,6} .*$", re.MULTILINE)
+
+
+def first_section_complete(text: str) -> bool:
+    """Whether a streamed analysis already holds one complete, non-empty markdown section"""
+    headings = list(_HEADING.finditer(text))
+    return any(text[current.end():following.start()].strip()
+               for current, following in zip(headings, headings[1:]))
+
+
+def article_text(article: Dict[str, Any]) -> str:
+    """Text to analyze: the search result content, or the full page text with ``ANALYSIS_RAW_CONTENT``"""
+    if ANALYSIS_RAW_CONTENT and article.get('raw_content'):
+        return article['raw_content']
+    return article.get('content', '')
+
+
+def response_parts(content: List[Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """Analysis text and ``record_analysis`` tool input of a response's content blocks"""
+    text, tool_input = [], None
+    for block in content:
+        if getattr(block, "type", None) == "tool_use":
+            if block.name == ANALYSIS_TOOL["name"]:
+                tool_input = block.input
+        else:
+            text.append(block.text)
+    return "".join(text), tool_input
+
+
+def save_message_content(content: str, filename: str) -> None:
+    """Save the given content to a file."""
+    try:
+        # Create output directory if it doesn't exist
+        os.makedirs("analysis_output", exist_ok=True)
+        filepath = os.path.join("analysis_output", filename)
+        
+        with open(filepath, "a", encoding="utf-8") as file:
+            file.write(f"\n{'='*50}\n{datetime.now().isoformat()}\n{'='*50}\n")
+            file.write(content + "\n")
+        print(f"[save_message_content] Successfully saved analysis to {filepath}")
+        return filepath
+    except Exception as e:
+        print(f"[save_message_content] Error saving analysis to file: {str(e)}")
+        traceback.print_exc()
+        return None
+
+class NewsAnalyzer:
+    def __init__(self, cache: Optional[AnalysisCache] = None):
+        """Initialize News Analyzer with Claude.
+
+        Analyses are cached in ``cache`` (default: the shared cache at
+        ``ANALYSIS_CACHE_PATH``, if enabled).
+        """
+        print("[NewsAnalyzer] Initializing...")
+        self.client = get_anthropic_client()  # shared, keeps its connections open across analyzers
+        self.scheduler = get_scheduler("claude")
+        self.cache = cache or get_analysis_cache()
+        print("[NewsAnalyzer] Initialized with Claude Sonnet")
+
+    def analyze_articles(self, selected_articles: List[Dict[str, Any]], business_context: str,
+                         max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Analyze selected articles using Claude Sonnet.
+
+        Up to ``max_concurrency`` requests (default ``MAX_CONCURRENT_ANALYSES``)
+        are in flight at once. Results keep the order of ``selected_articles``;
+        an article that fails is reported or skipped without affecting the others.
+        """
+        max_concurrency = max_concurrency or MAX_CONCURRENT_ANALYSES
+        total = len(selected_articles)
+        print(f"[analyze_articles] Starting analysis of {total} articles ({max_concurrency} in flight)")
+
+        def analyze(idx: int, article: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            try:
+                print(f"[analyze_articles] Processing article {idx}/{total}")
+                result = self.analyze_article(article, business_context)
+                print(f"[analyze_articles] Successfully analyzed article {idx}")
+                return result
+            except Exception as e:
+                print(f"[analyze_articles] Error analyzing article {idx}: {str(e)}")
+                traceback.print_exc()
+                return None
+
+        indexed = list(enumerate(selected_articles, 1))
+        if max_concurrency <= 1 or total <= 1:
+            results = [analyze(idx, article) for idx, article in indexed]
+        else:
+            # The client is thread-safe; the calls are network-bound, so threads overlap their latency
+            with ThreadPoolExecutor(max_workers=min(max_concurrency, total)) as pool:
+                results = list(pool.map(lambda item: analyze(*item), indexed))
+        return [result for result in results if result is not None]
+
+    def stream_articles(self, selected_articles: List[Dict[str, Any]], business_context: str,
+                        max_concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Analyze articles concurrently, yielding the events of every article as they arrive.
+
+        Events are those of ``stream_article`` with an ``index`` into
+        ``selected_articles``; deltas of up to ``max_concurrency`` articles
+        interleave. Closing the generator stops the streams still running.
+        """
+        max_concurrency = max_concurrency or MAX_CONCURRENT_ANALYSES
+        events: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        cancelled = threading.Event()
+
+        def run(index: int, article: Dict[str, Any]):
+            try:
+                for event in self.stream_article(article, business_context):
+                    if cancelled.is_set():
+                        break
+                    events.put({**event, 'index': index})
+            finally:
+                events.put(None)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(selected_articles))))
+        try:
+            for index, article in enumerate(selected_articles):
+                pool.submit(run, index, article)
+            running = len(selected_articles)
+            while running:
+                event = events.get()
+                if event is None:
+                    running -= 1
+                else:
+                    yield event
+        finally:
+            cancelled.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def analyze_articles_batch(self, selected_articles: List[Dict[str, Any]], business_context: str,
+                               **options) -> List[Dict[str, Any]]:
+        """Analyze articles offline with one Message Batch; resumable (see ``app.batch_analysis``)"""
+        from app.batch_analysis import run_batch_analysis
+        return run_batch_analysis(self, selected_articles, business_context, **options)
+
+    def chunk_request(self, chunk: str, index: int, total: int, business_context: str) -> Dict[str, Any]:
+        """Messages API parameters for condensing one chunk of a long article (the map step)"""
+        return {
+            "model": ANALYSIS_CHUNK_MODEL,
+            "max_tokens": CHUNK_NOTES_MAX_TOKENS,
+            "temperature": 0,
+            "system": [{
+                "type": "text",
+                "text": (
+                    f"You are condensing one part of a long news article for an analysis in the context of "
+                    f"{business_context}. List, as terse bullet points, the facts and figures, stakeholders, "
+                    "sentiment signals and business implications in this part. Do not add anything that is not "
+                    "in the text."
+                ),
+                "cache_control": {"type": "ephemeral"}
+            }],
+            "messages": [{"role": "user", "content": f"Part {index} of {total}:\n\n{chunk}"}]
+        }
+
+    def chunk_notes(self, article: Dict[str, Any], business_context: str,
+                    max_concurrency: Optional[int] = None) -> Optional[List[str]]:
+        """Condensed notes per chunk of an article over ``ANALYSIS_MAX_ARTICLE_TOKENS``, None for shorter ones.
+
+        Chunks are condensed concurrently (up to ``max_concurrency`` at once).
+        """
+        text = article_text(article)
+        tokens = count_tokens(text)
+        if tokens <= ANALYSIS_MAX_ARTICLE_TOKENS:
+            return None
+        chunks = chunk_text(text, ANALYSIS_CHUNK_TOKENS)
+        print(f"[chunk_notes] {article.get('title', 'Untitled')}: ~{tokens} tokens, condensing {len(chunks)} chunks")
+
+        def condense(item: Tuple[int, str]) -> str:
+            request = self.chunk_request(item[1], item[0], len(chunks), business_context)
+            response = self.scheduler.call(self.client.messages.create, priority=BULK,
+                                           tokens=request_tokens(request), **messages_args(request))
+            return response_parts(response.content)[0]
+
+        workers = min(max_concurrency or MAX_CONCURRENT_ANALYSES, len(chunks))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(condense, enumerate(chunks, 1)))
+
+    def analysis_request(self, article: Dict[str, Any], business_context: str,
+                         notes: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Messages API parameters for analyzing one article.
+
+        The prompt is ordered from most to least shared: the system prompt
+        (depends only on the business context) comes first and is marked for
+        prompt caching, the article follows in the user message. A long
+        article is given as its ``chunk_notes`` instead of its text (the
+        reduce step).
+        """
+        # Create more detailed system prompt for richer analysis
+        system_prompt = (
+            f"Analyze this news article in the context of {business_context}. Provide:\n"
+            "1. Overall sentiment (clearly state POSITIVE/NEGATIVE/NEUTRAL)\n"
+            "2. Key facts and figures extracted from the article\n"
+            "3. Main implications for the business/industry\n"
+            "4. Strategic recommendations\n"
+            "5. Key stakeholders mentioned\n"
+            "6. Related industry trends\n"
+            "Format the analysis in clear sections with markdown headings. "
+            f"After the analysis, call the {ANALYSIS_TOOL['name']} tool once with its structured findings."
+        )
+        if notes is None:
+            article_input = f"News Article: {article_text(article)}"
+        else:
+            article_input = f"News Article (notes on its {len(notes)} parts, in order):\n\n" + "\n\n".join(
+                f"Part {i}:\n{part}" for i, part in enumerate(notes, 1))
+        return {
+            "model": ANALYSIS_MODEL,
+            "max_tokens": ANALYSIS_MAX_TOKENS,
+            "temperature": 0.7,
+            "tools": [ANALYSIS_TOOL],
+            "tool_choice": {"type": "auto"},  # forcing the tool would suppress the streamed markdown analysis
+            "system": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": f"{article_input}\nBusiness Context: {business_context}"
+                        }
+                    ]
+                }
+            ]
+        }
+
+    def cache_key(self, article: Dict[str, Any], business_context: str) -> Optional[str]:
+        """Analysis cache key of an article (None if it has no content to key on)"""
+        content = article_text(article)
+        if not content.strip():
+            return None
+        return AnalysisCache.make_key(content, business_context, ANALYSIS_MODEL, ANALYSIS_PROMPT_VERSION)
+
+    def analysis_result(self, article: Dict[str, Any], analysis_text: str,
+                        tool_input: Optional[Dict[str, Any]] = None,
+                        stop_reason: Optional[str] = None) -> Dict[str, Any]:
+        """Save an analysis and build the result dict returned for the article.
+
+        ``tool_input`` is the ``record_analysis`` call of the response; its
+        validated fields (sentiment, key facts, stakeholders, impact scores)
+        are added to the result. A response cut off at ``max_tokens`` never
+        got to (or finished) that call: its result gets empty fields and an
+        ``extraction_error``, and is not cached.
+        """
+        title = article.get('title', 'Untitled')
+        truncated = stop_reason == "max_tokens"
+        if truncated:
+            print(f"[analysis_result] {title}: response stopped at max_tokens before the structured analysis")
+
+        # Save to file with timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"analysis_{timestamp}_{title[:30]}.txt"
+        saved_path = save_message_content(analysis_text, filename)
+
+        # Extract key information for chat context
+        result = {
+            **self._article_fields(article),
+            'analysis': analysis_text,
+            'analysis_file': saved_path,
+            'timestamp': datetime.now().isoformat(),
+            **(empty_fields() if truncated else structured_fields(tool_input))
+        }
+        if truncated:
+            result['extraction_error'] = (f"The analysis reached the {ANALYSIS_MAX_TOKENS}-token limit before its "
+                                          "structured fields were recorded")
+        return result
+
+    def analysis_error(self, article: Dict[str, Any], error_msg: str) -> Dict[str, Any]:
+        """Result dict for an article whose analysis failed"""
+        return {
+            **self._article_fields(article),  # Include content even if analysis fails
+            'error': f"Analysis failed: {error_msg}",
+        }
+
+    @staticmethod
+    def _article_fields(article: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'title': article.get('title', 'Untitled'),
+            'source': article.get('source', 'Unknown'),
+            'url': article.get('url', ''),
+            'content': article.get('content', ''),  # Include full content for chat context
+        }
+
+    def cached_analysis(self, article: Dict[str, Any],
+                        business_context: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Cache key of an article and its cached result, if any"""
+        key = self.cache_key(article, business_context) if self.cache is not None else None
+        cached = self.cache.get(key) if key else None
+        return key, ({**self._article_fields(article), **cached} if cached is not None else None)
+
+    def cache_result(self, key: Optional[str], article: Dict[str, Any], result: Dict[str, Any]):
+        """Store ``result`` under the ``cached_analysis`` key of ``article`` (None: caching is off)"""
+        if key and 'extraction_error' not in result:  # a truncated analysis is requested again next time
+            article_fields = self._article_fields(article)
+            self.cache.put(key, {field: value for field, value in result.items() if field not in article_fields})
+
+    def stream_article(self, article: Dict[str, Any], business_context: str) -> Iterator[Dict[str, Any]]:
+        """Analyze a single article, yielding the analysis text as it is generated.
+
+        Yields ``{'type': 'delta', 'text': ...}`` events, then one
+        ``{'type': 'done', 'result': ..., 'metrics': ...}`` event whose result
+        is what ``analyze_article`` returns. The metrics are seconds from the
+        request to the first token (``ttft``), to the first complete section
+        (``first_section``) and to the end of the analysis (``total``).
+        """
+        title = article.get('title', 'Untitled')
+        start = time.perf_counter()
+        metrics = {'ttft': None, 'first_section': None, 'total': None, 'cached': False}
+
+        key, result = self.cached_analysis(article, business_context)
+        if result is not None:
+            metrics['ttft'] = metrics['first_section'] = metrics['total'] = time.perf_counter() - start
+            metrics['cached'] = True
+            yield {'type': 'delta', 'text': result['analysis']}
+            yield {'type': 'done', 'result': result, 'metrics': metrics}
+            return
+
+        analysis_text = ""
+        try:
+            notes = self.chunk_notes(article, business_context)
+            request = self.analysis_request(article, business_context, notes)
+            for attempt, opened in stream_attempts(self.client, self.scheduler, request, BULK,
+                                                   lambda: bool(analysis_text)):
+                with attempt, opened as stream:
+                    for text in stream.text_stream:
+                        elapsed = time.perf_counter() - start
+                        if metrics['ttft'] is None:
+                            metrics['ttft'] = elapsed
+                        analysis_text += text
+                        if metrics['first_section'] is None and first_section_complete(analysis_text):
+                            metrics['first_section'] = elapsed
+                        yield {'type': 'delta', 'text': text}
+                    final = stream.get_final_message()
+            result = self.analysis_result(article, analysis_text, response_parts(final.content)[1], final.stop_reason)
+            self.cache_result(key, article, result)
+        except Exception as e:
+            print(f"[stream_article] Error during analysis of {title}: {str(e)}")
+            traceback.print_exc()
+            result = self.analysis_error(article, str(e))
+
+        metrics['total'] = time.perf_counter() - start
+        if metrics['first_section'] is None and 'error' not in result:
+            metrics['first_section'] = metrics['total']  # the whole analysis is one section
+        print(f"[stream_article] {title}: first token {metrics['ttft'] or 0:.2f}s, "
+              f"first section {metrics['first_section'] or 0:.2f}s, total {metrics['total']:.2f}s")
+        yield {'type': 'done', 'result': result, 'metrics': metrics}
+
+    def analyze_article(self, article: Dict[str, Any], business_context: str) -> Dict[str, Any]:
+        """Analyze a single article using Claude Sonnet"""
+        title = article.get('title', 'Untitled')
+        
+        print(f"[analyze_article] Starting analysis for: {title}")
+        print(f"[analyze_article] Business context: {business_context}")
+
+        key, cached = self.cached_analysis(article, business_context)
+        if cached is not None:
+            print(f"[analyze_article] Cache hit for: {title}")
+            return cached
+
+        try:
+            # Create message for Claude
+            notes = self.chunk_notes(article, business_context)
+            request = self.analysis_request(article, business_context, notes)
+            response = self.scheduler.call(self.client.messages.create, priority=BULK,
+                                           tokens=request_tokens(request), **messages_args(request))
+            
+            # Extract and save analysis
+            analysis_text, tool_input = response_parts(response.content)
+            print(f"[analyze_article] Got response length: {len(analysis_text)}")
+            result = self.analysis_result(article, analysis_text, tool_input, response.stop_reason)
+            self.cache_result(key, article, result)
+            
+            print(f"[analyze_article] Analysis complete for: {title}")
+            return result
+            
+        except Exception as e:
+            error_msg = str(e)
+            print(f"[analyze_article] Error during analysis: {error_msg}")
+            traceback.print_exc()
+            return self.analysis_error(article, error_msg)
@@ -0,0 +1,263 @@
+"""FAISS index construction, training and migration for the vector store.
+
+Supported index types:
+
+- ``flat``      exact brute-force search (IndexFlatL2)
+- ``ivf_flat``  inverted lists over k-means cells, full vectors in the lists
+- ``ivf_pq``    inverted lists with product-quantised codes
+- ``hnsw``      hierarchical navigable small-world graph
+
+Each type can store its vectors compressed:
+
+- ``none``  float32, 4 bytes per dimension
+- ``fp16``  half precision, 2 bytes per dimension, no training
+- ``sq8``   8-bit scalar quantisation, 1 byte per dimension
+- ``pq``    product quantisation, ``PQ_M`` bytes per vector (``ivf_pq`` always uses it)
+
+IVF types and trained codecs need training, so a store configured for them
+keeps an uncompressed flat index until ``can_build`` says enough vectors
+exist, then converts in place. An IVF index sized by ``auto_nlist`` is
+retrained with more cells once ``needs_retraining`` says the corpus has
+outgrown them. Vector ids are positions and are preserved by every
+conversion.
+
+Checkpoints can be opened memory-mapped (``read_index(path, mmap=True)``):
+vectors and codes stay in the OS page cache, shared by every process that
+maps the file, and nothing proportional to the index size is read up front.
+A mapped index is read-only; ``owned_copy`` makes it writable.
+"""
+import math
+from typing import Callable, Optional
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+COMPRESSIONS = ("none", "fp16", "sq8", "pq")
+DEFAULT_NPROBE = 16
+DEFAULT_EF_SEARCH = 64
+HNSW_M = 32
+PQ_M = 64  # sub-quantizers; must divide the embedding dimension
+PQ_NBITS = 8
+MIN_POINTS_PER_CENTROID = 39  # below this FAISS k-means warns and quality drops
+SQ8_TRAINING_MIN = 1000  # per-dimension ranges are learnt from the training sample
+MAX_TRAINING_VECTORS = 100_000
+COPY_CHUNK = 50_000
+MMAP_FLAGS = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY
+
+
+def auto_nlist(ntotal: int) -> int:
+    """Number of IVF cells for a corpus of ``ntotal`` vectors (~4 * sqrt(N))"""
+    return max(1, min(65536, int(4 * math.sqrt(max(ntotal, 1)))))
+
+
+def nlist_of(index: faiss.Index) -> Optional[int]:
+    """Number of cells of an IVF index (None for other index types)"""
+    if isinstance(index, faiss.IndexHNSW):
+        return None
+    try:
+        return faiss.extract_index_ivf(index).nlist
+    except RuntimeError:
+        return None
+
+
+def needs_retraining(index: faiss.Index, ntotal: int, growth: float) -> bool:
+    """Whether an auto-sized IVF ``index`` should be retrained for ``ntotal`` vectors.
+
+    ``auto_nlist`` grows with sqrt(N), so the corpus has grown ``growth``-fold
+    since training once it asks for ``sqrt(growth)`` times the cells.
+    """
+    nlist = nlist_of(index)
+    return nlist is not None and growth > 0 and auto_nlist(ntotal) >= nlist * math.sqrt(growth)
+
+
+def effective_compression(index_type: str, compression: str) -> str:
+    """Codec actually used by ``index_type`` (``ivf_pq`` implies ``pq``)"""
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}'. Available: {', '.join(COMPRESSIONS)}")
+    return "pq" if index_type == "ivf_pq" else compression
+
+
+def training_size(index_type: str, ntotal: int, nlist: Optional[int] = None, compression: str = "none") -> int:
+    """Vectors required before ``index_type`` can be trained (0 if no training)"""
+    needed = 0
+    if index_type in ("ivf_flat", "ivf_pq"):
+        needed = MIN_POINTS_PER_CENTROID * (nlist or auto_nlist(ntotal))
+    compression = effective_compression(index_type, compression)
+    if compression == "pq":
+        needed = max(needed, MIN_POINTS_PER_CENTROID * (1 << PQ_NBITS))
+    elif compression == "sq8":
+        needed = max(needed, SQ8_TRAINING_MIN)
+    return needed
+
+
+def can_build(index_type: str, ntotal: int, nlist: Optional[int] = None, compression: str = "none") -> bool:
+    """Whether a store holding ``ntotal`` vectors can switch to ``index_type``"""
+    return ntotal >= training_size(index_type, ntotal, nlist, compression)
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """Detect which of ``INDEX_TYPES`` a (possibly loaded) index is"""
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    try:
+        ivf = faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return "flat"
+    return "ivf_pq" if isinstance(ivf, faiss.IndexIVFPQ) else "ivf_flat"
+
+
+def _codes(index: faiss.Index) -> faiss.Index:
+    """The index holding the vector codes (HNSW keeps them in a storage index)"""
+    return faiss.downcast_index(index.storage) if isinstance(index, faiss.IndexHNSW) else index
+
+
+def compression_of(index: faiss.Index) -> str:
+    """Detect which of ``COMPRESSIONS`` a (possibly loaded) index uses"""
+    codes = _codes(index)
+    if isinstance(codes, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return "pq"
+    if isinstance(codes, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return "fp16" if codes.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "none"
+
+
+def create_index(index_type: str, dim: int, ntotal: int = 0, nlist: Optional[int] = None,
+                 pq_m: int = PQ_M, hnsw_m: int = HNSW_M, compression: str = "none") -> faiss.Index:
+    """Create an empty (possibly untrained) index of ``index_type``"""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Available: {', '.join(INDEX_TYPES)}")
+    compression = effective_compression(index_type, compression)
+    if compression == "pq" and dim % pq_m:
+        raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+    codec = {"none": "Flat", "fp16": "SQfp16", "sq8": "SQ8", "pq": f"PQ{pq_m}x{PQ_NBITS}"}[compression]
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim) if compression == "none" else faiss.index_factory(dim, codec)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m) if compression == "none" else faiss.index_factory(dim, f"HNSW{hnsw_m},{codec}")
+        index.hnsw.efSearch = DEFAULT_EF_SEARCH
+        return index
+    nlist = nlist or auto_nlist(ntotal)
+    index = faiss.index_factory(dim, f"IVF{nlist},{codec}")
+    faiss.extract_index_ivf(index).nprobe = DEFAULT_NPROBE
+    return index
+
+
+def bytes_per_vector(index: faiss.Index) -> float:
+    """Approximate resident bytes per stored vector: codes plus graph links or list ids"""
+    codes = _codes(index)
+    size = codes.sa_code_size() if compression_of(index) != "none" else 4 * index.d
+    if isinstance(index, faiss.IndexHNSW):
+        size += index.hnsw.nb_neighbors(0) * 4 + 12  # level-0 links, level and offset (upper levels are sparse)
+    elif index_type_of(index) != "flat":
+        size += 8  # ids stored in the inverted lists
+    return float(size)
+
+
+def supports_selector(index: faiss.Index) -> bool:
+    """Whether ``index.search`` accepts an ``IDSelector`` (flat PQ does not)"""
+    return not isinstance(index, faiss.IndexPQ)
+
+
+def _enable_reconstruct(index: faiss.Index):
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass
+
+
+def reconstruct_range(index: faiss.Index, start: int, count: int) -> np.ndarray:
+    """Read back vectors ``[start, start + count)`` (lossy for PQ codes)"""
+    _enable_reconstruct(index)
+    return index.reconstruct_n(start, count)
+
+
+def convert_index(index: faiss.Index, index_type: str, nlist: Optional[int] = None,
+                  pq_m: int = PQ_M, hnsw_m: int = HNSW_M, compression: str = "none",
+                  exact: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> faiss.Index:
+    """Copy every vector of ``index`` into a new, trained index of ``index_type``.
+
+    ``exact`` reads vectors by id (e.g. ``VectorFile.get``) and is used
+    instead of reconstructing them from the codes of a compressed ``index``.
+    """
+    ntotal = index.ntotal
+    source_type = index_type_of(index)
+    source_compression = compression_of(index)
+    if source_compression != "none" and exact is None:
+        print(f"[ann_index] Warning: migrating from {source_compression} codes reconstructs approximate vectors")
+    compression = effective_compression(index_type, compression)
+    print(f"[ann_index] Converting {ntotal} vectors from {source_type}/{source_compression} "
+          f"to {index_type}/{compression}")
+
+    target = create_index(index_type, index.d, ntotal, nlist=nlist, pq_m=pq_m, hnsw_m=hnsw_m,
+                          compression=compression)
+    if not target.is_trained:
+        sample_ids = np.linspace(0, ntotal - 1, min(ntotal, MAX_TRAINING_VECTORS)).astype(np.int64)
+        if exact is None:
+            _enable_reconstruct(index)
+        target.train((exact or index.reconstruct_batch)(sample_ids))
+
+    for start in range(0, ntotal, COPY_CHUNK):
+        count = min(COPY_CHUNK, ntotal - start)
+        target.add(exact(np.arange(start, start + count)) if exact else reconstruct_range(index, start, count))
+    return target
+
+
+def read_index(path: str, mmap: bool = False) -> faiss.Index:
+    """Load a checkpoint, optionally memory-mapping its vectors/codes read-only"""
+    return faiss.read_index(path, MMAP_FLAGS if mmap else 0)
+
+
+def owned_copy(index: faiss.Index) -> faiss.Index:
+    """Writable in-memory copy of a memory-mapped index.
+
+    Adding to a mapped index aborts the process and ``faiss.clone_index``
+    keeps the mapping, so the copy goes through serialisation.
+    """
+    return faiss.deserialize_index(faiss.serialize_index(index))
+
+
+def id_selector(mask: np.ndarray) -> faiss.IDSelector:
+    """FAISS selector admitting the ids where ``mask`` is True.
+
+    The packed bitmap is attached to the selector so it outlives this call.
+    """
+    bitmap = np.packbits(np.asarray(mask, dtype=bool), bitorder="little")
+    selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+    selector.bitmap_array = bitmap
+    return selector
+
+
+def search_parameters(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                      selector: Optional[faiss.IDSelector] = None) -> Optional[faiss.SearchParameters]:
+    """Per-query tuning knobs and id filter for ``index.search`` (None keeps index defaults)"""
+    index_type = index_type_of(index)
+    kwargs = {"sel": selector} if selector is not None else {}
+    if index_type in ("ivf_flat", "ivf_pq") and (nprobe or selector is not None):
+        return faiss.SearchParametersIVF(nprobe=nprobe or faiss.extract_index_ivf(index).nprobe, **kwargs)
+    if index_type == "hnsw" and (ef_search or selector is not None):
+        return faiss.SearchParametersHNSW(efSearch=ef_search or index.hnsw.efSearch, **kwargs)
+    return faiss.SearchParameters(**kwargs) if kwargs else None
+
+
+def search_subset(index: faiss.Index, queries: np.ndarray, ids: np.ndarray, k: int):
+    """Exact k-NN restricted to ``ids``, for filters too selective for ANN probing.
+
+    Returns ``(distances, ids)`` shaped like ``index.search`` output.
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+    labels = np.full((len(queries), k), -1, dtype=np.int64)
+    _enable_reconstruct(index)
+    # Decode in chunks so large subsets of a compressed index stay bounded in memory
+    for start in range(0, len(ids), COPY_CHUNK):
+        chunk = ids[start:start + COPY_CHUNK]
+        chunk_distances, positions = faiss.knn(queries, index.reconstruct_batch(chunk), min(k, len(chunk)))
+        chunk_labels = np.where(positions >= 0, chunk[np.maximum(positions, 0)], -1)
+        merged_distances = np.hstack([distances, chunk_distances])
+        merged_labels = np.hstack([labels, chunk_labels])
+        order = np.argsort(merged_distances, axis=1, kind="stable")[:, :k]
+        distances = np.take_along_axis(merged_distances, order, axis=1)
+        labels = np.take_along_axis(merged_labels, order, axis=1)
+    return distances, labels
@@ -0,0 +1,144 @@
+"""Bulk offline analysis through the Message Batches API.
+
+Overnight runs over hundreds of articles submit every analysis prompt as one
+batch instead of making interactive calls: batches are billed at a discount,
+do not count against the interactive rate limits and need no client-side
+concurrency. ``run_batch_analysis`` submits the batch, polls until it has
+ended and returns the same result dicts as ``NewsAnalyzer.analyze_article``.
+
+Progress is checkpointed to a JSON state file after every step:
+
+- the id of the batch in flight, so a restarted run resumes polling it
+  instead of paying for the prompts twice,
+- the result of every finished article, so a rerun only submits the
+  articles that are missing or failed with a retryable error.
+
+Articles already in the analyzer's ``AnalysisCache`` are not submitted, and
+every collected analysis is written to it under the key ``analyze_article``
+uses, so a batch-analyzed article opened interactively costs no new call.
+
+Requests are keyed by a hash of the article and business context, so the
+default state file for a given set of articles is found again on rerun.
+
+Long articles are condensed chunk by chunk (``NewsAnalyzer.chunk_notes``)
+with interactive calls before submission; only their final analyses are
+batched.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from app.analyze_news import response_parts
+from app.persistence import atomic_write
+from app.scheduler import BULK
+
+BATCH_STATE_DIR = "analysis_output/batches"
+BATCH_POLL_SECONDS = float(os.getenv("ANALYSIS_BATCH_POLL_SECONDS", "60"))
+BATCH_MAX_ROUNDS = 3  # submissions per run: the first batch plus retries of retryable failures
+RETRYABLE_ERRORS = frozenset({"api_error", "overloaded_error", "rate_limit_error", "timeout_error",
+                              "expired", "canceled"})
+
+
+def request_id(article: Dict[str, Any], business_context: str) -> str:
+    """Batch ``custom_id`` of an article analysis (stable across runs)"""
+    payload = "\0".join([article.get('url', ''), article.get('title', ''), article.get('content', ''),
+                         business_context])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def default_state_path(ids: List[str]) -> str:
+    digest = hashlib.blake2b("\n".join(sorted(set(ids))).encode("ascii"), digest_size=8).hexdigest()
+    return os.path.join(BATCH_STATE_DIR, f"batch_{digest}.json")
+
+
+def _load_state(path: str) -> Dict[str, Any]:
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"batch_id": None, "results": {}, "errors": {}}
+
+
+def _save_state(state: Dict[str, Any], path: str):
+    def write(tmp_path: str):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+    atomic_write(path, write)
+
+
+def run_batch_analysis(analyzer, articles: List[Dict[str, Any]], business_context: str,
+                       state_path: Optional[str] = None, poll_interval: float = BATCH_POLL_SECONDS,
+                       max_rounds: int = BATCH_MAX_ROUNDS) -> List[Dict[str, Any]]:
+    """Analyze ``articles`` with one Message Batch (plus retry batches).
+
+    Args:
+        analyzer: ``NewsAnalyzer`` providing the client and the prompt
+        articles: Articles to analyze
+        business_context: Context passed to every analysis
+        state_path: Checkpoint file; defaults to one derived from the articles
+        poll_interval: Seconds between batch status checks
+        max_rounds: Batches submitted by this run at most
+
+    Returns:
+        One result per article in input order; failed articles get the
+        ``analyze_article`` error shape
+    """
+    ids = [request_id(article, business_context) for article in articles]
+    by_id = dict(zip(ids, articles))
+    state_path = state_path or default_state_path(ids)
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    state = _load_state(state_path)
+    keys = {}
+    for cid, article in by_id.items():
+        keys[cid], cached = analyzer.cached_analysis(article, business_context)
+        if cached is not None and cid not in state["results"]:
+            state["results"][cid] = cached
+            state["errors"].pop(cid, None)
+    batches = analyzer.client.messages.batches
+    call = analyzer.scheduler.call  # batch endpoints still count against the request rate limit
+
+    for _ in range(max_rounds):
+        if state["batch_id"] is None:
+            pending = [cid for cid in by_id if cid not in state["results"]
+                       and (cid not in state["errors"] or state["errors"][cid]["type"] in RETRYABLE_ERRORS)]
+            if not pending:
+                break
+            batch = call(batches.create, priority=BULK, requests=[
+                {"custom_id": cid, "params": analyzer.analysis_request(
+                    by_id[cid], business_context, analyzer.chunk_notes(by_id[cid], business_context))}
+                for cid in pending
+            ])
+            state["batch_id"] = batch.id
+            _save_state(state, state_path)
+            print(f"[batch_analysis] Submitted batch {batch.id} with {len(pending)} articles")
+        else:
+            print(f"[batch_analysis] Resuming batch {state['batch_id']}")
+
+        batch_id = state["batch_id"]
+        while call(batches.retrieve, batch_id, priority=BULK).processing_status != "ended":
+            time.sleep(poll_interval)
+
+        for entry in call(batches.results, batch_id, priority=BULK):
+            cid = entry.custom_id
+            if cid not in by_id:
+                continue
+            result = entry.result
+            if result.type == "succeeded":
+                state["results"][cid] = analyzer.analysis_result(by_id[cid], *response_parts(result.message.content),
+                                                                 result.message.stop_reason)
+                analyzer.cache_result(keys[cid], by_id[cid], state["results"][cid])
+                state["errors"].pop(cid, None)
+            elif result.type == "errored":
+                error = result.error.error
+                state["errors"][cid] = {"type": error.type, "message": error.message}
+            else:
+                state["errors"][cid] = {"type": result.type, "message": f"Batch request {result.type}"}
+        state["batch_id"] = None
+        _save_state(state, state_path)
+        print(f"[batch_analysis] Batch {batch_id} ended: {len(state['results'])}/{len(by_id)} articles analyzed, "
+              f"{len(state['errors'])} failed")
+
+    return [state["results"].get(cid) or analyzer.analysis_error(
+                article, state["errors"].get(cid, {}).get("message", "not analyzed"))
+            for cid, article in zip(ids, articles)]
@@ -1,8 +1,118 @@
 """Chat functionality for the Business News Analyzer."""
-from typing import List, Dict, Any
-from anthropic import Anthropic
-from datetime import datetime
-from config.settings import get_api_key
+import re
+import threading
+import time
+import traceback
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from app.chat_context import CHAT_CONTEXT_TOKENS, format_passages, get_passage_index
+from app.chunking import count_tokens
+from app.clients import get_anthropic_client, messages_args, stream_attempts
+from app.scheduler import INTERACTIVE, get_scheduler, request_tokens
+
+CHAT_MODEL = "claude-sonnet-4-20250514"
+CHAT_HISTORY_MESSAGES = 5  # previous chat messages sent along with each question
+CHAT_SYSTEM_PROMPT = (
+    "You are an AI assistant helping to analyze business news articles. "
+    "You have access to article content and previous analyses. "
+    "Provide clear, concise answers based on the article information. "
+    "If information is not in the articles, acknowledge this and provide general business insights instead. "
+    "Cite the articles you draw on by their source number in square brackets, e.g. [2]."
+)
+_CITATION = re.compile(r"\[(\d+)\]")
+
+
+def _article_block(source: int, article: Dict[str, Any]) -> str:
+    return (
+        f"[{source}] Article: {article['title']}\n"
+        f"Content: {article['content']}\n"
+        f"Analysis: {article.get('analysis', 'No analysis available')}"
+    )
+
+
+def articles_context_text(articles_context: List[Dict[str, Any]]) -> str:
+    """Article context block: every article's content and analysis, numbered as sources"""
+    return "\n\n".join(_article_block(source, article) for source, article in enumerate(articles_context, 1))
+
+
+def chat_context(user_message: str, articles_context: List[Dict[str, Any]]) -> Tuple[str, bool]:
+    """Article context for a question and whether it is the full context.
+
+    Articles whose full context fits ``CHAT_CONTEXT_TOKENS`` are sent whole;
+    for more, only the passages most relevant to the question are retrieved
+    (see ``app.chat_context``).
+    """
+    blocks, used = [], 0
+    for source, article in enumerate(articles_context, 1):
+        blocks.append(_article_block(source, article))
+        used += count_tokens(blocks[-1])
+        if used > CHAT_CONTEXT_TOKENS:  # stop counting as soon as the budget is exceeded
+            return format_passages(get_passage_index(articles_context).select(user_message)), False
+    return "\n\n".join(blocks), True
+
+
+def cited_sources(answer: str, articles_context: List[Dict[str, Any]]) -> List[Tuple[int, Dict[str, Any]]]:
+    """(source number, article) of every article cited in ``answer``, in source order"""
+    cited = {int(n) for n in _CITATION.findall(answer)}
+    return [(n, articles_context[n - 1]) for n in sorted(cited) if 1 <= n <= len(articles_context)]
+
+
+def with_sources(answer: str, articles_context: List[Dict[str, Any]]) -> str:
+    """``answer`` followed by the title and link of every article it cites"""
+    sources = cited_sources(answer, articles_context)
+    if not sources:
+        return answer
+    lines = [f"[{n}] [{article['title']}]({article['url']})" if article.get('url') else f"[{n}] {article['title']}"
+             for n, article in sources]
+    return answer + "\n\n**Sources**\n" + "\n".join(f"- {line}" for line in lines)
+
+
+def chat_request(user_message: str, articles_context: List[Dict[str, Any]],
+                 chat_history: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Messages API parameters for answering a chat message.
+
+    When the full article context fits the budget, the instructions and the
+    article context form a prefix that stays the same for every turn of a
+    conversation and is marked for prompt caching; the recent history and the
+    question follow it. Otherwise the passages retrieved for the question are
+    sent with the question, after the history.
+    """
+    history = list(chat_history or [])
+    if history and history[-1] == {"role": "user", "content": user_message}:
+        history = history[:-1]  # the UI appends the question before asking
+    history = history[-CHAT_HISTORY_MESSAGES:]
+    while history and history[0]["role"] != "user":
+        history = history[1:]
+
+    context, full = chat_context(user_message, articles_context)
+    if full:
+        system = [
+            {"type": "text", "text": CHAT_SYSTEM_PROMPT},
+            {"type": "text", "text": f"Article context:\n{context}", "cache_control": {"type": "ephemeral"}}
+        ]
+        question = f"Using the articles and chat history above as context, please answer this question: {user_message}"
+    else:
+        system = [{"type": "text", "text": CHAT_SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+        question = (
+            f"Article passages relevant to the question:\n{context}\n\n"
+            f"Using these passages and the chat history above as context, please answer this question: {user_message}"
+        )
+
+    return {
+        "model": CHAT_MODEL,
+        "max_tokens": 1000,
+        "temperature": 0.7,
+        "system": system,
+        "messages": [{"role": msg["role"], "content": msg["content"]} for msg in history] + [{
+            "role": "user",
+            "content": [
+                {
+                    "type": "text",
+                    "text": question
+                }
+            ]
+        }]
+    }
+
 
 def get_chat_response(user_message: str, articles_context: List[Dict[str, Any]], chat_history: List[Dict[str, Any]]) -> str:
     """Get a response from Claude for a chat message with article context.
@@ -13,62 +123,65 @@ def get_chat_response(user_message: str, articles_context: List[Dict[str, Any]],
         chat_history: List of previous chat messages
         
     Returns:
-        Claude's response text
+        Claude's response text, followed by the articles it cites
     """
     try:
-        # Initialize Claude client
-        api_key = get_api_key("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in configuration")
-        client = Anthropic(api_key=api_key)
-        
-        # Prepare article context
-        articles_text = "\n\n".join([
-            f"Article: {article['title']}\n"
-            f"Content: {article['content']}\n"
-            f"Analysis: {article.get('analysis', 'No analysis available')}"
-            for article in articles_context
-        ])
-        
-        # Prepare chat history context
-        history_text = ""
-        if chat_history:
-            history_text = "\n".join([
-                f"{'User' if msg['role'] == 'user' else 'Assistant'}: {msg['content']}"
-                for msg in chat_history[-5:]  # Include last 5 messages for context
-            ])
-        
-        # Create the system prompt
-        system_prompt = (
-            "You are an AI assistant helping to analyze business news articles. "
-            "You have access to article content and previous analyses. "
-            "Provide clear, concise answers based on the article information. "
-            "If information is not in the articles, acknowledge this and provide general business insights instead."
-        )
+        client = get_anthropic_client()
         
-        # Get response from Claude
-        response = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=1000,
-            temperature=0.7,
-            system=system_prompt,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": (
-                            f"Using the following articles and chat history as context, "
-                            f"please answer this question: {user_message}\n\n"
-                            f"Previous chat context:\n{history_text}\n\n"
-                            f"Article context:\n{articles_text}"
-                        )
-                    }
-                ]
-            }]
-        )
+        # Get response from Claude, ahead of queued bulk analysis calls
+        request = chat_request(user_message, articles_context, chat_history)
+        response = get_scheduler("claude").call(client.messages.create, priority=INTERACTIVE,
+                                                 tokens=request_tokens(request), **messages_args(request))
         
-        return response.content[0].text
+        return with_sources(response.content[0].text, articles_context)
         
     except Exception as e:
         return f"Error getting chat response: {str(e)}"
+
+
+def stream_chat_response(user_message: str, articles_context: List[Dict[str, Any]],
+                         chat_history: List[Dict[str, Any]],
+                         cancel: Optional[threading.Event] = None) -> Iterator[Dict[str, Any]]:
+    """Streaming ``get_chat_response``: yields the reply as it is generated.
+
+    Yields ``{'type': 'delta', 'text': ...}`` events, then one
+    ``{'type': 'done', 'text': ..., 'metrics': ...}`` event whose text is what
+    ``get_chat_response`` returns (or the partial reply, if cancelled). Setting
+    ``cancel`` (or closing the generator) stops the stream and frees its
+    connection. The metrics are seconds to the first token (``ttft``) and to
+    the end (``total``), the output ``tokens`` and ``tokens_per_sec`` after the
+    first token, and whether the reply was ``cancelled``.
+    """
+    start = time.perf_counter()
+    metrics = {'ttft': None, 'total': None, 'tokens': 0, 'tokens_per_sec': None, 'cancelled': False}
+    text = ""
+    try:
+        client = get_anthropic_client()
+        request = chat_request(user_message, articles_context, chat_history)
+        for attempt, opened in stream_attempts(client, get_scheduler("claude"), request, INTERACTIVE,
+                                               lambda: bool(text)):
+            with attempt, opened as stream:
+                for delta in stream.text_stream:
+                    if metrics['ttft'] is None:
+                        metrics['ttft'] = time.perf_counter() - start
+                    text += delta
+                    yield {'type': 'delta', 'text': delta}
+                    if cancel is not None and cancel.is_set():
+                        metrics['cancelled'] = True
+                        break
+                if metrics['cancelled']:
+                    metrics['tokens'] = count_tokens(text)  # no final usage for an aborted stream
+                else:
+                    metrics['tokens'] = stream.get_final_message().usage.output_tokens
+        text = with_sources(text, articles_context)
+    except Exception as e:
+        print(f"[stream_chat_response] Error: {str(e)}")
+        traceback.print_exc()
+        text = (text + "\n\n" if text else "") + f"Error getting chat response: {str(e)}"  # keep what was shown
+
+    metrics['total'] = time.perf_counter() - start
+    if metrics['ttft'] is not None and metrics['total'] > metrics['ttft']:
+        metrics['tokens_per_sec'] = metrics['tokens'] / (metrics['total'] - metrics['ttft'])
+    print(f"[stream_chat_response] first token {metrics['ttft'] or 0:.2f}s, {metrics['tokens']} tokens at "
+          f"{metrics['tokens_per_sec'] or 0:.1f} tokens/s{' (cancelled)' if metrics['cancelled'] else ''}")
+    yield {'type': 'done', 'text': text, 'metrics': metrics}
@@ -0,0 +1,99 @@
+"""Retrieval of article passages for chat questions.
+
+Sending the full content and analysis of every analyzed article with each
+chat message grows the prompt linearly with the number of articles until it
+no longer fits the context window. Instead, the analyzed articles are split
+into passages of at most ``CHAT_PASSAGE_TOKENS`` (section-aware, see
+``app.chunking``) and embedded locally with the vector store's embedder.
+Each question then gets only its most similar passages, up to
+``CHAT_MAX_PASSAGES`` passages and ``CHAT_CONTEXT_TOKENS`` tokens.
+
+Passages are labelled with the 1-based position of their article (``[n]``),
+so answers can cite their sources. The index of an article set is built once
+and reused by every question about the same articles.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.chunking import chunk_text, count_tokens
+from app.embeddings import Embedder, get_embedder
+from app.rag_utils import EMBEDDING_BACKEND, EMBEDDING_DIM
+
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "6000"))  # article context per question
+CHAT_PASSAGE_TOKENS = int(os.getenv("CHAT_PASSAGE_TOKENS", "300"))
+CHAT_MAX_PASSAGES = int(os.getenv("CHAT_MAX_PASSAGES", "12"))
+PASSAGE_INDEX_CACHE_SIZE = 8  # article sets whose passage index is kept
+
+
+def article_passages(articles: List[Dict[str, Any]], max_tokens: int = CHAT_PASSAGE_TOKENS) -> List[Dict[str, Any]]:
+    """Passages of the content and analysis of every article, labelled with the article's source number"""
+    passages = []
+    for source, article in enumerate(articles, 1):
+        for kind in ("content", "analysis"):
+            for text in chunk_text(article.get(kind) or "", max_tokens):
+                passages.append({"source": source, "title": article.get("title", "Untitled"),
+                                 "url": article.get("url", ""), "kind": kind, "text": text,
+                                 "tokens": count_tokens(text)})
+    return passages
+
+
+class PassageIndex:
+    def __init__(self, articles: List[Dict[str, Any]], embedder: Optional[Embedder] = None):
+        """Embed the passages of ``articles`` for retrieval"""
+        self.embedder = embedder or get_embedder(EMBEDDING_BACKEND, EMBEDDING_DIM)
+        self.passages = article_passages(articles)
+        # The title is embedded with every passage so questions naming an article find its passages
+        self.vectors = self.embedder.embed([f"{p['title']}\n{p['text']}" for p in self.passages])
+
+    def select(self, query: str, max_tokens: int = CHAT_CONTEXT_TOKENS,
+               max_passages: int = CHAT_MAX_PASSAGES) -> List[Dict[str, Any]]:
+        """The most similar passages to ``query`` that fit the budget, in article order"""
+        if not self.passages:
+            return []
+        scores = self.vectors @ self.embedder.embed([query])[0]
+        selected, used = [], 0
+        for i in np.argsort(-scores, kind="stable")[:max_passages]:
+            used += self.passages[i]["tokens"]
+            if used > max_tokens:  # smaller, less similar passages would only fill the gap with noise
+                break
+            selected.append(i)
+        return [self.passages[i] for i in sorted(selected)]
+
+
+def format_passages(passages: List[Dict[str, Any]]) -> str:
+    """Passages as prompt text, each headed by its source number, title and kind"""
+    return "\n\n".join(f"[{p['source']}] {p['title']} ({p['kind']}):\n{p['text']}" for p in passages)
+
+
+_shared_indexes: "OrderedDict[str, PassageIndex]" = OrderedDict()
+_shared_lock = threading.Lock()
+
+
+def _articles_digest(articles: List[Dict[str, Any]]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for article in articles:
+        for field in ("title", "url", "content", "analysis"):
+            digest.update(str(article.get(field) or "").encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def get_passage_index(articles: List[Dict[str, Any]]) -> PassageIndex:
+    """Passage index of ``articles``, built on first use and shared by later questions"""
+    key = _articles_digest(articles)
+    with _shared_lock:
+        index = _shared_indexes.get(key)
+        if index is not None:
+            _shared_indexes.move_to_end(key)
+            return index
+    index = PassageIndex(articles)  # built outside the lock; a concurrent duplicate build is harmless
+    print(f"[chat_context] Indexed {len(index.passages)} passages of {len(articles)} articles")
+    with _shared_lock:
+        _shared_indexes[key] = index
+        while len(_shared_indexes) > PASSAGE_INDEX_CACHE_SIZE:
+            _shared_indexes.popitem(last=False)
+    return index
@@ -0,0 +1,89 @@
+"""Token-budgeted, section-aware splitting of long article text.
+
+Filings and transcripts can be far longer than the analysis prompt should
+be. ``chunk_text`` splits such text into chunks of at most ``max_tokens``
+(estimated locally by ``count_tokens``, no API call) along its structure:
+
+- a new chunk starts at a heading (markdown ``#``, an ALL-CAPS line, a
+  filing "Item 7." / "Part II" line) or a transcript speaker turn once the
+  current chunk is at least half full,
+- paragraphs are never split unless a single paragraph exceeds the budget,
+  in which case it is split between sentences (and, for a run-on sentence,
+  between words).
+"""
+import re
+from typing import List, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SECTION_START = re.compile(
+    r"^(?:#{1,6} "  # markdown heading
+    r"|[A-Z][A-Z0-9 ,&'()/-]{3,80}$"  # ALL-CAPS heading line
+    r"|(?:Item|ITEM|Part|PART|Section|SECTION) [0-9IVX]+[A-Z]?\b"  # filing items
+    r"|[A-Z][\w.'-]*(?: [A-Z][\w.'-]*){0,3} ?(?:\([^)]{1,40}\))?: )",  # transcript speaker turn
+    re.MULTILINE,
+)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def count_tokens(text: str) -> int:
+    """Local estimate of the Claude token count of ``text``.
+
+    Words count one token per 4 characters (rounded up) and punctuation one
+    token each, which errs high rather than low for English prose.
+    """
+    return sum((len(token) + 3) // 4 for token in TOKEN_PATTERN.findall(text or ""))
+
+
+def split_sections(text: str) -> List[Tuple[bool, str]]:
+    """Paragraphs of ``text`` as (starts a section, paragraph) pairs"""
+    blocks = []
+    for paragraph in _PARAGRAPH_BREAK.split(text or ""):
+        # A heading directly followed by its body is its own paragraph
+        starts = [m.start() for m in _SECTION_START.finditer(paragraph)]
+        bounds = sorted(set([0] + starts)) + [len(paragraph)]
+        for start, end in zip(bounds, bounds[1:]):
+            block = paragraph[start:end].strip()
+            if block:
+                blocks.append((start in starts, block))
+    return blocks
+
+
+def _pieces(block: str, max_tokens: int) -> List[str]:
+    """``block`` split into pieces of at most ``max_tokens`` at sentence (or word) boundaries"""
+    if count_tokens(block) <= max_tokens:
+        return [block]
+    units = _SENTENCE_END.split(block)
+    if len(units) == 1:
+        units = block.split()
+    pieces, current, size = [], [], 0
+    for unit in units:
+        tokens = count_tokens(unit)
+        if current and size + tokens > max_tokens:
+            pieces.append(" ".join(current))
+            current, size = [], 0
+        if tokens > max_tokens:  # a single over-long word or sentence
+            pieces.extend(_pieces(unit, max_tokens) if " " in unit else [unit])
+            continue
+        current.append(unit)
+        size += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """Split ``text`` into section-aligned chunks of at most ``max_tokens`` tokens"""
+    chunks, current, size = [], [], 0
+    for starts_section, block in split_sections(text):
+        for i, piece in enumerate(_pieces(block, max_tokens)):
+            tokens = count_tokens(piece)
+            section_break = starts_section and i == 0 and size >= max_tokens // 2
+            if current and (size + tokens > max_tokens or section_break):
+                chunks.append("\n\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
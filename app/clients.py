@@ -0,0 +1,127 @@
+"""Process-wide, long-lived Anthropic and Tavily clients.
+
+A client owns a pool of keep-alive HTTPS connections, so creating one per call
+pays a new TCP and TLS handshake on every request. ``get_anthropic_client`` and
+``get_tavily_client`` hand out one client per API key instead, shared by every
+thread and session. Each pool holds as many connections as that service's
+scheduler lets calls run at once (``CLAUDE_MAX_CONCURRENCY`` /
+``TAVILY_MAX_CONCURRENCY``), so concurrent calls never wait for a connection
+and connections are not opened beyond what the scheduler admits.
+
+Request parameters built by this app are passed to the SDK through
+``messages_args``, which sends fields the installed SDK has no argument for
+(``temperature`` in anthropic 1.x) in the request body instead; streamed
+requests go through ``stream_attempts``.
+"""
+import inspect
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Dict, Iterator, Optional, Tuple
+
+import httpx
+import requests
+from anthropic import Anthropic, DefaultHttpxClient
+from anthropic.lib.streaming import MessageStream
+from anthropic.resources.messages import Messages
+from requests.adapters import HTTPAdapter
+from tavily import TavilyClient
+
+from app.scheduler import Scheduler, get_scheduler, request_tokens
+from config.settings import get_api_key
+
+KEEPALIVE_SECONDS = float(os.getenv("API_KEEPALIVE_SECONDS", "30"))  # idle connections are closed after this
+
+_CREATE_ARGS = frozenset(inspect.signature(Messages.create).parameters)
+_STREAM_ARGS = frozenset(inspect.signature(Messages.stream).parameters)
+
+
+def messages_args(params: Dict[str, Any], stream: bool = False) -> Dict[str, Any]:
+    """Keyword arguments of ``client.messages.create`` (``stream``) for Messages API ``params``.
+
+    Fields the installed SDK does not take as arguments are moved to ``extra_body``.
+    """
+    accepted = _STREAM_ARGS if stream else _CREATE_ARGS
+    args = {name: value for name, value in params.items() if name in accepted}
+    extra = {name: value for name, value in params.items() if name not in accepted}
+    if extra:
+        args["extra_body"] = {**(params.get("extra_body") or {}), **extra}
+    return args
+
+
+@contextmanager
+def _open_stream(client: Anthropic, scheduler: Scheduler, request: Dict[str, Any],
+                 priority: int) -> Iterator[MessageStream]:
+    with scheduler.slot(priority, request_tokens(request), track_latency=False), \
+            client.messages.stream(**messages_args(request, stream=True)) as stream:
+        yield stream
+
+
+def stream_attempts(client: Anthropic, scheduler: Scheduler, request: Dict[str, Any], priority: int,
+                    started: Callable[[], bool]) -> Iterator[Tuple[Any, ContextManager[MessageStream]]]:
+    """Retry loop of a streamed Messages request.
+
+    ``for attempt, opened in stream_attempts(...): with attempt, opened as stream: ...``
+    holds a ``scheduler`` slot and an open stream of ``request`` per attempt.
+    Failures are retried only while ``started()`` is False: text already
+    shown cannot be taken back.
+    """
+    for attempt in scheduler.retrying(retry_if=lambda e: not started()):
+        yield attempt, _open_stream(client, scheduler, request, priority)
+
+
+def pool_size(service: str) -> int:
+    """Connections to keep for ``service``: the most calls its scheduler runs at once"""
+    return get_scheduler(service).limit.maximum
+
+
+def new_anthropic_client(api_key: str, connections: Optional[int] = None, base_url: Optional[str] = None,
+                         verify: Any = True) -> Anthropic:
+    """Anthropic client with a keep-alive pool of ``connections`` (default ``pool_size("claude")``).
+
+    SDK retries are disabled; the shared scheduler retries instead.
+    """
+    connections = connections or pool_size("claude")
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections,
+                          keepalive_expiry=KEEPALIVE_SECONDS)
+    return Anthropic(api_key=api_key, base_url=base_url, max_retries=0,
+                     http_client=DefaultHttpxClient(limits=limits, verify=verify))
+
+
+def new_tavily_client(api_key: str, connections: Optional[int] = None) -> TavilyClient:
+    """Tavily client on a session pooling ``connections`` (default ``pool_size("tavily")``)"""
+    connections = connections or pool_size("tavily")
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return TavilyClient(api_key=api_key, session=session)
+
+
+_shared_clients: Dict[Tuple[str, str], Any] = {}
+_shared_lock = threading.Lock()
+
+
+def _shared_client(service: str, api_key: str, factory):
+    with _shared_lock:
+        client = _shared_clients.get((service, api_key))
+        if client is None:
+            client = _shared_clients[(service, api_key)] = factory(api_key)
+            print(f"[clients] Created {service} client with a pool of {pool_size(service)} connections")
+        return client
+
+
+def get_anthropic_client() -> Anthropic:
+    """Shared Anthropic client for the configured API key"""
+    api_key = get_api_key("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise ValueError("ANTHROPIC_API_KEY not found in configuration")
+    return _shared_client("claude", api_key, new_anthropic_client)
+
+
+def get_tavily_client() -> TavilyClient:
+    """Shared Tavily client for the configured API key"""
+    api_key = get_api_key("TAVILY_API_KEY")
+    if not api_key:
+        raise ValueError("Tavily API key not found. Please check your API key configuration.")
+    return _shared_client("tavily", api_key, new_tavily_client)
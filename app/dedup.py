@@ -0,0 +1,216 @@
+"""Ingest-time duplicate detection for the vector store.
+
+Two checks run on every incoming article:
+
+- exact: the article id (URL hash) or the normalised content hash is already
+  stored;
+- near-duplicate: the MinHash estimate (one-permutation hashing with
+  densification) of the Jaccard similarity between the article's word
+  3-shingles and a stored article's is at least ``JACCARD_THRESHOLD``.
+  Syndicated wire copies with a changed byline or an extra paragraph land
+  well above it; unrelated articles near zero.
+
+Signatures use ``NUM_BANDS`` x ``ROWS_PER_BAND`` MinHash values. Locality-
+sensitive hashing over the bands means only articles that agree on a whole
+band are compared; with 10 bands of 6 rows a pair at Jaccard 0.8 becomes a
+candidate with probability > 0.95. Stored band keys are sorted NumPy arrays
+searched with ``searchsorted``, so a lookup costs ten binary searches plus a
+few signature comparisons regardless of corpus size. Articles accepted since
+the last ``load`` live in small Python structures (see ``pending``).
+"""
+import hashlib
+import re
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+SHINGLE_SIZE = 3
+MIN_SHINGLES = 10  # shorter texts get no MinHash; they are only checked for exact duplicates
+NUM_BANDS = 10
+ROWS_PER_BAND = 6
+NUM_PERM = NUM_BANDS * ROWS_PER_BAND
+JACCARD_THRESHOLD = 0.8
+MINHASH_DTYPE = np.dtype((np.uint32, NUM_PERM))
+
+TOKEN_CACHE_SIZE = 500_000
+
+_WORD = re.compile(r"\w+")
+_token_hashes: Dict[str, int] = {}
+_EMPTY_BIN = np.uint64(0xFFFFFFFF)
+
+
+def _hash_token(token: str) -> int:
+    if len(_token_hashes) >= TOKEN_CACHE_SIZE:
+        _token_hashes.clear()
+    h = _token_hashes[token] = zlib.crc32(token.encode("utf-8"))
+    return h
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _minhash_tokens(tokens: List[str]) -> np.ndarray:
+    count = len(tokens) - SHINGLE_SIZE + 1
+    if count < MIN_SHINGLES:
+        return np.zeros(NUM_PERM, dtype=np.uint32)
+    get = _token_hashes.get
+    token_hashes = np.array([h if (h := get(t)) is not None else _hash_token(t) for t in tokens], dtype=np.uint64)
+    shingles = token_hashes[:count].copy()
+    for j in range(1, SHINGLE_SIZE):
+        shingles = _splitmix64(shingles) ^ token_hashes[j:j + count]
+    shingles = _splitmix64(shingles)
+
+    # One-permutation hashing: the low bits pick a bin, the high bits compete for its minimum
+    signature = np.full(NUM_PERM, _EMPTY_BIN, dtype=np.uint64)
+    np.minimum.at(signature, (shingles % np.uint64(NUM_PERM)).astype(np.intp), shingles >> np.uint64(32))
+    # Densify: an empty bin borrows the next non-empty bin's value (rotation)
+    filled = np.flatnonzero(signature != _EMPTY_BIN)
+    empty = np.flatnonzero(signature == _EMPTY_BIN)
+    if len(empty):
+        donors = filled[np.searchsorted(filled, empty) % len(filled)]
+        signature[empty] = signature[donors]
+    # Setting the low bit keeps real signatures distinguishable from the all-zero "none"
+    return (signature | np.uint64(1)).astype(np.uint32)
+
+
+def _content_hash_tokens(tokens: List[str]) -> int:
+    if not tokens:
+        return 0
+    digest = hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def content_hash(doc: Dict[str, Any]) -> int:
+    """64-bit hash of an article's normalised content (0 for empty content)"""
+    return _content_hash_tokens(_WORD.findall((doc.get("content") or "").lower()))
+
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature of the text's word shingles (all zeros when too short)"""
+    return _minhash_tokens(_WORD.findall((text or "").lower()))
+
+
+def signatures(doc: Dict[str, Any]) -> Tuple[int, np.ndarray]:
+    """``(content_hash(doc), minhash(doc["content"]))`` with a single tokenisation"""
+    tokens = _WORD.findall((doc.get("content") or "").lower())
+    return _content_hash_tokens(tokens), _minhash_tokens(tokens)
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """32-bit LSH key of every band, shape ``(n, NUM_BANDS)``"""
+    bands = np.asarray(signatures, dtype=np.uint64).reshape(-1, NUM_BANDS, ROWS_PER_BAND)
+    keys = np.zeros(bands.shape[:2], dtype=np.uint64)
+    for row in range(ROWS_PER_BAND):
+        keys = _splitmix64(keys ^ bands[:, :, row])
+    return (keys >> np.uint64(32)).astype(np.uint32)
+
+
+class Deduplicator:
+    def __init__(self, threshold: float = JACCARD_THRESHOLD):
+        """Exact + near-duplicate detector over stored article signatures"""
+        self.threshold = threshold
+        self.load(np.zeros(0, np.uint64), np.zeros(0, np.uint64), np.zeros((0, NUM_PERM), np.uint32))
+
+    def load(self, article_ids: np.ndarray, content_hashes: np.ndarray, minhashes: np.ndarray):
+        """(Re)build the lookup structures from stored signature columns.
+
+        ``minhashes`` may be a memory map; only candidate rows are read from it
+        after the band keys are built.
+        """
+        self._ids = np.unique(np.asarray(article_ids, dtype=np.uint64))
+        contents = np.asarray(content_hashes, dtype=np.uint64)
+        self._contents = np.unique(contents[contents != 0])
+        self._signatures = minhashes
+        keys = band_keys(minhashes) if len(minhashes) else np.zeros((0, NUM_BANDS), np.uint32)
+        valid = np.flatnonzero(np.asarray(minhashes[:, 0]) != 0) if len(minhashes) else np.zeros(0, np.int64)
+        self._band_keys = []
+        self._band_rows = []
+        for b in range(NUM_BANDS):
+            order = valid[np.argsort(keys[valid, b], kind="stable")]
+            self._band_keys.append(keys[order, b])
+            self._band_rows.append(order.astype(np.int32))
+        self._pending_ids = set()
+        self._pending_contents = set()
+        self._pending_signatures: List[np.ndarray] = []
+        self._pending_bands: List[Dict[int, List[int]]] = [{} for _ in range(NUM_BANDS)]
+
+    @property
+    def pending(self) -> int:
+        """Documents accepted since the last ``load``"""
+        return len(self._pending_ids)
+
+    @staticmethod
+    def _contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+        positions = np.searchsorted(sorted_values, values)
+        found = np.zeros(len(values), dtype=bool)
+        inside = positions < len(sorted_values)
+        found[inside] = sorted_values[positions[inside]] == values[inside]
+        return found
+
+    def _near_duplicate(self, signature: np.ndarray, keys: np.ndarray, ranges: List[Tuple[int, int]]) -> bool:
+        candidates, pending = set(), set()
+        for b in range(NUM_BANDS):
+            lo, hi = ranges[b]
+            if hi > lo:
+                candidates.update(self._band_rows[b][lo:hi].tolist())
+            pending.update(self._pending_bands[b].get(int(keys[b]), ()))
+        needed = self.threshold * NUM_PERM
+        if candidates:
+            rows = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+            if ((np.asarray(self._signatures[rows]) == signature).sum(axis=1) >= needed).any():
+                return True
+        return any((self._pending_signatures[i] == signature).sum() >= needed for i in pending)
+
+    def add(self, article_id: int, content: int, signature: np.ndarray, keys: Optional[np.ndarray] = None):
+        """Record an accepted document"""
+        self._pending_ids.add(article_id)
+        if content:
+            self._pending_contents.add(content)
+        if signature[0]:
+            position = len(self._pending_signatures)
+            self._pending_signatures.append(signature)
+            keys = band_keys(signature)[0] if keys is None else keys
+            for b, key in enumerate(keys.tolist()):
+                self._pending_bands[b].setdefault(key, []).append(position)
+
+    def filter(self, signatures: List[Tuple[int, int, np.ndarray]]) -> Tuple[List[int], Dict[str, int]]:
+        """Check a batch of (article id, content hash, minhash) signatures.
+
+        Lookups against the stored arrays are vectorised over the batch;
+        duplicates within the batch are caught through the pending structures,
+        and accepted documents are recorded immediately.
+
+        Returns:
+            Positions of the documents to keep and duplicate counts by reason.
+        """
+        keep = []
+        dropped = {"url": 0, "content": 0, "near": 0}
+        if not signatures:
+            return keep, dropped
+        ids = np.array([s[0] for s in signatures], dtype=np.uint64)
+        contents = np.array([s[1] for s in signatures], dtype=np.uint64)
+        minhashes = np.stack([s[2] for s in signatures])
+        known_ids = self._contains(self._ids, ids)
+        known_contents = self._contains(self._contents, contents)
+        keys = band_keys(minhashes)
+        ranges = [(np.searchsorted(self._band_keys[b], keys[:, b], side="left"),
+                   np.searchsorted(self._band_keys[b], keys[:, b], side="right")) for b in range(NUM_BANDS)]
+
+        for i, (article_id, content, signature) in enumerate(signatures):
+            if known_ids[i] or article_id in self._pending_ids:
+                reason = "url"
+            elif content and (known_contents[i] or content in self._pending_contents):
+                reason = "content"
+            elif signature[0] and self._near_duplicate(signature, keys[i], [(lo[i], hi[i]) for lo, hi in ranges]):
+                reason = "near"
+            else:
+                self.add(article_id, content, signature, keys[i])
+                keep.append(i)
+                continue
+            dropped[reason] += 1
+        return keep, dropped
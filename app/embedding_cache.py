@@ -0,0 +1,189 @@
+"""Persistent, content-addressed cache for document and query embeddings.
+
+Entries are keyed by a hash of (normalised text, embedding backend, dimension)
+and live in fixed-size memory-mapped arrays, so the cache survives Streamlit
+reruns and process restarts without any load step beyond mapping the files:
+
+- ``vectors.bin``   (capacity, dim) vectors, float16 by default
+- ``keys.bin``      (capacity,) hex digests, empty slots are blank
+- ``last_used.bin`` (capacity,) logical clock of the last access, 0 = free
+- ``stats.bin``     [clock, hits, misses, evictions]
+
+When the cache is full the least recently used slots are overwritten.
+
+Several instances (processes, or stores reopened on the same directory) may
+share a cache: lookups and stores hold ``cache.lock`` so slots are allocated
+by one instance at a time, and a hit is only trusted when the slot still holds
+its key, since another instance may have reused it.
+"""
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.locks import FileLock
+
+KEY_DTYPE = "S32"
+_STAT_CLOCK, _STAT_HITS, _STAT_MISSES, _STAT_EVICTIONS = range(4)
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys (unicode + whitespace normalisation)"""
+    return " ".join(unicodedata.normalize("NFKC", text or "").split())
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str, dim: int, capacity: int = 20000, dtype: str = "float16"):
+        """Open (or create) a cache in ``cache_dir`` holding up to ``capacity`` vectors"""
+        self.cache_dir = cache_dir
+        self.dim = dim
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._file_lock = FileLock(self._path("cache.lock"))
+        with self._file_lock.hold():
+            self._open()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _open(self):
+        layout = {"dim": self.dim, "capacity": self.capacity, "dtype": self.dtype.name, "version": 1}
+        meta_path = self._path("cache.json")
+        mode = "r+"
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                if json.load(f) != layout:
+                    mode = "w+"
+        except (OSError, ValueError):
+            mode = "w+"
+        if mode == "w+":
+            print(f"[embedding_cache] Creating embedding cache in {self.cache_dir} (capacity {self.capacity})")
+
+        self._vectors = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode=mode, shape=(self.capacity, self.dim))
+        self._keys = np.memmap(self._path("keys.bin"), dtype=KEY_DTYPE, mode=mode, shape=(self.capacity,))
+        self._last_used = np.memmap(self._path("last_used.bin"), dtype=np.int64, mode=mode, shape=(self.capacity,))
+        self._stats = np.memmap(self._path("stats.bin"), dtype=np.int64, mode=mode, shape=(4,))
+        if mode == "w+":
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(layout, f)
+
+        occupied = np.flatnonzero(self._last_used)
+        self._slots: Dict[bytes, int] = dict(zip(self._keys[occupied].tolist(), occupied.tolist()))
+
+    @staticmethod
+    def make_key(text: str, backend: str, dim: int) -> bytes:
+        """Content address for ``text`` embedded by ``backend`` at ``dim``"""
+        payload = f"{backend}\0{dim}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.blake2b(payload, digest_size=16).hexdigest().encode("ascii")
+
+    def _tick(self) -> int:
+        self._stats[_STAT_CLOCK] += 1
+        return int(self._stats[_STAT_CLOCK])
+
+    def get_many(self, keys: List[bytes]) -> Tuple[np.ndarray, List[int]]:
+        """Look up a batch of keys.
+
+        Returns:
+            A float32 ``(len(keys), dim)`` matrix with cached rows filled in and
+            the positions of the keys that missed.
+        """
+        vectors = np.zeros((len(keys), self.dim), dtype=np.float32)
+        missing = []
+        with self._lock, self._file_lock.hold():
+            now = self._tick()
+            for i, key in enumerate(keys):
+                slot = self._slot_of(key)
+                if slot is None:
+                    missing.append(i)
+                    continue
+                vectors[i] = self._vectors[slot]
+                self._last_used[slot] = now
+            self._stats[_STAT_HITS] += len(keys) - len(missing)
+            self._stats[_STAT_MISSES] += len(missing)
+        return vectors, missing
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray) -> np.ndarray:
+        """Store vectors for ``keys``, evicting least recently used entries.
+
+        Returns the vectors at cache precision, so a value is the same whether
+        it was just computed or later read back from the cache.
+        """
+        stored = np.asarray(vectors).astype(self.dtype)
+        with self._lock, self._file_lock.hold():
+            now = self._tick()
+            new = {}
+            for i, key in enumerate(keys):
+                slot = self._slot_of(key)
+                if slot is not None:
+                    self._last_used[slot] = now
+                else:
+                    new[key] = i
+            # Only the most recent `capacity` entries of an oversized batch can fit
+            pending = list(new.items())[-self.capacity:]
+            if pending:
+                slots = self._allocate(len(pending))
+                for slot, (key, i) in zip(slots, pending):
+                    self._vectors[slot] = stored[i]
+                    self._keys[slot] = key
+                    self._last_used[slot] = now
+                    self._slots[key] = slot
+        return stored.astype(np.float32)
+
+    def _slot_of(self, key: bytes) -> Optional[int]:
+        """Slot holding ``key``, forgetting the mapping if another instance reused the slot"""
+        slot = self._slots.get(key)
+        if slot is not None and self._keys[slot] != key:
+            del self._slots[key]
+            return None
+        return slot
+
+    def _allocate(self, count: int) -> List[int]:
+        free = np.flatnonzero(self._last_used == 0)[:count].tolist()
+        shortfall = count - len(free)
+        if shortfall > 0:
+            ages = np.where(self._last_used == 0, np.iinfo(np.int64).max, self._last_used)
+            victims = np.argpartition(ages, shortfall - 1)[:shortfall].tolist()
+            for slot in victims:
+                self._slots.pop(self._keys[slot], None)
+            self._stats[_STAT_EVICTIONS] += shortfall
+            free.extend(victims)
+        return free
+
+    def stats(self) -> Dict[str, float]:
+        """Cumulative hit/miss counters (persisted across processes)"""
+        hits = int(self._stats[_STAT_HITS])
+        misses = int(self._stats[_STAT_MISSES])
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "evictions": int(self._stats[_STAT_EVICTIONS]),
+            "entries": len(self._slots),
+            "capacity": self.capacity,
+        }
+
+    def flush(self):
+        """Write dirty pages back to disk"""
+        with self._lock:
+            for array in (self._vectors, self._keys, self._last_used, self._stats):
+                array.flush()
+
+    def close(self):
+        """Write dirty pages back and release the lock file; the cache must not be used afterwards"""
+        self.flush()
+        self._file_lock.close()
+
+    def clear(self):
+        """Drop every entry and reset the counters"""
+        with self._lock, self._file_lock.hold():
+            self._last_used[:] = 0
+            self._keys[:] = b""
+            self._stats[:] = 0
+            self._slots.clear()
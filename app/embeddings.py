@@ -0,0 +1,150 @@
+"""Local embedding backends for the vector store.
+
+Embedders turn a batch of texts into an ``(n, dim)`` float32 matrix in a single
+pass without any network I/O. The default backend is a signed feature-hashing
+encoder over word unigrams and bigrams: hashing every feature into ``dim``
+buckets with a random sign is a sparse random projection of the bag-of-ngrams
+vector, so texts that share vocabulary end up close in cosine/L2 space.
+
+Throughput target: the hashing backend should embed at least
+``TARGET_DOCS_PER_SEC`` (2,000) news articles of ~500 words per second on a
+single core at 1536 dimensions. ``benchmarks/bench_embeddings.py`` measures it.
+"""
+import re
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+DEFAULT_BACKEND = "hashing"
+TARGET_DOCS_PER_SEC = 2000
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9$%][a-z0-9$%.&'-]*[a-z0-9%]|[a-z0-9$%]")
+
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+few for from further had has have having he her here hers herself him himself his how
+i if in into is it its itself just me more most my myself no nor not now of off on
+once only or other our ours ourselves out over own same she should so some such than
+that the their theirs them themselves then there these they this those through to too
+under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves said says
+""".split())
+
+
+class Embedder:
+    """Base class for embedding backends.
+
+    Subclasses set ``name`` (used to key caches and persisted indexes) and
+    implement ``embed`` for a whole batch at once.
+    """
+
+    name = "base"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return an ``(len(texts), dim)`` float32 matrix of unit-norm rows"""
+        raise NotImplementedError
+
+
+class HashingEmbedder(Embedder):
+    """Signed feature-hashing encoder over word n-grams.
+
+    Term counts are damped with ``log1p`` (sublinear TF) so long articles are
+    not dominated by repeated boilerplate, and rows are L2-normalised.
+    """
+
+    name = "hashing-v1"
+
+    def __init__(self, dim: int, ngram_range: Tuple[int, int] = (1, 2), max_cached_tokens: int = 500_000):
+        super().__init__(dim)
+        self.ngram_range = ngram_range
+        self.max_cached_tokens = max_cached_tokens
+        self._token_hashes: Dict[str, int] = {}
+
+    def _tokenize(self, text: str) -> List[str]:
+        return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOP_WORDS]
+
+    def _hash_token(self, token: str) -> int:
+        if len(self._token_hashes) >= self.max_cached_tokens:
+            self._token_hashes.clear()
+        h = self._token_hashes[token] = zlib.crc32(token.encode("utf-8"))
+        return h
+
+    def _token_ids(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Hash every token of the batch; returns (hashes, row index per token)"""
+        get = self._token_hashes.get
+        hashes: List[int] = []
+        lengths = np.empty(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            tokens = self._tokenize(text or "")
+            hashes.extend([h if (h := get(t)) is not None else self._hash_token(t) for t in tokens])
+            lengths[i] = len(tokens)
+        rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        return np.asarray(hashes, dtype=np.uint64), rows
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        n = len(texts)
+        if n == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+
+        token_hashes, token_rows = self._token_ids(texts)
+
+        # n-gram hashes are combined from token hashes so only tokens hit Python
+        lo, hi = self.ngram_range
+        feature_hashes, feature_rows = [], []
+        for size in range(lo, hi + 1):
+            count = len(token_hashes) - size + 1
+            if count <= 0:
+                continue
+            combined = token_hashes[:count].copy()
+            for j in range(1, size):
+                combined = (combined * np.uint64(1000003)) ^ token_hashes[j:j + count]
+            rows = token_rows[:count]
+            same_doc = rows == token_rows[size - 1:size - 1 + count]
+            feature_hashes.append(_mix32(combined[same_doc] + np.uint64(size)))
+            feature_rows.append(rows[same_doc])
+
+        if not feature_hashes:
+            return np.zeros((n, self.dim), dtype=np.float32)
+        hashes = np.concatenate(feature_hashes)
+        rows = np.concatenate(feature_rows)
+
+        # Scatter every (row, bucket, sign) triple of the batch in one bincount
+        buckets = (hashes % np.uint64(self.dim)).astype(np.int64)
+        signs = np.where((hashes >> np.uint64(31)) & np.uint64(1), -1.0, 1.0)
+        counts = np.bincount(rows * self.dim + buckets, weights=signs, minlength=n * self.dim)
+        matrix = counts.reshape(n, self.dim).astype(np.float32)
+
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return matrix
+
+
+def _mix32(h: np.ndarray) -> np.ndarray:
+    """Murmur3 finaliser so bucket and sign bits are independent"""
+    mask = np.uint64(0xFFFFFFFF)
+    h = h & mask
+    h ^= h >> np.uint64(16)
+    h = (h * np.uint64(0x85EBCA6B)) & mask
+    h ^= h >> np.uint64(13)
+    h = (h * np.uint64(0xC2B2AE35)) & mask
+    h ^= h >> np.uint64(16)
+    return h
+
+
+EMBEDDING_BACKENDS = {
+    "hashing": HashingEmbedder,
+}
+
+
+def get_embedder(backend: str = DEFAULT_BACKEND, dim: int = 1536) -> Embedder:
+    """Instantiate an embedding backend by name"""
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'. Available: {', '.join(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[backend](dim)
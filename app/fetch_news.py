@@ -1,12 +1,13 @@
 from datetime import datetime
 from anthropic import Anthropic
-from tavily import TavilyClient
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
-from config.settings import get_api_key
+from app.clients import get_tavily_client
 from app.rag_utils import VectorStore
+from app.scheduler import INTERACTIVE, get_scheduler
+from config.settings import ANALYSIS_RAW_CONTENT
 
 def fetch_news(domain: str, context: str, num_articles: int = 5, search_depth: str = "advanced", 
                time_range: str = "day", include_domains: str = "", exclude_domains: str = ""):
@@ -31,12 +32,8 @@ def fetch_news(domain: str, context: str, num_articles: int = 5, search_depth: s
     
     query = f"{domain} for {context}" if context else domain
     
-    # Initialize Tavily client
-    tavily_api_key = get_api_key("TAVILY_API_KEY")
-    if not tavily_api_key:
-        raise ValueError("Tavily API key not found. Please check your API key configuration.")
-    print(f"[fetch_news] Initializing Tavily client with API key: {tavily_api_key[:4]}...")
-    tavily = TavilyClient(api_key=tavily_api_key)
+    # Shared Tavily client, reusing its open connections
+    tavily = get_tavily_client()
     
     # Process include/exclude domains
     include_domain_list = [d.strip() for d in include_domains.split('\n') if d.strip()] if include_domains else []
@@ -46,13 +43,16 @@ def fetch_news(domain: str, context: str, num_articles: int = 5, search_depth: s
     print(f"[fetch_news] Querying Tavily API with query='{query}', depth='{search_depth}', time_range='{time_range}'")
     
     try:
-        response = tavily.search(
+        # Throttled (429) and timed-out searches are retried with backoff by the shared Tavily scheduler
+        response = get_scheduler("tavily").call(
+            tavily.search,
+            priority=INTERACTIVE,
             query=query,
             search_depth=search_depth,
             max_results=num_articles,
             time_range=time_range,
             include_answer="advanced",
-            include_raw_content=True,
+            include_raw_content=ANALYSIS_RAW_CONTENT,
             include_domains=include_domain_list if include_domain_list else None,
             exclude_domains=exclude_domain_list if exclude_domain_list else None
         )
@@ -68,6 +68,7 @@ def fetch_news(domain: str, context: str, num_articles: int = 5, search_depth: s
                 'title': article['title'],
                 'url': article['url'],
                 'content': article['content'],
+                'raw_content': article.get('raw_content') or '',  # full page text, analyzed only with ANALYSIS_RAW_CONTENT
                 'score': article.get('relevance_score', 0),
                 'published_date': article.get('published_date', ''),
                 'source': article.get('domain', ''),
@@ -0,0 +1,334 @@
+"""Persistent BM25 inverted index for lexical retrieval.
+
+Dense vectors handle exact tokens such as tickers, names and figures ("q3",
+"$aapl", "3.5%") poorly, so the vector store keeps an inverted index next to
+FAISS and can fuse both rankings (``reciprocal_rank_fusion``).
+
+Postings are stored in immutable runs, each a set of flat NumPy arrays:
+
+- ``terms``  uint64  sorted 64-bit term hashes
+- ``starts`` int64   offset of each term's postings (one extra end offset)
+- ``docs``   uint32  document ids, ascending within a term
+- ``tfs``    uint8   term frequencies, capped at ``MAX_TF``
+
+That is 5 bytes per posting, and looking a term up is one binary search per
+run. New documents go into in-memory runs that are merged like a binary
+counter, so there are only O(log n) of them. ``flush`` (called by the vector
+store at checkpoint time) writes them out as a memory-mapped segment and
+records it in ``segments.json`` with an atomic rename. Segments are merged
+once a newer one is at least half the size of its predecessor. Documents
+newer than the last flush are re-indexed from the metadata store on startup,
+the same way the WAL replays vectors.
+"""
+import hashlib
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.embeddings import STOP_WORDS, TOKEN_PATTERN
+from app.persistence import atomic_write
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TF = 255
+MAX_MERGE_POSTINGS = 50_000_000  # segments above this size are left alone by merges
+RRF_K = 60
+MANIFEST_FILE = "segments.json"
+DOC_LENGTHS_FILE = "doc_lengths.bin"
+SEGMENT_ARRAYS = {"terms": np.uint64, "starts": np.int64, "docs": np.uint32, "tfs": np.uint8}
+TERM_CACHE_SIZE = 500_000
+
+_term_hashes: Dict[str, int] = {}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word, number and cashtag tokens without stop words ("$AAPL" -> "aapl")"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall((text or "").lower()):
+        token = token.lstrip("$") or token
+        if token not in STOP_WORDS:
+            tokens.append(token)
+    return tokens
+
+
+def term_hash(token: str) -> int:
+    """64-bit hash identifying a term in the posting lists"""
+    h = _term_hashes.get(token)
+    if h is None:
+        if len(_term_hashes) >= TERM_CACHE_SIZE:
+            _term_hashes.clear()
+        h = _term_hashes[token] = int.from_bytes(
+            hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return h
+
+
+def document_postings(texts: Sequence[str], start_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Tokenise a batch into ``(term hashes, doc ids, term frequencies, doc lengths)``"""
+    hashes, owners, lengths = [], [], np.zeros(len(texts), dtype=np.uint32)
+    for i, text in enumerate(texts):
+        tokens = tokenize(text)
+        lengths[i] = len(tokens)
+        hashes.extend(term_hash(t) for t in tokens)
+        owners.extend([i] * len(tokens))
+    if not hashes:
+        return np.zeros(0, np.uint64), np.zeros(0, np.uint32), np.zeros(0, np.uint8), lengths
+    hashes = np.array(hashes, dtype=np.uint64)
+    owners = np.array(owners, dtype=np.uint32)
+    order = np.lexsort((owners, hashes))
+    hashes, owners = hashes[order], owners[order]
+    # Runs of identical (term, doc) pairs collapse into one posting with its frequency
+    first = np.flatnonzero(np.r_[True, (hashes[1:] != hashes[:-1]) | (owners[1:] != owners[:-1])])
+    tfs = np.minimum(np.diff(np.r_[first, len(hashes)]), MAX_TF).astype(np.uint8)
+    return hashes[first], owners[first] + np.uint32(start_id), tfs, lengths
+
+
+class PostingRun:
+    def __init__(self, terms: np.ndarray, starts: np.ndarray, docs: np.ndarray, tfs: np.ndarray):
+        """Immutable posting lists sorted by term, then document"""
+        self.terms = terms
+        self.starts = starts
+        self.docs = docs
+        self.tfs = tfs
+
+    @classmethod
+    def from_postings(cls, hashes: np.ndarray, docs: np.ndarray, tfs: np.ndarray) -> "PostingRun":
+        """Build a run from postings already sorted by (term, doc)"""
+        first = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]]) if len(hashes) else np.zeros(0, np.int64)
+        starts = np.r_[first, len(hashes)].astype(np.int64)
+        return cls(hashes[first], starts, docs, tfs)
+
+    @classmethod
+    def load(cls, path: str) -> "PostingRun":
+        arrays = {}
+        for name, dtype in SEGMENT_ARRAYS.items():
+            file = f"{path}.{name}"
+            arrays[name] = (np.memmap(file, dtype=dtype, mode="r") if os.path.getsize(file)
+                            else np.zeros(0, dtype=dtype))
+        return cls(**arrays)
+
+    def save(self, path: str):
+        for name in SEGMENT_ARRAYS:
+            atomic_write(f"{path}.{name}", lambda tmp, name=name: getattr(self, name).tofile(tmp))
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def lookup(self, term: int) -> Tuple[np.ndarray, np.ndarray]:
+        """``(docs, tfs)`` posting list of one term hash"""
+        i = int(np.searchsorted(self.terms, term))
+        if i == len(self.terms) or self.terms[i] != term:
+            return self.docs[:0], self.tfs[:0]
+        lo, hi = int(self.starts[i]), int(self.starts[i + 1])
+        return self.docs[lo:hi], self.tfs[lo:hi]
+
+    @staticmethod
+    def merge(older: "PostingRun", newer: "PostingRun") -> "PostingRun":
+        """Merge two runs whose documents do not interleave (``older`` ids first)"""
+        terms = np.union1d(older.terms, newer.terms)
+        counts = np.zeros(len(terms), dtype=np.int64)
+        older_slots = np.searchsorted(terms, older.terms)
+        newer_slots = np.searchsorted(terms, newer.terms)
+        counts[older_slots] += np.diff(older.starts)
+        counts[newer_slots] += np.diff(newer.starts)
+        starts = np.r_[0, np.cumsum(counts)].astype(np.int64)
+
+        docs = np.empty(len(older) + len(newer), dtype=np.uint32)
+        tfs = np.empty(len(docs), dtype=np.uint8)
+        # Within a term, every posting of ``older`` precedes every posting of ``newer``
+        newer_offsets = starts[newer_slots] + counts[newer_slots] - np.diff(newer.starts)
+        for run, offsets in ((older, starts[older_slots]), (newer, newer_offsets)):
+            lengths = np.diff(run.starts)
+            target = np.repeat(offsets - run.starts[:-1], lengths) + np.arange(len(run), dtype=np.int64)
+            docs[target] = run.docs
+            tfs[target] = run.tfs
+        return PostingRun(terms, starts, docs, tfs)
+
+
+class LexicalIndex:
+    def __init__(self, directory: str):
+        """Open (or create) the inverted index in ``directory``"""
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        manifest = {"segments": [], "docs": 0, "next_segment": 0}
+        if os.path.exists(self._path(MANIFEST_FILE)):
+            with open(self._path(MANIFEST_FILE), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        self._segment_names: List[str] = manifest["segments"]
+        self._next_segment = manifest["next_segment"]
+        self._flushed_docs = manifest["docs"]
+        self.segments = [PostingRun.load(self._path(name)) for name in self._segment_names]
+        self._remove_orphans()
+
+        # Lengths beyond the manifest belong to an interrupted flush
+        lengths_path = self._path(DOC_LENGTHS_FILE)
+        lengths = np.fromfile(lengths_path, dtype=np.uint32) if os.path.exists(lengths_path) else np.zeros(0, np.uint32)
+        if len(lengths) > self._flushed_docs:
+            with open(lengths_path, "rb+") as f:
+                f.truncate(self._flushed_docs * 4)
+        self._lengths = np.zeros(max(1024, self._flushed_docs * 2), dtype=np.uint32)
+        self._lengths[:self._flushed_docs] = lengths[:self._flushed_docs]
+        self._count = self._flushed_docs
+        self._total_length = int(self._lengths[:self._count].sum())
+        self._runs: List[PostingRun] = []  # in memory, oldest first
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _remove_orphans(self):
+        live = {f"{name}.{suffix}" for name in self._segment_names for suffix in SEGMENT_ARRAYS}
+        for file in os.listdir(self.directory):
+            if file.startswith("seg_") and file not in live:
+                os.remove(self._path(file))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, start_id: int, texts: Sequence[str]):
+        """Index documents ``start_id .. start_id + len(texts) - 1``"""
+        self.add_postings(start_id, *document_postings(texts, start_id))
+
+    def add_postings(self, start_id: int, hashes: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                     lengths: np.ndarray):
+        """Index pre-tokenised documents (postings sorted by term, then doc)"""
+        if start_id != self._count:
+            raise ValueError(f"Lexical index holds {self._count} documents, cannot add at id {start_id}")
+        end = self._count + len(lengths)
+        if end > len(self._lengths):
+            self._lengths = np.concatenate([self._lengths, np.zeros(max(end, len(self._lengths)), np.uint32)])
+        self._lengths[self._count:end] = lengths
+        self._count = end
+        self._total_length += int(np.sum(lengths, dtype=np.int64))
+
+        self._runs.append(PostingRun.from_postings(hashes, docs, tfs))
+        while len(self._runs) > 1 and len(self._runs[-1]) * 2 >= len(self._runs[-2]):
+            newer = self._runs.pop()
+            self._runs[-1] = PostingRun.merge(self._runs[-1], newer)
+
+    def flush(self):
+        """Persist documents added since the last flush as a new segment"""
+        if self._count == self._flushed_docs:
+            return
+        run = self._runs[0]
+        for newer in self._runs[1:]:
+            run = PostingRun.merge(run, newer)
+        with open(self._path(DOC_LENGTHS_FILE), "ab") as f:
+            f.write(self._lengths[self._flushed_docs:self._count].tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_segment(run)
+        self.segments.append(PostingRun.load(self._path(self._segment_names[-1])))
+        self._runs = []
+        self._merge_segments()
+
+    def _write_segment(self, run: PostingRun, replaces: int = 0):
+        """Save ``run`` and swap it for the last ``replaces`` segments in the manifest"""
+        name = f"seg_{self._next_segment:06d}"
+        self._next_segment += 1
+        run.save(self._path(name))
+        retired = self._segment_names[len(self._segment_names) - replaces:] if replaces else []
+        self._segment_names = self._segment_names[:len(self._segment_names) - replaces] + [name]
+        self._flushed_docs = self._count
+        self._write_manifest()
+        for old in retired:
+            for suffix in SEGMENT_ARRAYS:
+                os.remove(self._path(f"{old}.{suffix}"))
+
+    def _merge_segments(self):
+        """Keep O(log n) segments by merging a newer one into a similar-sized predecessor"""
+        while len(self.segments) > 1:
+            older, newer = self.segments[-2], self.segments[-1]
+            if len(newer) * 2 < len(older) or len(older) + len(newer) > MAX_MERGE_POSTINGS:
+                break
+            merged = PostingRun.merge(older, newer)
+            del self.segments[-2:]
+            self._write_segment(merged, replaces=2)
+            self.segments.append(PostingRun.load(self._path(self._segment_names[-1])))
+
+    def reset(self):
+        """Drop every document and segment"""
+        for name in self._segment_names:
+            for suffix in SEGMENT_ARRAYS:
+                os.remove(self._path(f"{name}.{suffix}"))
+        self.segments, self._segment_names, self._runs = [], [], []
+        self._count = self._flushed_docs = 0
+        self._total_length = 0
+        self._write_manifest()
+        atomic_write(self._path(DOC_LENGTHS_FILE), lambda path: open(path, "wb").close())
+
+    def _write_manifest(self):
+        manifest = {"segments": self._segment_names, "docs": self._flushed_docs, "next_segment": self._next_segment}
+        atomic_write(self._path(MANIFEST_FILE), lambda path: _dump_json(manifest, path))
+
+    def search(self, query: str, k: int = 10, mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-``k`` documents by BM25 score.
+
+        Args:
+            query: Free text; tokenised like the documents
+            k: Number of results
+            mask: Optional boolean array over document ids; False rows are skipped
+
+        Returns:
+            ``(scores, ids)``, best first
+        """
+        terms = list(dict.fromkeys(term_hash(t) for t in tokenize(query)))
+        if not terms or not self._count:
+            return np.zeros(0, np.float32), np.zeros(0, np.int64)
+        average_length = self._total_length / self._count
+        runs = self.segments + self._runs
+
+        docs_parts, score_parts = [], []
+        for term in terms:
+            postings = [run.lookup(term) for run in runs]
+            docs = np.concatenate([p[0] for p in postings])
+            if not len(docs):
+                continue
+            tfs = np.concatenate([p[1] for p in postings]).astype(np.float32)
+            idf = math.log(1 + (self._count - len(docs) + 0.5) / (len(docs) + 0.5))
+            if mask is not None:
+                keep = mask[docs]
+                docs, tfs = docs[keep], tfs[keep]
+            norm = self._lengths[docs].astype(np.float32)
+            norm *= np.float32(BM25_K1 * BM25_B / average_length)
+            norm += np.float32(BM25_K1 * (1 - BM25_B))
+            norm += tfs
+            tfs *= np.float32(idf * (BM25_K1 + 1))
+            docs_parts.append(docs)
+            score_parts.append(tfs / norm)
+        if not docs_parts:
+            return np.zeros(0, np.float32), np.zeros(0, np.int64)
+
+        docs = np.concatenate(docs_parts)
+        scores = np.concatenate(score_parts)
+        if len(docs_parts) > 1 and len(docs) * 16 > self._count:
+            # Long posting lists: a dense accumulator beats sorting them
+            scores = np.bincount(docs, weights=scores, minlength=self._count)
+            docs = np.arange(self._count)
+        elif len(docs_parts) > 1:
+            docs, inverse = np.unique(docs, return_inverse=True)
+            scores = np.bincount(inverse, weights=scores)
+        if len(docs) > k:
+            # Docs are ascending here, so ties at the cut-off keep the lowest ids
+            kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+            above = np.flatnonzero(scores > kth)
+            top = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+            docs, scores = docs[top], scores[top]
+        order = np.lexsort((docs, -scores))
+        order = order[scores[order] > 0]
+        return scores[order].astype(np.float32), docs[order].astype(np.int64)
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int, rrf_k: int = RRF_K) -> List[int]:
+    """Fuse ranked id lists: each id scores ``sum(1 / (rrf_k + rank))``, best ``k`` returned"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:k]
+
+
+def _dump_json(obj, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
@@ -0,0 +1,101 @@
+"""Locks for stores shared between sessions, ingestion and processes.
+
+``ReadWriteLock``: any number of readers may hold the lock together; a writer
+holds it alone. Waiting writers take priority over newly arriving readers so a
+steady stream of searches cannot starve ingestion. The lock is not reentrant.
+
+``FileLock``: an exclusive lock on a file, held by one process (or one open
+instance) at a time.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(f):
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)  # gives up after ~10 s, so retry
+                return
+            except OSError:
+                continue
+
+    def _unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def _unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class ReadWriteLock:
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the duration of the block"""
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusively for the duration of the block"""
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class FileLock:
+    def __init__(self, path: str):
+        """Exclusive lock on ``path`` (created if missing).
+
+        Every ``FileLock`` opens its own handle, so two instances on the same
+        path exclude each other even within one process. Not reentrant, and
+        not meant to be shared by threads without a thread lock around it.
+        """
+        self.path = path
+        self._file = open(path, "a+b")
+
+    @contextmanager
+    def hold(self):
+        """Hold the lock for the duration of the block"""
+        _lock_file(self._file)
+        try:
+            yield
+        finally:
+            _unlock_file(self._file)
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,291 @@
+"""Columnar, memory-mapped metadata for the vector store.
+
+Replaces the pickled list of article dicts. Row ``i`` describes FAISS vector
+``i``; small fixed-width fields live in append-only column files that are
+memory-mapped on demand, and the full article dicts are JSON records in an
+offset-indexed blob that is only read for the rows a search returns:
+
+- ``article_id.bin`` uint64  hash of the article URL (or title + content)
+- ``timestamp.bin``  int64   publish time as Unix seconds, 0 if unknown
+- ``source_id.bin``  int32   index into ``sources.json``
+- ``tickers.bin``    8 x int32  indexes into ``tickers.json``, -1 padded
+- ``content_hash.bin`` uint64, ``minhash.bin`` 60 x uint32  duplicate-detection signatures
+- ``offset.bin`` / ``length.bin`` int64  location of the record in ``docs.blob``
+
+Opening a store only stats these files, so start-up time and resident memory
+do not grow with the corpus. The offset/length columns define the row count;
+any other column that is missing or short (e.g. one added by a newer release)
+is backfilled from the blob on open.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import numpy as np
+from dateutil import parser as date_parser
+
+from app.dedup import MINHASH_DTYPE, content_hash, minhash
+from app.persistence import atomic_write
+
+MAX_TICKERS = 8  # tickers kept per article
+COLUMNS = {
+    "article_id": np.uint64,
+    "timestamp": np.int64,
+    "source_id": np.int32,
+    "tickers": np.dtype((np.int32, MAX_TICKERS)),
+    "content_hash": np.uint64,
+    "minhash": MINHASH_DTYPE,
+    "offset": np.int64,
+    "length": np.int64,
+}
+LOCATION_COLUMNS = ("offset", "length")
+BACKFILL_CHUNK = 10_000
+BLOB_FILE = "docs.blob"
+SOURCES_FILE = "sources.json"
+TICKERS_FILE = "tickers.json"
+VOCABULARY_FILES = {"source": SOURCES_FILE, "ticker": TICKERS_FILE}
+
+# "$AAPL" cashtags and "(NASDAQ: AAPL)" style exchange mentions
+_TICKER_MENTION = re.compile(
+    r"(?<![\w$])\$([A-Z]{1,5}(?:\.[A-Z])?)\b"
+    r"|\((?:NYSE|NASDAQ|Nasdaq|AMEX|NYSE American|LSE|TSX)\s*:\s*([A-Z]{1,5}(?:\.[A-Z])?)\)"
+)
+
+
+def article_id(doc: Dict[str, Any]) -> int:
+    """Stable 64-bit id of an article: its URL, or title + content without one"""
+    key = doc.get("url") or f"{doc.get('title', '')}\0{doc.get('content', '')}"
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def source_of(doc: Dict[str, Any]) -> str:
+    """Publisher domain of an article, falling back to its URL's host"""
+    source = doc.get("source") or urlparse(doc.get("url", "")).netloc
+    source = source.lower()
+    return source[4:] if source.startswith("www.") else source
+
+
+def tickers_of(doc: Dict[str, Any]) -> List[str]:
+    """Tickers an article is tagged with, plus cashtags and exchange mentions in its text"""
+    tagged = doc.get("tickers") or []
+    if isinstance(tagged, str):
+        tagged = tagged.split(",")
+    text = f"{doc.get('title', '')}\n{doc.get('content', '')}"
+    found = [t.strip().upper() for t in tagged] + [a or b for a, b in _TICKER_MENTION.findall(text)]
+    return list(dict.fromkeys(t for t in found if t))[:MAX_TICKERS]
+
+
+def to_timestamp(value: Any) -> int:
+    """Unix seconds for a datetime, date string or number (0 when unparseable)"""
+    if isinstance(value, (int, float, np.integer)):
+        return int(value)
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = date_parser.parse(value)
+        except (ValueError, OverflowError, TypeError):
+            return 0
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp())
+
+
+def timestamp_of(doc: Dict[str, Any]) -> int:
+    """Publish time in Unix seconds (0 when missing or unparseable)"""
+    value = doc.get("published_date") or doc.get("timestamp")
+    if not value:
+        return 0
+    return to_timestamp(value)
+
+
+class MetadataStore:
+    def __init__(self, directory: str):
+        """Open the columnar metadata store in ``directory``"""
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._maps: Dict[str, np.ndarray] = {}
+        os.makedirs(directory, exist_ok=True)
+
+        # Interned strings behind the source_id and tickers columns
+        self.vocabularies: Dict[str, List[str]] = {}
+        self._vocabulary_ids: Dict[str, Dict[str, int]] = {}
+        for kind, filename in VOCABULARY_FILES.items():
+            names = []
+            if os.path.exists(self._path(filename)):
+                with open(self._path(filename), "r", encoding="utf-8") as f:
+                    names = json.load(f)
+            self.vocabularies[kind] = names
+            self._vocabulary_ids[kind] = {name: i for i, name in enumerate(names)}
+        self.sources = self.vocabularies["source"]
+        self.tickers = self.vocabularies["ticker"]
+        self._count = self._recover()
+        self._blob = open(self._path(BLOB_FILE), "a+b")
+        self._backfill()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _column_path(self, name: str) -> str:
+        return self._path(f"{name}.bin")
+
+    def _rows_on_disk(self, name: str) -> int:
+        path = self._column_path(name)
+        return os.path.getsize(path) // np.dtype(COLUMNS[name]).itemsize if os.path.exists(path) else 0
+
+    def _recover(self) -> int:
+        """Row count after trimming a partially written append"""
+        count = min(self._rows_on_disk(name) for name in LOCATION_COLUMNS)
+        blob_path = self._path(BLOB_FILE)
+        blob_size = os.path.getsize(blob_path) if os.path.exists(blob_path) else 0
+        if count:
+            offsets = np.memmap(self._column_path("offset"), dtype=np.int64, mode="r", shape=(count,))
+            lengths = np.memmap(self._column_path("length"), dtype=np.int64, mode="r", shape=(count,))
+            while count and offsets[count - 1] + lengths[count - 1] > blob_size:
+                count -= 1
+            blob_end = int(offsets[count - 1] + lengths[count - 1]) if count else 0
+            del offsets, lengths
+        else:
+            blob_end = 0
+
+        for name, dtype in COLUMNS.items():
+            path = self._column_path(name)
+            if os.path.exists(path) and os.path.getsize(path) > count * np.dtype(dtype).itemsize:
+                with open(path, "rb+") as f:
+                    f.truncate(count * np.dtype(dtype).itemsize)
+        if blob_size > blob_end:
+            with open(blob_path, "rb+") as f:
+                f.truncate(blob_end)
+        return count
+
+    def _backfill(self):
+        """Compute rows missing from derived columns by re-reading the blob"""
+        for name in COLUMNS:
+            have = self._rows_on_disk(name)
+            if have >= self._count:
+                continue
+            print(f"[metadata_store] Backfilling column '{name}' for {self._count - have} rows")
+            for start in range(have, self._count, BACKFILL_CHUNK):
+                documents = self.get_many(list(range(start, min(start + BACKFILL_CHUNK, self._count))))
+                with open(self._column_path(name), "ab") as f:
+                    f.write(self._derive(name, documents).tobytes())
+
+    def _derive(self, name: str, documents: List[Dict[str, Any]]) -> np.ndarray:
+        """Value of column ``name`` for each document"""
+        if name == "minhash":
+            signatures = [minhash(d.get("content", "")) for d in documents]
+            return np.array(signatures, dtype=np.uint32).reshape(len(documents), MINHASH_DTYPE.shape[0])
+        if name == "tickers":
+            column = np.full((len(documents), MAX_TICKERS), -1, dtype=np.int32)
+            for row, doc in enumerate(documents):
+                ids = [self._intern("ticker", t) for t in tickers_of(doc)]
+                column[row, :len(ids)] = ids
+            return column
+        if name == "source_id":
+            values = (self._intern("source", source_of(d)) for d in documents)
+        else:
+            extract = {"article_id": article_id, "timestamp": timestamp_of, "content_hash": content_hash}[name]
+            values = (extract(d) for d in documents)
+        return np.fromiter(values, dtype=COLUMNS[name], count=len(documents))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return self.get_many(list(range(*position.indices(self._count))))
+        return self.get_many([position])[0]
+
+    def _intern(self, kind: str, name: str) -> int:
+        ids = self._vocabulary_ids[kind]
+        value = ids.get(name)
+        if value is None:
+            names = self.vocabularies[kind]
+            value = ids[name] = len(names)
+            names.append(name)
+            atomic_write(self._path(VOCABULARY_FILES[kind]), lambda path: _dump_json(names, path))
+        return value
+
+    def lookup(self, kind: str, name: str) -> Optional[int]:
+        """Interned id of a source or ticker, None if no stored row uses it"""
+        return self._vocabulary_ids[kind].get(name)
+
+    def extend(self, documents: Iterable[Dict[str, Any]], columns: Optional[Dict[str, np.ndarray]] = None):
+        """Append documents as new rows.
+
+        ``columns`` may carry precomputed values (e.g. dedup signatures) so
+        they are not derived twice.
+        """
+        documents = list(documents)
+        columns = dict(columns or {})
+        if not documents:
+            return
+        with self._lock:
+            records = [json.dumps(doc, default=str).encode("utf-8") for doc in documents]
+            lengths = np.fromiter((len(r) for r in records), dtype=np.int64, count=len(records))
+            self._blob.seek(0, os.SEEK_END)
+            start = self._blob.tell()
+            offsets = start + np.concatenate(([0], np.cumsum(lengths)[:-1])).astype(np.int64)
+            self._blob.write(b"".join(records))
+            self._blob.flush()
+
+            columns["offset"] = offsets
+            columns["length"] = lengths
+            for name in COLUMNS:
+                if name not in columns:
+                    columns[name] = self._derive(name, documents)
+            # Location columns last: they define which rows are committed
+            for name in sorted(COLUMNS, key=lambda n: n in LOCATION_COLUMNS):
+                with open(self._column_path(name), "ab") as f:
+                    # Cast to the base dtype: a subarray dtype would broadcast every value
+                    f.write(np.asarray(columns[name], dtype=np.dtype(COLUMNS[name]).base).tobytes())
+            self._count += len(documents)
+            self._maps.clear()
+
+    def column(self, name: str) -> np.ndarray:
+        """Read-only memory map of one fixed-width column"""
+        with self._lock:
+            mapped = self._maps.get(name)
+            if mapped is None or len(mapped) != self._count:
+                if self._count == 0:
+                    return np.zeros(0, dtype=COLUMNS[name])  # subarray dtypes expand to (0, width)
+                mapped = np.memmap(self._column_path(name), dtype=COLUMNS[name], mode="r", shape=(self._count,))
+                self._maps[name] = mapped
+            return mapped
+
+    def get_many(self, positions: List[int]) -> List[Dict[str, Any]]:
+        """Load the full article dicts for ``positions`` from the blob"""
+        offsets = self.column("offset")
+        lengths = self.column("length")
+        documents = []
+        with self._lock:
+            for position in positions:
+                self._blob.seek(int(offsets[position]))
+                documents.append(json.loads(self._blob.read(int(lengths[position]))))
+        return documents
+
+    def flush(self):
+        """fsync every file so the rows survive a crash"""
+        with self._lock:
+            self._blob.flush()
+            os.fsync(self._blob.fileno())
+            for name in COLUMNS:
+                path = self._column_path(name)
+                if os.path.exists(path):
+                    with open(path, "rb+") as f:
+                        os.fsync(f.fileno())
+
+    def close(self):
+        with self._lock:
+            self._maps.clear()
+            self._blob.close()
+
+
+def _dump_json(obj: Any, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
@@ -0,0 +1,154 @@
+"""Crash-safe incremental persistence for the vector store.
+
+New documents are appended to a write-ahead log (WAL) instead of rewriting the
+whole index: each record holds the id of its first vector, the float32
+vectors and the pickled metadata, guarded by a CRC. Periodically the store
+checkpoints, writing the base index and metadata to temporary files that are
+atomically renamed into place, and only then truncates the log.
+
+Replay is idempotent because records carry their start id: anything already
+present in the checkpoint is skipped, so a crash at any point (including
+between the two renames of a checkpoint) recovers to a consistent state. A
+torn record at the end of the log is discarded.
+"""
+import os
+import pickle
+import struct
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+WAL_MAGIC = b"WAL1"
+# magic, vector count, dim, metadata bytes, start id, crc32 of payload
+_HEADER = struct.Struct("<4sIIIQI")
+
+
+def fsync_dir(path: str):
+    """Persist a directory entry change such as a rename (no-op on Windows)"""
+    if os.name == "nt":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path: str, write: Callable[[str], None]):
+    """Write ``path`` via a temporary file and an atomic rename.
+
+    ``write`` receives the temporary path and must fully write it.
+    """
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    with open(tmp_path, "rb+") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+class WriteAheadLog:
+    def __init__(self, path: str, dim: int, sync: bool = True):
+        """Append-only log of (start id, vectors, metadata) records"""
+        self.path = path
+        self.dim = dim
+        self.sync = sync
+        self.pending_docs = 0
+
+    def append(self, start_id: int, vectors: np.ndarray, metadata: List[Dict[str, Any]]):
+        """Durably append one batch; the batch is committed once this returns"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        meta_bytes = pickle.dumps(metadata, protocol=pickle.HIGHEST_PROTOCOL)
+        payload = vectors.tobytes() + meta_bytes
+        header = _HEADER.pack(WAL_MAGIC, len(vectors), self.dim, len(meta_bytes), start_id, zlib.crc32(payload))
+        with open(self.path, "ab") as f:
+            f.write(header + payload)
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        self.pending_docs += len(vectors)
+
+    def replay(self) -> Iterator[Tuple[int, np.ndarray, List[Dict[str, Any]]]]:
+        """Yield committed records, truncating a torn or corrupt tail"""
+        if not os.path.exists(self.path):
+            return
+        good_offset = 0
+        self.pending_docs = 0
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                magic, count, dim, meta_len, start_id, crc = _HEADER.unpack(header)
+                if magic != WAL_MAGIC or dim != self.dim:
+                    break
+                payload = f.read(count * dim * 4 + meta_len)
+                if len(payload) < count * dim * 4 + meta_len or zlib.crc32(payload) != crc:
+                    break
+                vectors = np.frombuffer(payload, dtype=np.float32, count=count * dim).reshape(count, dim)
+                metadata = pickle.loads(payload[count * dim * 4:])
+                good_offset = f.tell()
+                self.pending_docs += count
+                yield start_id, vectors, metadata
+
+        if good_offset < os.path.getsize(self.path):
+            print(f"[persistence] Discarding torn WAL tail after byte {good_offset}")
+            with open(self.path, "rb+") as f:
+                f.truncate(good_offset)
+
+    def size(self) -> int:
+        """Log size in bytes"""
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def reset(self):
+        """Empty the log after its contents were checkpointed"""
+        with open(self.path, "wb") as f:
+            f.flush()
+            if self.sync:
+                os.fsync(f.fileno())
+        self.pending_docs = 0
+
+
+class VectorFile:
+    def __init__(self, path: str, dim: int):
+        """Append-only float32 matrix on disk, read back through a memory map.
+
+        Keeps the exact vectors of a compressed index for re-ranking without
+        holding them in RAM.
+        """
+        self.path = path
+        self.dim = dim
+        self._map = None
+        if not os.path.exists(path):
+            open(path, "ab").close()
+        self._rows = os.path.getsize(path) // (4 * dim)
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def append(self, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        with open(self.path, "ab") as f:
+            f.write(vectors.tobytes())
+        self._rows += len(vectors)
+        self._map = None
+
+    def truncate(self, rows: int):
+        """Drop rows past ``rows``, e.g. ones written after the last checkpoint"""
+        with open(self.path, "rb+") as f:
+            f.truncate(rows * 4 * self.dim)
+        self._rows = min(self._rows, rows)
+        self._map = None
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        """Rows ``ids`` as an ``(len(ids), dim)`` float32 array"""
+        if self._map is None:
+            if not self._rows:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return np.asarray(self._map[np.asarray(ids, dtype=np.int64)])
+
+    def flush(self):
+        with open(self.path, "rb+") as f:
+            os.fsync(f.fileno())
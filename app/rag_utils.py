@@ -2,113 +2,600 @@ import numpy as np
 import faiss
 import os
 import pickle
-from typing import List, Dict, Any
-from anthropic import Anthropic
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Union
+
+from app import ann_index
+from app.dedup import Deduplicator, signatures as dedup_signatures
+from app.embedding_cache import EmbeddingCache
+from app.embeddings import Embedder, get_embedder
+from app.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from app.locks import ReadWriteLock
+from app.metadata_store import MetadataStore, article_id
+from app.persistence import VectorFile, WriteAheadLog, atomic_write
+from app.search_filters import FilterIndex, SearchFilter
 
 # Initialize constants
 INDEX_DIR = "faiss_index"
 INDEX_FILE = f"{INDEX_DIR}/news.idx"
-META_FILE = f"{INDEX_DIR}/meta.pkl"
+META_FILE = f"{INDEX_DIR}/meta.pkl"  # legacy pickled metadata, migrated on load
+METADATA_DIR = f"{INDEX_DIR}/metadata"
+WAL_FILE = f"{INDEX_DIR}/wal.log"
+LEXICAL_DIR = f"{INDEX_DIR}/lexical"
+VECTORS_FILE = f"{INDEX_DIR}/vectors.f32"  # exact vectors kept for re-ranking a compressed index
+CHECKPOINT_MIN_DOCS = 10_000  # checkpoint once the WAL holds this many documents...
+CHECKPOINT_RATIO = 0.1  # ...or this fraction of the store, whichever is larger
+DEDUP_REBUILD_PENDING = 10_000  # accepted documents (or 10% of the store) before dedup arrays are rebuilt
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "vector")
+HYBRID_CANDIDATES = 50  # hits taken from each retriever before rank fusion
+LEXICAL_REINDEX_CHUNK = 10_000
+EXACT_FILTER_MAX = 2048  # filters matching at most this many documents are searched exactly
 EMBEDDING_DIM = 1536  # Using standard embedding dimension
-
-print("[rag_utils] Initializing vector store components")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_CACHE_DIR = f"{INDEX_DIR}/embedding_cache"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))  # 0 disables the cache
+INDEX_TYPE = os.getenv("VECTOR_INDEX_TYPE", "flat")  # flat, ivf_flat, ivf_pq or hnsw
+IVF_NLIST = int(os.getenv("VECTOR_INDEX_NLIST", "0")) or None  # None sizes the IVF from the corpus
+IVF_RETRAIN_GROWTH = float(os.getenv("VECTOR_INDEX_RETRAIN_GROWTH", "4"))  # retrain an auto-sized IVF after this growth, 0 never
+COMPRESSION = os.getenv("VECTOR_COMPRESSION", "none")  # none, fp16, sq8 or pq
+RERANK_FACTOR = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))  # compressed search fetches k * factor, 0 disables re-ranking
+# Map checkpoints read-only instead of reading them into the heap (off on Windows,
+# where a mapped file cannot be replaced by the next checkpoint)
+INDEX_MMAP = os.getenv("VECTOR_INDEX_MMAP", "1" if os.name == "posix" else "0") == "1"
 
 class VectorStore:
-    def __init__(self):
-        """Initialize vector store with FAISS"""
-        self.index = faiss.IndexFlatL2(EMBEDDING_DIM)
-        self.metadata = []
+    def __init__(self, index_dir: str = INDEX_DIR, embedder: Optional[Embedder] = None,
+                 cache_size: int = EMBEDDING_CACHE_SIZE, index_type: str = INDEX_TYPE,
+                 nlist: Optional[int] = IVF_NLIST, compression: str = COMPRESSION,
+                 rerank_factor: int = RERANK_FACTOR, embedding_cache: Optional[EmbeddingCache] = None,
+                 mmap: bool = INDEX_MMAP):
+        """Initialize vector store with FAISS.
+
+        Args:
+            index_dir: Directory holding the index, metadata and embedding cache
+            embedder: Embedding backend (defaults to ``EMBEDDING_BACKEND``)
+            cache_size: Embedding cache capacity in vectors, 0 to disable
+            index_type: One of ``ann_index.INDEX_TYPES``; IVF types start flat
+                and are trained automatically once enough vectors exist
+            nlist: Number of IVF cells (None sizes it from the corpus)
+            compression: One of ``ann_index.COMPRESSIONS``; trained codecs
+                start uncompressed like IVF types
+            rerank_factor: With compression, search ``k * rerank_factor``
+                candidates and re-rank them with the exact vectors kept on disk
+                (0 disables re-ranking and the on-disk copy)
+            embedding_cache: Cache to share with other stores (overrides ``cache_size``)
+            mmap: Memory-map the checkpoint read-only so startup does not read
+                the whole index; it is copied into memory on the first write
+        """
+        if index_type not in ann_index.INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Available: {', '.join(ann_index.INDEX_TYPES)}")
+        self.index_type = index_type
+        self.nlist = nlist
+        self.compression = ann_index.effective_compression(index_type, compression)
+        self.rerank_factor = rerank_factor
+        self.mmap = mmap
+        self._index_mapped = False
+        self._delta = None  # flat index of WAL records replayed on top of a mapped checkpoint
+        self.index_dir = index_dir
+        self.index_file = os.path.join(index_dir, os.path.basename(INDEX_FILE))
+        self.meta_file = os.path.join(index_dir, os.path.basename(META_FILE))
+        self.metadata_dir = os.path.join(index_dir, os.path.basename(METADATA_DIR))
+        self.embedder = embedder or get_embedder(EMBEDDING_BACKEND, EMBEDDING_DIM)
+        initial_type, initial_compression = self._target_index(0)
+        self.index = ann_index.create_index(initial_type, self.embedder.dim, compression=initial_compression)
         
         # Create directory if it doesn't exist
-        if not os.path.exists(INDEX_DIR):
-            os.makedirs(INDEX_DIR)
-            print(f"[rag_utils] Created directory: {INDEX_DIR}")
+        if not os.path.exists(self.index_dir):
+            os.makedirs(self.index_dir)
+            print(f"[rag_utils] Created directory: {self.index_dir}")
+
+        # Embedding cache shared by documents and queries
+        self.embedding_cache = embedding_cache
+        self._owns_cache = embedding_cache is None and cache_size > 0
+        if self._owns_cache:
+            cache_dir = os.path.join(self.index_dir, os.path.basename(EMBEDDING_CACHE_DIR))
+            self.embedding_cache = EmbeddingCache(cache_dir, self.embedder.dim, capacity=cache_size)
+            
+        # Columnar metadata, row i describing vector i
+        self.metadata = MetadataStore(self.metadata_dir)
+        self._dedup = None  # built from the signature columns on first ingest
+        self._filter_index = None  # built on the first filtered search
+
+        # BM25 inverted index over title + content, row i describing vector i
+        self.lexical = LexicalIndex(os.path.join(index_dir, os.path.basename(LEXICAL_DIR)))
+
+        # Exact copies of compressed vectors, read only for re-ranking
+        self.exact_vectors = None
+        if self.compression != "none" and rerank_factor > 0:
+            self.exact_vectors = VectorFile(os.path.join(index_dir, os.path.basename(VECTORS_FILE)), self.embedder.dim)
+
+        # Last checkpoint plus the write-ahead log of documents added since
+        self.wal = WriteAheadLog(os.path.join(index_dir, os.path.basename(WAL_FILE)), self.embedder.dim)
+
+        # Many concurrent searches, one writer at a time: writers prepare batches
+        # (dedup, embedding, WAL, index conversion, checkpoint) holding only
+        # `_writer` and take `lock` exclusively just to publish them in memory
+        self.lock = ReadWriteLock()
+        self._writer = threading.RLock()
+        self._filter_lock = threading.Lock()
+        self.load()
             
-        # Load existing index if it exists
-        if os.path.exists(INDEX_FILE):
-            self.load()
+    def load(self):
+        """Load the last checkpoint and replay the write-ahead log"""
+        if os.path.exists(self.index_file):
+            print(f"[rag_utils] Loading existing FAISS index from {self.index_file}")
+            self.index = ann_index.read_index(self.index_file, mmap=self.mmap)
+            self._index_mapped = self.mmap
+            self._migrate_pickled_metadata()
+            print(f"[rag_utils] Loaded {len(self.metadata)} documents from existing index")
         else:
             print("[rag_utils] Creating new FAISS index")
+        self._sync_exact_vectors()
+
+        replayed = self._replay_wal()
+        if replayed:
+            print(f"[rag_utils] Replayed {replayed} documents from {self.wal.path}")
+        self._sync_lexical_index()
+
+        # Transparently migrate indexes written with a different index type
+        if self._sync_index_type():
             self.save()
-            
-    def load(self):
-        """Load index and metadata from disk"""
-        print(f"[rag_utils] Loading existing FAISS index from {INDEX_FILE}")
-        self.index = faiss.read_index(INDEX_FILE)
-        with open(META_FILE, "rb") as f:
-            self.metadata = pickle.load(f)
-        print(f"[rag_utils] Loaded {len(self.metadata)} documents from existing index")
+        self.loaded_version = self.disk_version()
+
+    @property
+    def ntotal(self) -> int:
+        """Vectors in the store: the index plus any replayed delta"""
+        return self.index.ntotal + (self._delta.ntotal if self._delta is not None else 0)
+
+    def disk_version(self) -> Tuple:
+        """Fingerprint of the checkpoint and WAL files as they are on disk"""
+        return tuple(_file_version(path) for path in (self.index_file, self.wal.path))
+
+    def is_stale(self) -> bool:
+        """True when another process changed the index since this store last read or wrote it"""
+        # While a write of this store is in progress its own WAL append looks like an outside change
+        if not self._writer.acquire(blocking=False):
+            return False
+        try:
+            return self.disk_version() != self.loaded_version
+        finally:
+            self._writer.release()
+
+    def _migrate_pickled_metadata(self):
+        """Move a legacy meta.pkl into the columnar metadata store"""
+        if not os.path.exists(self.meta_file):
+            return
+        if len(self.metadata) == 0:
+            print(f"[rag_utils] Migrating {self.meta_file} to columnar metadata in {self.metadata_dir}")
+            with open(self.meta_file, "rb") as f:
+                self.metadata.extend(pickle.load(f))
+            self.metadata.flush()
+        os.replace(self.meta_file, f"{self.meta_file}.migrated")
+
+    def _replay_wal(self) -> int:
+        """Apply WAL records not yet in the checkpoint; returns documents applied.
+
+        Over a memory-mapped checkpoint the records go to a small in-memory
+        delta index searched next to it, so a WAL does not copy the whole
+        index into the heap at startup.
+        """
+        replayed = 0
+        for start_id, vectors, metadata in self.wal.replay():
+            ntotal = self.ntotal
+            if start_id > min(ntotal, len(self.metadata)):
+                print(f"[rag_utils] WAL record at id {start_id} does not follow the checkpoint, ignoring the rest")
+                break
+            if start_id + len(vectors) > ntotal:
+                new_vectors = vectors[ntotal - start_id:]
+                if self._index_mapped:
+                    if self._delta is None:
+                        self._delta = faiss.IndexFlatL2(self.index.d)
+                    self._delta.add(new_vectors)
+                else:
+                    self.index.add(new_vectors)
+                if self.exact_vectors is not None:
+                    self.exact_vectors.append(new_vectors)
+            if start_id + len(metadata) > len(self.metadata):
+                new_docs = metadata[len(self.metadata) - start_id:]
+                self.metadata.extend(new_docs)
+                replayed += len(new_docs)
+        return replayed
+
+    def _sync_exact_vectors(self):
+        """Align the re-ranking vectors with the checkpointed index"""
+        if self.exact_vectors is None:
+            return
+        if len(self.exact_vectors) > self.index.ntotal:
+            self.exact_vectors.truncate(self.index.ntotal)
+        missing = self.index.ntotal - len(self.exact_vectors)
+        if missing:
+            # Exact unless the index was already compressed when re-ranking was enabled
+            print(f"[rag_utils] Copying {missing} vectors for re-ranking to {self.exact_vectors.path}")
+            for start in range(len(self.exact_vectors), self.index.ntotal, ann_index.COPY_CHUNK):
+                count = min(ann_index.COPY_CHUNK, self.index.ntotal - start)
+                self.exact_vectors.append(ann_index.reconstruct_range(self.index, start, count))
+
+    def _sync_lexical_index(self):
+        """Index documents missing from the lexical index (new store, WAL replay, upgrade)"""
+        if len(self.lexical) > len(self.metadata):
+            print("[rag_utils] Lexical index is ahead of the metadata, rebuilding it")
+            self.lexical.reset()
+        missing = len(self.metadata) - len(self.lexical)
+        if not missing:
+            return
+        print(f"[rag_utils] Adding {missing} documents to the lexical index")
+        for start in range(len(self.lexical), len(self.metadata), LEXICAL_REINDEX_CHUNK):
+            documents = self.metadata.get_many(list(range(start, min(start + LEXICAL_REINDEX_CHUNK, len(self.metadata)))))
+            self.lexical.add(start, [_lexical_text(doc) for doc in documents])
+        self.lexical.flush()
+
+    def _target_index(self, ntotal: int) -> Tuple[str, str]:
+        """Configured (index type, compression), or uncompressed flat while it cannot be trained yet"""
+        if ann_index.can_build(self.index_type, ntotal, self.nlist, self.compression):
+            return self.index_type, self.compression
+        return "flat", "none"
+
+    def _sync_index_type(self) -> bool:
+        """Convert ``self.index`` to the configured type and compression when possible.
+
+        An IVF index sized from the corpus (``nlist`` None) is also retrained
+        with more cells once the corpus has grown ``IVF_RETRAIN_GROWTH``-fold
+        since it was trained. Returns True if the index was replaced.
+        """
+        index_type, compression = self._target_index(self.ntotal)
+        current = (ann_index.index_type_of(self.index), ann_index.compression_of(self.index))
+        retrain = self.nlist is None and ann_index.needs_retraining(self.index, self.ntotal, IVF_RETRAIN_GROWTH)
+        if current == (index_type, compression) and not retrain:
+            return False
+        self._ensure_writable()  # fold in the replayed delta
+        if retrain:
+            print(f"[rag_utils] Retraining IVF index: {ann_index.nlist_of(self.index)} cells -> "
+                  f"{ann_index.auto_nlist(self.index.ntotal)} for {self.index.ntotal} vectors")
+        exact = None
+        if self.exact_vectors is not None and len(self.exact_vectors) == self.index.ntotal:
+            exact = self.exact_vectors.get  # re-encode from the exact vectors, not lossy codes
+        converted = ann_index.convert_index(self.index, index_type, nlist=self.nlist, compression=compression,
+                                            exact=exact)
+        with self.lock.write():
+            self.index = converted
+            self._index_mapped = False
+        return True
+
+    def _ensure_writable(self):
+        """Replace a memory-mapped index (and its delta) by an in-memory copy before it is modified"""
+        if not self._index_mapped:
+            return
+        print("[rag_utils] Copying memory-mapped index into memory before the first write")
+        owned = ann_index.owned_copy(self.index)
+        if self._delta is not None:
+            owned.add(self._delta.reconstruct_n(0, self._delta.ntotal))
+        with self.lock.write():
+            self.index = owned
+            self._delta = None
+            self._index_mapped = False
         
     def save(self):
-        """Save index and metadata to disk"""
-        print(f"[rag_utils] Saving FAISS index to {INDEX_FILE}")
-        faiss.write_index(self.index, INDEX_FILE)
-        with open(META_FILE, "wb") as f:
-            pickle.dump(self.metadata, f)
+        """Checkpoint the index to disk and truncate the WAL.
+
+        The index is written to a temporary path and renamed into place and the
+        append-only metadata files are fsynced, so a crash leaves either the
+        old or the new checkpoint plus a WAL that replays cleanly on top of it.
+        """
+        with self._writer:
+            print(f"[rag_utils] Checkpointing FAISS index to {self.index_file}")
+            # Searches keep running while the index is serialised
+            atomic_write(self.index_file, lambda path: faiss.write_index(self.index, path))
+            self.metadata.flush()
+            with self.lock.write():
+                self.lexical.flush()
+            if self.exact_vectors is not None:
+                self.exact_vectors.flush()
+            self.wal.reset()
+            self.loaded_version = self.disk_version()
         print(f"[rag_utils] Saved metadata with {len(self.metadata)} documents")
+
+    def close(self):
+        """Release open file handles once running writes and searches finish; the store must not be used afterwards"""
+        with self._writer, self.lock.write():
+            if self._owns_cache:
+                self.embedding_cache.close()
+            elif self.embedding_cache is not None:
+                self.embedding_cache.flush()
+            self.metadata.close()
+
+    def _checkpoint_due(self) -> bool:
+        threshold = max(CHECKPOINT_MIN_DOCS, int(CHECKPOINT_RATIO * len(self.metadata)))
+        return self.wal.pending_docs >= threshold
         
-    def add_documents(self, documents: List[Dict[str, Any]]):
-        """Add documents to the vector store"""
+    def _deduplicator(self) -> Deduplicator:
+        """Duplicate detector over everything already stored"""
+        # Built lazily, and rebuilt once enough recently accepted documents pile up
+        rebuild_at = max(DEDUP_REBUILD_PENDING, len(self.metadata) // 10)
+        if self._dedup is None or self._dedup.pending >= rebuild_at:
+            self._dedup = Deduplicator()
+            self._dedup.load(
+                self.metadata.column("article_id"),
+                self.metadata.column("content_hash"),
+                self.metadata.column("minhash"),
+            )
+        return self._dedup
+
+    def add_documents(self, documents: List[Dict[str, Any]], deduplicate: bool = True) -> Dict[str, Any]:
+        """Add documents to the vector store.
+
+        Documents whose URL or content is already stored, or that are near
+        duplicates (MinHash LSH) of a stored article, are dropped unless
+        ``deduplicate`` is False.
+
+        Returns:
+            ``{"added": n, "duplicates": {"url": ..., "content": ..., "near": ...}}``
+        """
+        report = {"added": 0, "duplicates": {"url": 0, "content": 0, "near": 0}}
         if not documents:
-            return
+            return report
             
         print(f"[rag_utils] Adding {len(documents)} documents to vector store")
+        signatures = [(article_id(doc), *dedup_signatures(doc)) for doc in documents]
+        with self._writer:
+            if deduplicate:
+                keep, report["duplicates"] = self._deduplicator().filter(signatures)
+                dropped = len(documents) - len(keep)
+                if dropped:
+                    print(f"[rag_utils] Dropped {dropped} duplicate documents {report['duplicates']}")
+                documents = [documents[i] for i in keep]
+                signatures = [signatures[i] for i in keep]
+                if not documents:
+                    return report
+            elif self._dedup is not None:
+                for signature in signatures:
+                    self._dedup.add(*signature)
+            report["added"] = len(documents)
         
-        # Get embeddings for documents using Claude
-        embeddings = self._get_embeddings([doc["content"] for doc in documents])
+            # Embed the whole batch locally in one pass
+            embeddings = self._get_embeddings([doc["content"] for doc in documents])
         
-        # Add to FAISS index
-        self.index.add(np.array(embeddings))
+            try:
+                # Commit the batch to the write-ahead log before applying it in memory
+                self.wal.append(self.ntotal, embeddings, documents)
+            except Exception:
+                self._dedup = None  # forget signatures of the batch that never landed
+                raise
         
-        # Store metadata
-        self.metadata.extend(documents)
+            # Publish the batch to searches all at once: index row i must never
+            # be visible before metadata row i
+            self._ensure_writable()
+            ids, contents, minhashes = zip(*signatures)
+            with self.lock.write():
+                start_id = self.index.ntotal
+                self.index.add(embeddings)
+                if self.exact_vectors is not None:
+                    self.exact_vectors.append(embeddings)
+                self.metadata.extend(documents, columns={
+                    "article_id": np.array(ids, dtype=np.uint64),
+                    "content_hash": np.array(contents, dtype=np.uint64),
+                    "minhash": np.stack(minhashes),
+                })
+                self.lexical.add(start_id, [_lexical_text(doc) for doc in documents])
+            # Train the configured ANN index once possible
+            converted = self._sync_index_type()
         
-        # Save updated index and metadata
-        self.save()
+            # Fold the WAL into the base index only periodically (or after a conversion)
+            if converted or self._checkpoint_due():
+                self.save()
+            self.loaded_version = self.disk_version()
+            return report
         
-    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
-        if not self.metadata:
+    def search(self, query: str, k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, sources: Union[None, str, List[str]] = None,
+               published_after: Any = None, published_before: Any = None,
+               tickers: Union[None, str, List[str]] = None, mode: str = SEARCH_MODE) -> List[Dict[str, Any]]:
+        """Search for similar documents.
+
+        ``nprobe`` (IVF) and ``ef_search`` (HNSW) trade speed for recall on a
+        per-query basis; they are ignored by index types that do not use them.
+        ``sources``, ``published_after``, ``published_before`` and ``tickers``
+        restrict the search to matching articles (see ``SearchFilter``); the
+        filter is applied inside FAISS, so up to ``k`` matching documents are
+        returned. ``mode`` is ``"vector"``, ``"lexical"`` (BM25) or
+        ``"hybrid"`` (reciprocal rank fusion of both).
+        """
+        return self.search_many([query], k=k, nprobe=nprobe, ef_search=ef_search, sources=sources,
+                                published_after=published_after, published_before=published_before,
+                                tickers=tickers, mode=mode)[0]
+
+    def search_many(self, queries: List[str], k: int = 5, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None, sources: Union[None, str, List[str]] = None,
+                    published_after: Any = None, published_before: Any = None,
+                    tickers: Union[None, str, List[str]] = None,
+                    mode: str = SEARCH_MODE) -> List[List[Dict[str, Any]]]:
+        """Run several searches at once.
+
+        All queries are embedded in one batch and answered by a single matrix
+        ``index.search`` call, which is much cheaper than looping ``search``.
+        Arguments are as for ``search`` and apply to every query.
+
+        Returns:
+            One result list per query, in query order
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Available: {', '.join(SEARCH_MODES)}")
+        if not queries:
             return []
-            
-        # Get query embedding
-        query_embedding = self._get_embeddings([query])[0]
-        
-        # Search in FAISS
-        D, I = self.index.search(np.array([query_embedding]), k)
-        
-        # Return matched documents
-        results = []
-        for idx in I[0]:
-            if idx < len(self.metadata):
-                results.append(self.metadata[idx])
-                
-        return results
-        
-    def _get_embeddings(self, texts: List[str]) -> List[np.ndarray]:
-        """Get embeddings for texts using Claude"""
-        anthropic = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-        embeddings = []
+        if not self.metadata:
+            return [[] for _ in queries]
+        search_filter = SearchFilter(sources=sources, published_after=published_after,
+                                     published_before=published_before, tickers=tickers)
+        depth = k if mode == "vector" else max(k, HYBRID_CANDIDATES)
+        # Embed every query in one batch and search FAISS once
+        query_embeddings = self._get_embeddings(list(queries)) if mode != "lexical" else None
+        # Concurrent ingests cannot publish rows while this snapshot is read
+        with self.lock.read():
+            vector, lexical = self.ranked_candidates(queries, query_embeddings, depth, search_filter, mode,
+                                                     nprobe=nprobe, ef_search=ef_search)
+            hits = fuse_candidates(mode, vector, lexical, k)
+
+            # Load each matched document once
+            unique_ids = sorted({idx for row in hits for idx in row})
+            documents = dict(zip(unique_ids, self.metadata.get_many(unique_ids)))
+        return [[documents[idx] for idx in row] for row in hits]
+
+    def ranked_candidates(self, queries: List[str], query_embeddings: Optional[np.ndarray], depth: int,
+                          search_filter: SearchFilter, mode: str, nprobe: Optional[int] = None,
+                          ef_search: Optional[int] = None) -> Tuple[Optional[list], Optional[list]]:
+        """Scored candidates of every query before rank fusion.
+
+        Callers must hold ``self.lock.read()``.
+
+        Returns:
+            ``(vector, lexical)``; each is None when ``mode`` does not use that
+            retriever, else one ``(ids, scores)`` pair per query with up to
+            ``depth`` hits, best first (L2 distances for vector, BM25 for lexical)
+        """
+        mask = None
+        if not search_filter.is_empty():
+            # Concurrent searches share (and lazily rebuild) one filter index
+            with self._filter_lock:
+                if self._filter_index is None:
+                    self._filter_index = FilterIndex(self.metadata)
+                mask = self._filter_index.mask(search_filter)
+
+        vector = lexical = None
+        if mode != "lexical":
+            candidates = depth * self.rerank_factor if self._reranks() else depth
+            if mask is None:
+                params = ann_index.search_parameters(self.index, nprobe=nprobe, ef_search=ef_search)
+                D, I = self.index.search(query_embeddings, candidates, params=params)
+            else:
+                D, I = self._filtered_search(query_embeddings, candidates, mask, nprobe, ef_search)
+            D, I = self._with_delta(query_embeddings, candidates, D, I, mask)
+            if candidates > depth:
+                D, I = self._rerank(query_embeddings, I, depth)
+            # FAISS pads missing hits with -1
+            vector = [(ids[(ids >= 0) & (ids < len(self.metadata))], d[(ids >= 0) & (ids < len(self.metadata))])
+                      for d, ids in zip(D, I)]
+        if mode != "vector":
+            lexical = []
+            for query in queries:
+                scores, ids = self.lexical.search(query, depth, mask=mask)
+                lexical.append((ids, scores))
+        return vector, lexical
         
-        for text in texts:
-            message = anthropic.messages.create(
-                model="claude-3-sonnet-20240229",
-                max_tokens=100,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": f"Generate a fixed-size embedding vector for this text: {text}"
-                    }
-                ]
-            )
-            # Convert Claude's response to a fixed-size vector
-            embedding = np.zeros(EMBEDDING_DIM)
-            response_text = message.content[0].text
-            # Use hash of response to generate deterministic embedding
-            hash_val = hash(response_text)
-            np.random.seed(hash_val)
-            embedding = np.random.randn(EMBEDDING_DIM)
-            embedding = embedding / np.linalg.norm(embedding)  # Normalize
-            embeddings.append(embedding)
-            
-        return embeddings
\ No newline at end of file
+    def _filtered_search(self, queries: np.ndarray, k: int, mask: np.ndarray,
+                         nprobe: Optional[int], ef_search: Optional[int]):
+        """``index.search`` restricted to the documents where ``mask`` is True"""
+        mask = mask[:self.index.ntotal]
+        matches = np.flatnonzero(mask)
+        if len(matches) <= EXACT_FILTER_MAX or not ann_index.supports_selector(self.index):
+            # Few candidates: exact distances beat probing an ANN index that may miss them
+            return ann_index.search_subset(self.index, queries, matches, k)
+        params = ann_index.search_parameters(self.index, nprobe=nprobe, ef_search=ef_search,
+                                             selector=ann_index.id_selector(mask))
+        return self.index.search(queries, k, params=params)
+
+    def _with_delta(self, queries: np.ndarray, k: int, D: np.ndarray, I: np.ndarray,
+                    mask: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """Merge the hits of the replayed delta (ids after the index's) into index results ``(D, I)``"""
+        delta = self._delta
+        if delta is None:
+            return D, I
+        offset = self.index.ntotal
+        if mask is None:
+            delta_D, delta_I = delta.search(queries, min(k, delta.ntotal))
+        else:
+            delta_D, delta_I = ann_index.search_subset(delta, queries, np.flatnonzero(mask[offset:self.ntotal]), k)
+        D = np.hstack([D, delta_D])
+        I = np.hstack([I, np.where(delta_I >= 0, delta_I + offset, -1)])
+        order = np.argsort(D, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(D, order, axis=1), np.take_along_axis(I, order, axis=1)
+
+    def _reranks(self) -> bool:
+        return self.exact_vectors is not None and ann_index.compression_of(self.index) != "none"
+
+    def _rerank(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-order compressed-search candidates by exact L2 distance and keep ``k``"""
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for i, row in enumerate(candidates):
+            row = row[(row >= 0) & (row < len(self.exact_vectors))]
+            if not len(row):
+                continue
+            exact = ((self.exact_vectors.get(row) - queries[i]) ** 2).sum(axis=1)
+            best = np.argsort(exact, kind="stable")[:k]
+            distances[i, :len(best)] = exact[best]
+            ids[i, :len(best)] = row[best]
+        return distances, ids
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Index footprint: type, compression and approximate resident bytes per document"""
+        index, delta = self.index, self._delta  # may be swapped by a concurrent conversion
+        per_vector = ann_index.bytes_per_vector(index)
+        delta_total = delta.ntotal if delta is not None else 0
+        index_bytes = int(per_vector * index.ntotal) + 4 * index.d * delta_total
+        documents = index.ntotal + delta_total
+        return {
+            "index_type": ann_index.index_type_of(index),
+            "compression": ann_index.compression_of(index),
+            "documents": documents,
+            "bytes_per_doc": index_bytes / documents if documents else per_vector,
+            "index_bytes": index_bytes,
+        }
+
+    def _get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts locally, reusing cached vectors where possible"""
+        if self.embedding_cache is None:
+            return self.embedder.embed(texts)
+
+        keys = [EmbeddingCache.make_key(text, self.embedder.name, self.embedder.dim) for text in texts]
+        embeddings, missing = self.embedding_cache.get_many(keys)
+        if missing:
+            fresh = self.embedder.embed([texts[i] for i in missing])
+            embeddings[missing] = self.embedding_cache.put_many([keys[i] for i in missing], fresh)
+            self.embedding_cache.flush()
+        return embeddings
+
+
+def _file_version(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+_shared_stores: Dict[str, Any] = {}
+_shared_lock = threading.Lock()
+
+
+def get_vector_store(index_dir: str = INDEX_DIR):
+    """Process-wide store for ``index_dir``, shared by every caller and session.
+
+    The store is opened on first use (sharded when ``VECTOR_SHARD_PERIOD`` is
+    set) and reopened only when another process changed its files on disk, so
+    repeated calls cost a couple of ``stat`` calls.
+    """
+    from app.sharded_store import open_store
+
+    with _shared_lock:
+        store = _shared_stores.get(index_dir)
+        if store is not None and store.is_stale():
+            print(f"[rag_utils] {index_dir} changed on disk, reloading vector store")
+            store.close()
+            store = None
+        if store is None:
+            store = _shared_stores[index_dir] = open_store(index_dir)
+        return store
+
+
+def fuse_candidates(mode: str, vector: Optional[list], lexical: Optional[list], k: int) -> List[List[Any]]:
+    """Final ranked ids per query from ``ranked_candidates`` output"""
+    if mode == "vector":
+        return [list(ids[:k]) for ids, _ in vector]
+    if mode == "lexical":
+        return [list(ids[:k]) for ids, _ in lexical]
+    return [reciprocal_rank_fusion([list(v), list(l)], k) for (v, _), (l, _) in zip(vector, lexical)]
+
+
+def _lexical_text(doc: Dict[str, Any]) -> str:
+    """Text indexed for BM25: the title and the content"""
+    return f"{doc.get('title', '')}\n{doc.get('content', '')}"
@@ -0,0 +1,286 @@
+"""Client-side scheduling of external API calls (Claude, Tavily).
+
+Every call to a service goes through that service's ``Scheduler`` (see
+``get_scheduler``), so all threads and sessions of the process share one view
+of its rate limits:
+
+- token buckets cap requests per minute and input tokens per minute
+  (``<SERVICE>_REQUESTS_PER_MINUTE`` / ``<SERVICE>_INPUT_TOKENS_PER_MINUTE``,
+  0 = no client-side limit),
+- an AIMD concurrency limit starts at ``<SERVICE>_MAX_CONCURRENCY``, halves
+  when the service throttles (429/529) or, if ``<SERVICE>_TARGET_LATENCY`` is
+  set, when a call is slower than that, and grows by one per window of
+  successful calls,
+- throttled and transient failures (5xx, timeouts, dropped connections) are
+  retried with full-jitter exponential backoff, at least ``retry-after``,
+- waiting calls are admitted in priority order, so an ``INTERACTIVE`` chat
+  message goes ahead of queued ``BULK`` analysis calls.
+
+Clients used with a scheduler should not retry on their own (the Anthropic
+client is created with ``max_retries=0``), so every throttle is seen here.
+"""
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import anthropic
+import requests
+from tavily.errors import TimeoutError as TavilyTimeoutError, UsageLimitExceededError
+from tenacity import Retrying, retry_if_exception, stop_after_attempt
+
+from app.chunking import count_tokens
+
+INTERACTIVE = 0  # a user is waiting on the answer (chat, search)
+BULK = 1  # analysis and other background work
+
+THROTTLE_STATUS = frozenset({429, 529})
+RETRY_STATUS = THROTTLE_STATUS | {408, 409, 500, 502, 503, 504}
+_TRANSIENT_ERRORS = (ConnectionError, TimeoutError, anthropic.APIConnectionError, requests.ConnectionError,
+                     requests.Timeout, TavilyTimeoutError)
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_throttle(exc: BaseException) -> bool:
+    """Whether ``exc`` means the service is rate limiting or overloaded"""
+    return _status_code(exc) in THROTTLE_STATUS or isinstance(exc, UsageLimitExceededError)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether the call that raised ``exc`` may succeed when retried"""
+    return is_throttle(exc) or _status_code(exc) in RETRY_STATUS or isinstance(exc, _TRANSIENT_ERRORS)
+
+
+def retry_after(exc: BaseException) -> float:
+    """Seconds the service asked to wait before retrying (0 if it did not say)"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after", 0)))
+    except (TypeError, ValueError):  # an HTTP date; fall back to backoff
+        return 0.0
+
+
+def request_tokens(params: Dict[str, Any]) -> int:
+    """Estimated input tokens of Messages API ``params`` (system prompt and messages)"""
+    def text(value: Any) -> str:
+        if isinstance(value, str):
+            return value
+        if isinstance(value, list):
+            return " ".join(text(block.get("text", "")) if isinstance(block, dict) else text(block) for block in value)
+        return ""
+    return count_tokens(text(params.get("system"))) + sum(
+        count_tokens(text(message.get("content"))) for message in params.get("messages", []))
+
+
+class TokenBucket:
+    """Continuously refilled budget of ``per_minute`` units (not thread-safe; the scheduler locks)"""
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.clock = clock
+        self.level = self.capacity
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` units are available (amounts over capacity wait for a full bucket)"""
+        self._refill()
+        return max(0.0, min(amount, self.capacity) - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= min(amount, self.capacity)
+
+
+class AIMDLimit:
+    """Concurrency limit with additive increase and multiplicative decrease"""
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None, backoff: float = 0.5,
+                 target_latency: Optional[float] = None):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.backoff = backoff
+        self.target_latency = target_latency
+        self._decreased_at = float("-inf")
+
+    @property
+    def value(self) -> int:
+        return max(self.minimum, int(self.limit))
+
+    def update(self, started: float, latency: Optional[float], throttled: bool):
+        """Adjust the limit for a call that started at ``started`` (``time.monotonic()``)"""
+        slow = self.target_latency is not None and latency is not None and latency > self.target_latency
+        if throttled or slow:
+            # Calls already in flight at the last decrease were admitted under the old limit
+            if started >= self._decreased_at:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self._decreased_at = time.monotonic()
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+
+class Scheduler:
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 8, min_concurrency: int = 1, target_latency: Optional[float] = None,
+                 max_attempts: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0):
+        """Admission control and retries for calls to one service.
+
+        Args:
+            name: Service name used in log messages
+            requests_per_minute: Request budget (0 = unlimited)
+            tokens_per_minute: Input token budget (0 = unlimited)
+            max_concurrency: Initial and maximum number of calls in flight
+            min_concurrency: Floor of the adaptive limit
+            target_latency: Seconds above which a call counts as congestion (None = ignore latency)
+            max_attempts: Attempts per call, including the first
+            backoff_base: Backoff cap of the first retry in seconds, doubled per retry
+            backoff_max: Largest wait between attempts in seconds
+        """
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.limit = AIMDLimit(max_concurrency, min_concurrency, target_latency=target_latency)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, arrival) of waiting calls
+        self._arrivals = itertools.count()
+        self._in_flight = 0
+        self._counters = {"calls": 0, "throttled": 0, "retries": 0}
+
+    def _budget_delay(self, tokens: int) -> float:
+        delays = [0.0]
+        if self.requests is not None:
+            delays.append(self.requests.delay(1))
+        if self.tokens is not None and tokens:
+            delays.append(self.tokens.delay(tokens))
+        return max(delays)
+
+    def _acquire(self, priority: int, tokens: int):
+        with self._cond:
+            entry = (priority, next(self._arrivals))
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    if self._queue[0] == entry and self._in_flight < self.limit.value:
+                        delay = self._budget_delay(tokens)
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._queue)
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None and tokens:
+                self.tokens.take(tokens)
+            self._in_flight += 1
+            self._counters["calls"] += 1
+            self._cond.notify_all()
+
+    def _release(self, started: float, latency: Optional[float], throttled: bool):
+        with self._cond:
+            self._in_flight -= 1
+            self._counters["throttled"] += throttled
+            self.limit.update(started, latency, throttled)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = BULK, tokens: int = 0, track_latency: bool = True) -> Iterator[None]:
+        """Hold one admission for the duration of the block (no retries).
+
+        ``tokens`` is charged to the input token budget. Streams should pass
+        ``track_latency=False``: their duration is generation time, not a
+        congestion signal.
+        """
+        self._acquire(priority, tokens)
+        start = time.monotonic()
+        throttled = False
+        try:
+            yield
+        except BaseException as e:
+            throttled = is_throttle(e)
+            raise
+        finally:
+            self._release(start, time.monotonic() - start if track_latency else None, throttled)
+
+    def _wait(self, retry_state) -> float:
+        cap = min(self.backoff_max, self.backoff_base * 2 ** (retry_state.attempt_number - 1))
+        return min(self.backoff_max, max(random.uniform(0, cap), retry_after(retry_state.outcome.exception())))
+
+    def _before_sleep(self, retry_state):
+        self._counters["retries"] += 1
+        exc = retry_state.outcome.exception()
+        print(f"[scheduler] {self.name}: {type(exc).__name__} on attempt {retry_state.attempt_number}, "
+              f"retrying in {retry_state.next_action.sleep:.1f}s (limit {self.limit.value} in flight)")
+
+    def retrying(self, retry_if: Optional[Callable[[BaseException], bool]] = None) -> Retrying:
+        """Retry loop for failures worth retrying (``for attempt in scheduler.retrying(): with attempt: ...``).
+
+        ``retry_if`` further restricts which exceptions are retried.
+        """
+        return Retrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=self._wait,
+            retry=retry_if_exception(lambda e: is_retryable(e) and (retry_if is None or retry_if(e))),
+            before_sleep=self._before_sleep,
+            reraise=True,
+        )
+
+    def call(self, fn: Callable[..., Any], *args, priority: int = BULK, tokens: int = 0, **kwargs) -> Any:
+        """``fn(*args, **kwargs)`` once admitted, retried on throttling and transient errors"""
+        for attempt in self.retrying():
+            with attempt, self.slot(priority, tokens):
+                result = fn(*args, **kwargs)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"limit": self.limit.value, "in_flight": self._in_flight, "queued": len(self._queue),
+                    **self._counters}
+
+
+_schedulers: Dict[str, Scheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def _env_number(name: str, default: str) -> float:
+    return float(os.getenv(name, default) or 0)
+
+
+def get_scheduler(service: str) -> Scheduler:
+    """Process-wide scheduler for ``service`` ("claude", "tavily"), configured from the environment"""
+    with _schedulers_lock:
+        scheduler = _schedulers.get(service)
+        if scheduler is None:
+            prefix = service.upper()
+            scheduler = _schedulers[service] = Scheduler(
+                service,
+                requests_per_minute=_env_number(f"{prefix}_REQUESTS_PER_MINUTE", "0"),
+                tokens_per_minute=_env_number(f"{prefix}_INPUT_TOKENS_PER_MINUTE", "0"),
+                max_concurrency=int(_env_number(f"{prefix}_MAX_CONCURRENCY", "8")),
+                target_latency=_env_number(f"{prefix}_TARGET_LATENCY", "0") or None,
+            )
+        return scheduler
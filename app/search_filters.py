@@ -0,0 +1,135 @@
+"""Structured filters for vector search.
+
+``FilterIndex`` keeps sorted-array indexes over the metadata columns:
+
+- rows ordered by ``source_id`` (a source is a contiguous run),
+- rows ordered by ``timestamp`` (a date range is a contiguous run),
+- (ticker id, row) postings ordered by ticker,
+
+so each criterion becomes a couple of binary searches plus a scatter into a
+row bitmap, independent of the corpus size apart from the bitmap itself.
+Criteria are ANDed; the resulting bitmap is handed to FAISS as an
+``IDSelectorBitmap`` so the filter is applied inside the search.
+
+Rows appended after the last build are checked directly against the columns
+and the index is rebuilt once that tail grows past ``REBUILD_MIN_ROWS`` (or
+10% of the store).
+"""
+from typing import Any, Iterable, List, Optional, Union
+
+import numpy as np
+
+from app.metadata_store import MAX_TICKERS, MetadataStore, to_timestamp
+
+REBUILD_MIN_ROWS = 10_000
+
+
+def _as_list(value: Union[None, str, Iterable[str]]) -> Optional[List[str]]:
+    if value is None:
+        return None
+    return [value] if isinstance(value, str) else list(value)
+
+
+class SearchFilter:
+    def __init__(self, sources: Union[None, str, Iterable[str]] = None, published_after: Any = None,
+                 published_before: Any = None, tickers: Union[None, str, Iterable[str]] = None):
+        """Restrict a search to matching articles.
+
+        Args:
+            sources: Publisher domain(s), e.g. ``"reuters.com"``; any may match
+            published_after: Inclusive lower bound (datetime, date string or Unix seconds)
+            published_before: Exclusive upper bound, same formats
+            tickers: Ticker symbol(s); an article tagged with any of them matches
+        """
+        sources = _as_list(sources)
+        self.sources = None if sources is None else [s.lower().removeprefix("www.") for s in sources]
+        tickers = _as_list(tickers)
+        self.tickers = None if tickers is None else [t.upper() for t in tickers]
+        self.published_after = None if published_after is None else to_timestamp(published_after)
+        self.published_before = None if published_before is None else to_timestamp(published_before)
+
+    def is_empty(self) -> bool:
+        return (self.sources is None and self.tickers is None
+                and self.published_after is None and self.published_before is None)
+
+
+class FilterIndex:
+    def __init__(self, metadata: MetadataStore):
+        """Sorted-array indexes over the filterable metadata columns"""
+        self.metadata = metadata
+        self.build()
+
+    def build(self):
+        """(Re)index every row currently in the metadata store"""
+        self.rows = len(self.metadata)
+        source_ids = np.asarray(self.metadata.column("source_id"))
+        self._by_source = np.argsort(source_ids, kind="stable")
+        self._sources = source_ids[self._by_source]
+
+        timestamps = np.asarray(self.metadata.column("timestamp"))
+        self._by_time = np.argsort(timestamps, kind="stable")
+        self._times = timestamps[self._by_time]
+
+        tickers = np.asarray(self.metadata.column("tickers")).reshape(self.rows, MAX_TICKERS)
+        rows, slots = np.nonzero(tickers >= 0)
+        ticker_ids = tickers[rows, slots]
+        order = np.argsort(ticker_ids, kind="stable")
+        self._tickers = ticker_ids[order]
+        self._ticker_rows = rows[order]
+
+    def _refresh(self):
+        tail = len(self.metadata) - self.rows
+        if tail >= max(REBUILD_MIN_ROWS, self.rows // 10):
+            self.build()
+
+    @staticmethod
+    def _scatter(total: int, rows: np.ndarray, keys: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """Mask of the ``rows`` whose sorted ``keys`` equal any of ``ids``"""
+        mask = np.zeros(total, dtype=bool)
+        lo = np.searchsorted(keys, ids, side="left")
+        hi = np.searchsorted(keys, ids, side="right")
+        for a, b in zip(lo.tolist(), hi.tolist()):
+            mask[rows[a:b]] = True
+        return mask
+
+    def _ids(self, kind: str, names: List[str]) -> np.ndarray:
+        ids = (self.metadata.lookup(kind, name) for name in names)
+        return np.array(sorted(i for i in ids if i is not None), dtype=np.int32)
+
+    def mask(self, search_filter: SearchFilter) -> np.ndarray:
+        """Boolean mask over all rows that match ``search_filter``"""
+        self._refresh()
+        total = len(self.metadata)
+        mask = np.ones(total, dtype=bool)
+        tail = slice(self.rows, total)
+
+        if search_filter.sources is not None:
+            ids = self._ids("source", search_filter.sources)
+            matched = self._scatter(total, self._by_source, self._sources, ids)
+            matched[tail] = np.isin(self.metadata.column("source_id")[tail], ids)
+            mask &= matched
+
+        if search_filter.published_after is not None or search_filter.published_before is not None:
+            start = search_filter.published_after
+            end = search_filter.published_before
+            # Articles without a known publish time never match a date range
+            lo = np.searchsorted(self._times, max(start if start is not None else 1, 1), side="left")
+            hi = np.searchsorted(self._times, end, side="left") if end is not None else len(self._times)
+            matched = np.zeros(total, dtype=bool)
+            matched[self._by_time[lo:max(lo, hi)]] = True
+            times = np.asarray(self.metadata.column("timestamp")[tail])
+            in_range = times > 0
+            if start is not None:
+                in_range &= times >= start
+            if end is not None:
+                in_range &= times < end
+            matched[tail] = in_range
+            mask &= matched
+
+        if search_filter.tickers is not None:
+            ids = self._ids("ticker", search_filter.tickers)
+            matched = self._scatter(total, self._ticker_rows, self._tickers, ids)
+            tail_tickers = np.asarray(self.metadata.column("tickers")[tail]).reshape(-1, MAX_TICKERS)
+            matched[tail] = np.isin(tail_tickers, ids).any(axis=1)
+            mask &= matched
+        return mask
@@ -0,0 +1,337 @@
+"""Time-partitioned vector store.
+
+``ShardedVectorStore`` splits the corpus by publish time into day, week or
+month shards. Each shard is a complete ``VectorStore`` (FAISS index, WAL,
+metadata, lexical index) in ``<index_dir>/shards/<YYYYMMDD>``; all shards
+share one embedder and one embedding cache.
+
+- Ingest routes every article to the shard of its publish date (the
+  ingest date when unknown). URL and content duplicates are checked
+  against every shard, so an undated article fetched again on another day
+  is still dropped; near duplicates are checked within the shard.
+- Searches embed the queries once and fan out only to shards that overlap
+  the requested ``published_after``/``published_before`` window. Candidates
+  are merged by distance (vector) or score (BM25) before rank fusion. BM25
+  statistics are per shard, as in most sharded search engines.
+- Shards ending more than ``retention_days`` ago are evicted by deleting
+  their directory: a fixed handful of files whatever the shard size, with
+  no rebuild of the remaining data.
+
+Shards are opened lazily, so a "latest news" query only loads the newest
+shards.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.dedup import NUM_PERM, Deduplicator, content_hash
+from app.embedding_cache import EmbeddingCache
+from app.embeddings import Embedder, get_embedder
+from app.locks import ReadWriteLock
+from app.metadata_store import article_id, timestamp_of
+from app.rag_utils import (DEDUP_REBUILD_PENDING, EMBEDDING_BACKEND, EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_SIZE, EMBEDDING_DIM,
+                           HYBRID_CANDIDATES, INDEX_DIR, SEARCH_MODE, SEARCH_MODES, VectorStore, fuse_candidates)
+from app.search_filters import SearchFilter
+
+SHARD_PERIODS = ("day", "week", "month")
+SHARD_PERIOD = os.getenv("VECTOR_SHARD_PERIOD", "none")  # none keeps a single unsharded store
+RETENTION_DAYS = int(os.getenv("VECTOR_RETENTION_DAYS", "0"))  # 0 keeps every shard
+SHARDS_DIR = "shards"
+MANIFEST_FILE = "shards.json"
+SHARD_NAME_FORMAT = "%Y%m%d"
+
+
+def shard_start(timestamp: int, period: str) -> datetime:
+    """Start (UTC midnight) of the ``period`` containing ``timestamp``"""
+    day = datetime.fromtimestamp(timestamp, tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def shard_bounds(name: str, period: str) -> Tuple[int, int]:
+    """``[start, end)`` Unix seconds covered by shard ``name``"""
+    start = datetime.strptime(name, SHARD_NAME_FORMAT).replace(tzinfo=timezone.utc)
+    if period == "week":
+        end = start + timedelta(days=7)
+    elif period == "month":
+        end = (start + timedelta(days=32)).replace(day=1)
+    else:
+        end = start + timedelta(days=1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+class ShardedVectorStore:
+    def __init__(self, index_dir: str = INDEX_DIR, period: str = "week", retention_days: int = RETENTION_DAYS,
+                 embedder: Optional[Embedder] = None, cache_size: int = EMBEDDING_CACHE_SIZE, **store_options):
+        """Open (or create) a time-sharded store.
+
+        Args:
+            index_dir: Directory holding the shards and the shared embedding cache
+            period: Shard width, one of ``SHARD_PERIODS``
+            retention_days: Evict shards that ended more than this many days ago (0 keeps all)
+            embedder: Embedding backend shared by every shard
+            cache_size: Shared embedding cache capacity, 0 to disable
+            **store_options: Passed to each shard's ``VectorStore`` (index type, compression, ...)
+        """
+        if period not in SHARD_PERIODS:
+            raise ValueError(f"Unknown shard period '{period}'. Available: {', '.join(SHARD_PERIODS)}")
+        self.index_dir = index_dir
+        self.shards_dir = os.path.join(index_dir, SHARDS_DIR)
+        os.makedirs(self.shards_dir, exist_ok=True)
+        manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                stored_period = json.load(f)["period"]
+            if stored_period != period:
+                raise ValueError(f"{index_dir} is sharded by {stored_period}, not {period}")
+        else:
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump({"period": period}, f)
+        self.period = period
+        self.retention_days = retention_days
+        self.store_options = store_options
+        self.embedder = embedder or get_embedder(EMBEDDING_BACKEND, EMBEDDING_DIM)
+        self.embedding_cache = None
+        if cache_size > 0:
+            cache_dir = os.path.join(index_dir, os.path.basename(EMBEDDING_CACHE_DIR))
+            self.embedding_cache = EmbeddingCache(cache_dir, self.embedder.dim, capacity=cache_size)
+
+        # Shard name -> open store, None until first used
+        self._shards: Dict[str, Optional[VectorStore]] = {
+            name: None for name in sorted(os.listdir(self.shards_dir))
+            if os.path.isdir(os.path.join(self.shards_dir, name))
+        }
+        # Searches and ingests share the shard set; eviction removes shards alone
+        self.lock = ReadWriteLock()
+        self._open_lock = threading.Lock()
+        # URLs and content hashes of every shard, built on the first ingest
+        self._dedup = None
+        self._ingest_lock = threading.Lock()
+        print(f"[sharded_store] Found {len(self._shards)} {period} shards in {self.shards_dir}")
+        self.evict_expired()
+
+    def shard_names(self) -> List[str]:
+        return sorted(self._snapshot())
+
+    def _snapshot(self) -> Dict[str, Optional[VectorStore]]:
+        """Copy of the shard map, which ``add_documents`` may extend concurrently"""
+        with self._open_lock:
+            return dict(self._shards)
+
+    def _shard(self, name: str) -> VectorStore:
+        with self._open_lock:
+            store = self._shards.get(name)
+            if store is None:
+                store = self._shards[name] = VectorStore(
+                    index_dir=os.path.join(self.shards_dir, name), embedder=self.embedder, cache_size=0,
+                    embedding_cache=self.embedding_cache, **self.store_options)
+            return store
+
+    def is_stale(self) -> bool:
+        """True when another process added, evicted or changed shards since they were opened"""
+        on_disk = sorted(name for name in os.listdir(self.shards_dir)
+                         if os.path.isdir(os.path.join(self.shards_dir, name)))
+        shards = self._snapshot()
+        return (on_disk != sorted(shards)
+                or any(store.is_stale() for store in shards.values() if store is not None))
+
+    def _cutoff(self, now: Optional[float] = None) -> Optional[int]:
+        """Shards ending at or before this Unix time are expired"""
+        if self.retention_days <= 0:
+            return None
+        return int((now if now is not None else time.time()) - self.retention_days * 86400)
+
+    def evict_expired(self, now: Optional[float] = None) -> List[str]:
+        """Delete shards past the retention period; returns their names"""
+        cutoff = self._cutoff(now)
+        if cutoff is None:
+            return []
+        if not any(shard_bounds(name, self.period)[1] <= cutoff for name in self._snapshot()):
+            return []
+        with self.lock.write():
+            expired = [name for name in self._snapshot() if shard_bounds(name, self.period)[1] <= cutoff]
+            for name in expired:
+                with self._open_lock:
+                    store = self._shards.pop(name)
+                if store is not None:
+                    store.close()
+                shutil.rmtree(os.path.join(self.shards_dir, name))
+            self._dedup = None  # evicted articles may be ingested again
+        if not expired:
+            return []
+        print(f"[sharded_store] Evicted {len(expired)} expired shards: {', '.join(expired)}")
+        return expired
+
+    def _deduplicator(self) -> Deduplicator:
+        """URL and content duplicate detector over every shard (near duplicates are found per shard)"""
+        if self._dedup is None or self._dedup.pending >= DEDUP_REBUILD_PENDING:
+            stores = [self._shard(name) for name in self.shard_names()]
+            self._dedup = Deduplicator()
+            if stores:
+                self._dedup.load(np.concatenate([store.metadata.column("article_id") for store in stores]),
+                                 np.concatenate([store.metadata.column("content_hash") for store in stores]),
+                                 np.zeros((0, NUM_PERM), np.uint32))
+        return self._dedup
+
+    def add_documents(self, documents: List[Dict[str, Any]], deduplicate: bool = True) -> Dict[str, Any]:
+        """Add documents to the shards of their publish dates.
+
+        Returns:
+            ``VectorStore.add_documents`` reports summed over shards, plus
+            ``"expired"``: documents older than the retention period (dropped)
+        """
+        report = {"added": 0, "duplicates": {"url": 0, "content": 0, "near": 0}, "expired": 0}
+        now = time.time()
+        self.evict_expired(now)
+        cutoff = self._cutoff(now)
+        batches: Dict[str, List[Dict[str, Any]]] = {}
+        for doc in documents:
+            name = shard_start(timestamp_of(doc) or int(now), self.period).strftime(SHARD_NAME_FORMAT)
+            if cutoff is not None and shard_bounds(name, self.period)[1] <= cutoff:
+                report["expired"] += 1
+                continue
+            batches.setdefault(name, []).append(doc)
+
+        with self.lock.read(), self._ingest_lock:
+            try:
+                if deduplicate:
+                    for name, batch in list(batches.items()):
+                        no_minhash = np.zeros(NUM_PERM, np.uint32)
+                        keep, dropped = self._deduplicator().filter(
+                            [(article_id(doc), content_hash(doc), no_minhash) for doc in batch])
+                        batches[name] = [batch[i] for i in keep]
+                        for reason, count in dropped.items():
+                            report["duplicates"][reason] += count
+                for name, batch in sorted(batches.items()):
+                    if not batch:
+                        continue
+                    shard_report = self._shard(name).add_documents(batch, deduplicate=deduplicate)
+                    report["added"] += shard_report["added"]
+                    for reason, count in shard_report["duplicates"].items():
+                        report["duplicates"][reason] += count
+            except Exception:
+                self._dedup = None  # forget signatures of batches that never landed
+                raise
+        return report
+
+    def _shards_for(self, search_filter: SearchFilter) -> List[str]:
+        """Shards overlapping the filter's publish window, newest first"""
+        start = search_filter.published_after
+        end = search_filter.published_before
+        names = []
+        for name in sorted(self._snapshot(), reverse=True):
+            shard_start_ts, shard_end_ts = shard_bounds(name, self.period)
+            if (end is None or shard_start_ts < end) and (start is None or shard_end_ts > start):
+                names.append(name)
+        return names
+
+    def search(self, query: str, k: int = 5, nprobe: Optional[int] = None,
+               ef_search: Optional[int] = None, sources: Union[None, str, List[str]] = None,
+               published_after: Any = None, published_before: Any = None,
+               tickers: Union[None, str, List[str]] = None, mode: str = SEARCH_MODE) -> List[Dict[str, Any]]:
+        """Search for similar documents (see ``VectorStore.search``)"""
+        return self.search_many([query], k=k, nprobe=nprobe, ef_search=ef_search, sources=sources,
+                                published_after=published_after, published_before=published_before,
+                                tickers=tickers, mode=mode)[0]
+
+    def search_many(self, queries: List[str], k: int = 5, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None, sources: Union[None, str, List[str]] = None,
+                    published_after: Any = None, published_before: Any = None,
+                    tickers: Union[None, str, List[str]] = None,
+                    mode: str = SEARCH_MODE) -> List[List[Dict[str, Any]]]:
+        """Run several searches across the shards overlapping the publish window"""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Available: {', '.join(SEARCH_MODES)}")
+        if not queries:
+            return []
+        search_filter = SearchFilter(sources=sources, published_after=published_after,
+                                     published_before=published_before, tickers=tickers)
+        with self.lock.read():
+            shards = {name: self._shard(name) for name in self._shards_for(search_filter)}
+            shards = {name: store for name, store in shards.items() if len(store.metadata)}
+            if not shards:
+                return [[] for _ in queries]
+            depth = k if mode == "vector" else max(k, HYBRID_CANDIDATES)
+
+            # Embed once for every shard (they share the embedder and cache)
+            query_embeddings = None
+            if mode != "lexical":
+                query_embeddings = next(iter(shards.values()))._get_embeddings(list(queries))
+            per_shard = []
+            for name, store in shards.items():
+                with store.lock.read():
+                    per_shard.append((name, *store.ranked_candidates(queries, query_embeddings, depth, search_filter,
+                                                                      mode, nprobe=nprobe, ef_search=ef_search)))
+            vector = lexical = None
+            if mode != "lexical":
+                vector = [_merge([(name, v[i]) for name, v, _ in per_shard], depth, ascending=True)
+                          for i in range(len(queries))]
+            if mode != "vector":
+                lexical = [_merge([(name, l[i]) for name, _, l in per_shard], depth, ascending=False)
+                           for i in range(len(queries))]
+            hits = fuse_candidates(mode, vector, lexical, k)
+
+            # Load each matched document once, grouped by shard (rows are append-only,
+            # so ids stay valid if a shard was extended in between)
+            documents = {}
+            for name in {name for row in hits for name, _ in row}:
+                ids = sorted({idx for row in hits for shard, idx in row if shard == name})
+                with shards[name].lock.read():
+                    documents.update(((name, idx), doc) for idx, doc in zip(ids, shards[name].metadata.get_many(ids)))
+        return [[documents[hit] for hit in row] for row in hits]
+
+    def save(self):
+        """Checkpoint every open shard"""
+        for store in self._snapshot().values():
+            if store is not None:
+                store.save()
+
+    def close(self):
+        """Close every open shard; the store must not be used afterwards"""
+        with self.lock.write():
+            for store in self._snapshot().values():
+                if store is not None:
+                    store.close()
+            if self.embedding_cache is not None:
+                self.embedding_cache.close()
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Index footprint summed over the open shards"""
+        shards = self._snapshot()
+        stats = [store.memory_stats() for store in shards.values() if store is not None]
+        documents = sum(s["documents"] for s in stats)
+        index_bytes = sum(s["index_bytes"] for s in stats)
+        return {
+            "index_type": ", ".join(sorted({s["index_type"] for s in stats})) or "none",
+            "compression": ", ".join(sorted({s["compression"] for s in stats})) or "none",
+            "shards": len(shards),
+            "open_shards": len(stats),
+            "documents": documents,
+            "bytes_per_doc": index_bytes / documents if documents else 0.0,
+            "index_bytes": index_bytes,
+        }
+
+
+def _merge(ranked: List[Tuple[str, Tuple[np.ndarray, np.ndarray]]], depth: int,
+           ascending: bool) -> Tuple[List[Tuple[str, int]], np.ndarray]:
+    """Merge per-shard ``(ids, scores)`` lists into ``(shard, id)`` hits, best ``depth`` first"""
+    hits = [(name, int(idx)) for name, (ids, _) in ranked for idx in ids]
+    scores = np.concatenate([scores for _, (_, scores) in ranked]) if ranked else np.zeros(0)
+    order = np.argsort(scores if ascending else -scores, kind="stable")[:depth]
+    return [hits[i] for i in order], scores[order]
+
+
+def open_store(index_dir: str = INDEX_DIR, **options) -> Union[VectorStore, ShardedVectorStore]:
+    """Open the store configured by ``VECTOR_SHARD_PERIOD`` (unsharded when "none")"""
+    if SHARD_PERIOD == "none":
+        return VectorStore(index_dir=index_dir, **options)
+    return ShardedVectorStore(index_dir=index_dir, period=SHARD_PERIOD, **options)
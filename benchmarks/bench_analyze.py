@@ -0,0 +1,72 @@
+"""Wall-clock time of NewsAnalyzer.analyze_articles at different concurrency limits.
+
+The Anthropic client is replaced by a stand-in that sleeps for a fixed
+per-request latency (a 2000-token completion takes tens of seconds; scale the
+latency down to keep runs short), so only the scheduling overhead and the
+overlap of in-flight requests are measured. A final pass reruns the same
+articles against a warm analysis cache.
+
+Usage:
+    python benchmarks/bench_analyze.py [articles] [latency_s] [limits...]   (default: 20 0.5 1 4 8 20)
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.analysis_cache import AnalysisCache
+from app.analyze_news import NewsAnalyzer
+from app.scheduler import Scheduler
+
+
+class SlowMessages:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def create(self, **kwargs):
+        time.sleep(self.latency)
+        return SimpleNamespace(content=[SimpleNamespace(text="## Sentiment\nPOSITIVE\n## Key facts\n- ...")])
+
+
+def main():
+    articles = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    limits = [int(a) for a in sys.argv[3:]] or [1, 4, 8, 20]
+
+    analyzer = NewsAnalyzer.__new__(NewsAnalyzer)  # skip the API key lookup
+    analyzer.client = SimpleNamespace(messages=SlowMessages(latency))
+    analyzer.cache = None
+    analyzer.scheduler = Scheduler("bench", max_concurrency=max(limits))
+    batch = [{'title': f'Article {i}', 'content': f'Quarterly results {i}', 'url': f'https://example.com/{i}'}
+             for i in range(articles)]
+
+    print(f"\n{articles} articles, {latency * 1000:.0f} ms per request")
+    with tempfile.TemporaryDirectory() as tmp, contextlib.chdir(tmp):  # analysis files go to a scratch dir
+        baseline = None
+        for limit in limits:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = analyzer.analyze_articles(batch, "semiconductors", max_concurrency=limit)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            assert [r['title'] for r in results] == [a['title'] for a in batch]
+            print(f"  max_concurrency={limit:<3} {elapsed:6.2f} s  ({baseline / elapsed:.1f}x)")
+
+        analyzer.cache = AnalysisCache(os.path.join(tmp, "cache.sqlite"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            analyzer.analyze_articles(batch, "semiconductors", max_concurrency=1)  # fill the cache
+            start = time.perf_counter()
+            analyzer.analyze_articles(batch, "semiconductors", max_concurrency=1)
+        elapsed = time.perf_counter() - start
+        print(f"  cached rerun      {elapsed:6.3f} s  ({elapsed / articles * 1000:.2f} ms per article, "
+              f"{baseline / elapsed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
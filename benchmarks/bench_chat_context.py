@@ -0,0 +1,79 @@
+"""Prompt tokens and latency of a chat question with the full article context vs retrieved passages.
+
+Builds ``chat_request`` for a few questions over 5, 50 and 500 analyzed
+articles (~400-token content and ~500-token analysis each) and sends them to the
+local fake API (tests/fake_anthropic.py). Latency is modelled as 300 ms + 50 us
+per uncached input token (a tenth of that for cached tokens). Prompts over the
+API's 200k-token context window are rejected. "full" is the old behaviour: every
+article's content and analysis in a cached system prompt. "retrieved" sends the
+passages most relevant to each question, within ``CHAT_CONTEXT_TOKENS``. The
+first question of a retrieved run includes building the passage index.
+
+Usage:
+    python benchmarks/bench_chat_context.py [articles...]   (default: 5 50 500)
+"""
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import chat, chat_context
+from app.chat import chat_request
+from app.clients import messages_args
+from tests.fake_anthropic import FakeAnthropicServer
+
+TOPICS = ["lithium battery supply", "cloud data center spending", "foundry wafer capacity", "retail holiday sales",
+          "airline fuel hedging", "pharmaceutical drug pricing", "copper mining output", "streaming subscriber growth"]
+QUESTIONS = ["How is copper mining output developing?", "What do the articles say about foundry wafer capacity?",
+             "Which risks affect airline fuel hedging?", "Summarize the retail holiday sales outlook."]
+
+
+def articles(n: int):
+    return [{'title': f'{TOPICS[i % len(TOPICS)].title()} update {i}', 'url': f'https://example.com/{i}',
+             'content': f"Company {i} reported that {TOPICS[i % len(TOPICS)]} moved {i % 17}% this quarter. " * 25,
+             'analysis': (f"## Sentiment\nPOSITIVE\n## Key facts\n- {TOPICS[i % len(TOPICS)]} up {i % 17}%\n"
+                          f"## Implications\nSuppliers to company {i} should plan capacity early. ") * 12}
+            for i in range(n)]
+
+
+def run(batch, full: bool):
+    chat.CHAT_CONTEXT_TOKENS = 10 ** 9 if full else chat_context.CHAT_CONTEXT_TOKENS
+    chat_context._shared_indexes.clear()
+    latencies, tokens, history = [], [], []
+    with FakeAnthropicServer(reply=lambda params: "Answer citing [1].", latency=0.3, prefill_seconds=50e-6) as server, \
+            contextlib.redirect_stdout(io.StringIO()):
+        client = server.client()
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            try:
+                params = chat_request(question, batch, history)
+                client.messages.create(**messages_args(params))
+            except Exception as e:
+                return None, None, "rejected: prompt too long" if "prompt is too long" in str(e) else str(e)[:60]
+            latencies.append(time.perf_counter() - start)
+            tokens.append(sum(server.usage[-1].values()))
+    return latencies, tokens, "ok"
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [5, 50, 500]
+    print(f"\nretrieval budget {chat_context.CHAT_CONTEXT_TOKENS} tokens, {chat_context.CHAT_MAX_PASSAGES} passages "
+          f"of up to {chat_context.CHAT_PASSAGE_TOKENS}; {len(QUESTIONS)} questions")
+    for n in sizes:
+        batch = articles(n)
+        print(f"{n} articles")
+        for name, full in (("full", True), ("retrieved", False)):
+            latencies, tokens, status = run(batch, full)
+            if latencies is None:
+                print(f"  {name:<9} {status}")
+                continue
+            print(f"  {name:<9} prompt {statistics.mean(tokens):>8.0f} tokens  first question {latencies[0]:5.2f} s  "
+                  f"later p50 {statistics.median(latencies[1:]):5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Latency and token cost of analyzing long articles single-shot vs map-reduce (chunk notes, then one analysis).
+
+Runs NewsAnalyzer.analyze_article on synthetic filings against the local fake
+API (tests/fake_anthropic.py): modelled latency of 300 ms + 50 us per input
+token to the first token and a fixed delay per output word, the API's
+200k-token context window, and the same model speed for both models. Cost uses
+list prices per million input/output tokens: $3/$15 for the analysis model and
+$1/$5 for the chunk model.
+
+Usage:
+    python benchmarks/bench_chunked_analysis.py [article_tokens...] [--word-ms N]   (default: 5000 40000 300000, 5 ms)
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import analyze_news
+from app.analyze_news import NewsAnalyzer
+from app.scheduler import Scheduler
+from app.chunking import count_tokens
+from tests.fake_anthropic import FakeAnthropicServer
+
+PRICES = {analyze_news.ANALYSIS_MODEL: (3.0, 15.0), analyze_news.ANALYSIS_CHUNK_MODEL: (1.0, 5.0)}  # $ per MTok
+
+
+def filing(tokens: int) -> str:
+    sections, i = [], 0
+    while count_tokens("\n\n".join(sections)) < tokens:
+        body = " ".join(f"Segment {i} revenue was ${i + 7}.{i % 10} billion, up {i % 30}% year over year."
+                        for _ in range(40))
+        sections.append(f"Item {i}. Segment results\n{body}")
+        i += 1
+    return "\n\n".join(sections)
+
+
+def reply(params):
+    if params["model"] == analyze_news.ANALYSIS_CHUNK_MODEL:
+        return "\n".join(f"- fact {i} with figures" for i in range(25))  # ~100 words of notes
+    return "## Sentiment\nPOSITIVE\n" + " ".join(["implication"] * 600)
+
+
+def run(article, single_shot: bool, word_ms: float):
+    limit = 10 ** 9 if single_shot else 8000
+    with FakeAnthropicServer(reply=reply, latency=0.3, prefill_seconds=50e-6, token_seconds=word_ms / 1000) as server, \
+            contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        analyzer = NewsAnalyzer.__new__(NewsAnalyzer)  # skip the API key lookup
+        analyzer.client, analyzer.cache = server.client(), None
+        analyzer.scheduler = Scheduler("bench", max_concurrency=analyze_news.MAX_CONCURRENT_ANALYSES)
+        analyze_news.ANALYSIS_MAX_ARTICLE_TOKENS = limit
+        start = time.perf_counter()
+        result = analyzer.analyze_article(article, "semiconductors")
+        elapsed = time.perf_counter() - start
+    input_tokens = sum(sum(u.values()) for u in server.usage)
+    cost = 0.0
+    for params, usage in zip(server.messages, server.usage):
+        price_in, price_out = PRICES[params["model"]]
+        output = len(reply(params)) // 4
+        cost += (sum(usage.values()) * price_in + output * price_out) / 1e6
+    status = "ok"
+    if 'error' in result:
+        status = "rejected: prompt too long" if "prompt is too long" in result['error'] else result['error'][:60]
+    return elapsed, len(server.messages), input_tokens, cost, status
+
+
+def main():
+    args = sys.argv[1:]
+    word_ms = 5.0
+    if "--word-ms" in args:
+        i = args.index("--word-ms")
+        word_ms = float(args[i + 1])
+        del args[i:i + 2]
+    sizes = [int(a) for a in args] or [5000, 40000, 300000]
+    analyze_news.ANALYSIS_RAW_CONTENT = True  # analyze the whole filing, not the search snippet
+
+    print(f"\n{word_ms:.0f} ms per output word, chunks of {analyze_news.ANALYSIS_CHUNK_TOKENS} tokens, "
+          f"{analyze_news.MAX_CONCURRENT_ANALYSES} condensed at once")
+    with tempfile.TemporaryDirectory() as tmp, contextlib.chdir(tmp):
+        for size in sizes:
+            article = {'title': f'Filing {size}', 'content': 'snippet', 'raw_content': filing(size), 'url': str(size)}
+            print(f"article of ~{size} tokens")
+            for name, single_shot in (("single-shot", True), ("map-reduce", False)):
+                elapsed, calls, input_tokens, cost, status = run(article, single_shot, word_ms)
+                print(f"  {name:<11} {elapsed:6.2f} s  {calls:>3} calls  input {input_tokens:>7} tokens  "
+                      f"~${cost:.4f}  {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-call latency of a new Anthropic client per call vs the shared, pooled client.
+
+Calls go to the local fake API (tests/fake_anthropic.py) served over HTTPS with
+a self-signed certificate (made with the ``openssl`` command). A new client
+builds its TLS context and opens and handshakes a new connection for every
+call; the shared client (``app.clients``) reuses one kept-alive connection.
+Local handshakes take no network time, so a second pass adds ``rtt_ms`` twice
+per new connection (TCP and TLS 1.3 handshakes) to model a remote API.
+
+Usage:
+    python benchmarks/bench_clients.py [calls] [rtt_ms]   (default: 50 40)
+"""
+import contextlib
+import io
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.clients import new_anthropic_client
+from tests.fake_anthropic import FakeAnthropicServer
+
+REQUEST = {"model": "claude-bench", "max_tokens": 10, "messages": [{"role": "user", "content": "Hello"}]}
+
+
+def self_signed_cert(directory: str):
+    cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", key, "-out", cert],
+                   check=True, capture_output=True)
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert, key)
+    return context, cert
+
+
+def per_call(calls: int, make_client):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        make_client().messages.create(**REQUEST)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rtt_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    with tempfile.TemporaryDirectory() as tmp:
+        context, cert = self_signed_cert(tmp)
+        for label, connect_seconds in (("local HTTPS", 0.0), (f"+{rtt_ms:.0f} ms RTT", 2 * rtt_ms / 1000)):
+            print(f"\n{calls} sequential calls, {label}")
+            for name, shared in (("new client", False), ("shared", True)):
+                with FakeAnthropicServer(ssl_context=context, connect_seconds=connect_seconds) as server, \
+                        contextlib.redirect_stdout(io.StringIO()):
+                    client = new_anthropic_client("bench", connections=4, base_url=server.url, verify=cert)
+                    make_client = (lambda: client) if shared else \
+                        (lambda: new_anthropic_client("bench", connections=4, base_url=server.url, verify=cert))
+                    latencies = per_call(calls, make_client)
+                print(f"  {name:<10} p50 {statistics.median(latencies):7.1f} ms  mean {statistics.mean(latencies):7.1f} ms"
+                      f"  {server.connections:>3} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Memory per document and recall@k of compressed vector indexes.
+
+Every configuration indexes the same synthetic corpus. Recall@k is the overlap
+between its top-k and the exact top-k of the uncompressed flat index, averaged
+over the queries; re-ranking fetches ``k * VECTOR_RERANK_FACTOR`` candidates and
+orders them by exact distance.
+
+Usage:
+    python benchmarks/bench_compression.py [documents] [index type]   (default: 20000 flat)
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import rag_utils
+from app.rag_utils import VectorStore
+
+K = 10
+QUERIES = 200
+VOCABULARY = 5000
+WORDS_PER_DOC = 80
+CONFIGS = [("none", 0), ("fp16", 0), ("fp16", 4), ("sq8", 0), ("sq8", 4), ("pq", 0), ("pq", 4)]
+
+
+def make_corpus(count: int, rng):
+    words = [f"term{i}" for i in range(VOCABULARY)]
+    ids = np.minimum(rng.zipf(1.2, size=(count, WORDS_PER_DOC)), VOCABULARY) - 1
+    docs = [{'title': f'Doc {i}', 'url': f'https://example.com/{i}', 'content': " ".join(words[w] for w in row)}
+            for i, row in enumerate(ids)]
+    queries = [" ".join(words[w] for w in rng.choice(ids[rng.integers(count)], 8)) for _ in range(QUERIES)]
+    return docs, queries
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    index_type = sys.argv[2] if len(sys.argv) > 2 else "flat"
+    rng = np.random.default_rng(0)
+    docs, queries = make_corpus(size, rng)
+    rag_utils.CHECKPOINT_MIN_DOCS = 10 ** 9  # convert/train once, at the end
+
+    baseline = None
+    print(f"corpus={size} index={index_type} dim={rag_utils.EMBEDDING_DIM} k={K}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for compression, rerank in CONFIGS:
+            store = VectorStore(index_dir=f"{tmp}/{compression}-{rerank}", cache_size=0, index_type=index_type,
+                                compression=compression, rerank_factor=rerank)
+            for start in range(0, size, 5000):
+                store.add_documents(docs[start:start + 5000], deduplicate=False)
+            store.save()
+
+            start = time.perf_counter()
+            results = store.search_many(queries, k=K, mode="vector")
+            per_query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            urls = [{d['url'] for d in r} for r in results]
+            if baseline is None:
+                baseline = urls
+            recall = np.mean([len(a & b) / K for a, b in zip(urls, baseline)])
+
+            stats = store.memory_stats()
+            label = f"{compression}{' + rerank x' + str(rerank) if rerank else ''}"
+            print(f"{label:>16}: {stats['bytes_per_doc']:7.0f} bytes/doc in RAM, recall@{K} {recall:.3f}, "
+                  f"{per_query_ms:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
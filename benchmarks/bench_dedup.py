@@ -0,0 +1,55 @@
+"""Measure duplicate-check latency per document against a large corpus.
+
+Builds a Deduplicator over N synthetic stored signatures, then times
+signature computation and lookup for a batch of ~400-word articles.
+
+Usage:
+    python benchmarks/bench_dedup.py [stored] [batch]   (default: 1000000 1000)
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.dedup import NUM_PERM, Deduplicator, signatures as dedup_signatures
+from app.metadata_store import article_id
+
+
+def main():
+    stored = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = np.random.default_rng(0)
+
+    start = time.perf_counter()
+    dedup = Deduplicator()
+    dedup.load(
+        rng.integers(0, 2 ** 63, size=stored, dtype=np.uint64),
+        rng.integers(0, 2 ** 63, size=stored, dtype=np.uint64),
+        rng.integers(1, 2 ** 32, size=(stored, NUM_PERM), dtype=np.uint32),
+    )
+    build_s = time.perf_counter() - start
+
+    words = [f"word{i}" for i in range(5000)]
+    pick = random.Random(0)
+    docs = [{'url': f'https://example.com/{i}', 'content': " ".join(pick.choice(words) for _ in range(400))}
+            for i in range(batch)]
+
+    start = time.perf_counter()
+    signatures = [(article_id(d), *dedup_signatures(d)) for d in docs]
+    signature_us = (time.perf_counter() - start) / batch * 1e6
+
+    start = time.perf_counter()
+    keep, dropped = dedup.filter(signatures)
+    lookup_us = (time.perf_counter() - start) / batch * 1e6
+
+    print(f"stored={stored:,}: build {build_s:.1f}s; per document: signature {signature_us:.0f} us, "
+          f"lookup {lookup_us:.0f} us, total {signature_us + lookup_us:.0f} us "
+          f"(kept {len(keep)}, dropped {dropped})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Measure local embedding throughput in docs/s.
+
+Usage:
+    python benchmarks/bench_embeddings.py [num_docs] [words_per_doc]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.embeddings import TARGET_DOCS_PER_SEC, get_embedder
+from app.rag_utils import EMBEDDING_BACKEND, EMBEDDING_DIM
+
+VOCAB = [
+    "market", "shares", "revenue", "quarter", "growth", "investors", "earnings", "guidance",
+    "billion", "million", "profit", "loss", "merger", "acquisition", "regulator", "chip",
+    "ai", "cloud", "energy", "oil", "bank", "rates", "inflation", "fed", "tariff", "supply",
+    "demand", "ceo", "analyst", "forecast", "q3", "q4", "nvda", "aapl", "msft", "tsla",
+]
+
+
+def make_docs(num_docs: int, words_per_doc: int):
+    rng = random.Random(0)
+    return [" ".join(rng.choice(VOCAB) for _ in range(words_per_doc)) for _ in range(num_docs)]
+
+
+def main():
+    num_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    words_per_doc = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    docs = make_docs(num_docs, words_per_doc)
+    embedder = get_embedder(EMBEDDING_BACKEND, EMBEDDING_DIM)
+
+    embedder.embed(docs[:50])  # warm the feature cache
+    start = time.perf_counter()
+    for i in range(0, num_docs, 100):
+        embedder.embed(docs[i:i + 100])
+    elapsed = time.perf_counter() - start
+
+    rate = num_docs / elapsed
+    status = "OK" if rate >= TARGET_DOCS_PER_SEC else "BELOW TARGET"
+    print(f"{embedder.name} dim={embedder.dim}: {num_docs} docs x {words_per_doc} words "
+          f"in {elapsed:.2f}s -> {rate:,.0f} docs/s (target {TARGET_DOCS_PER_SEC:,} docs/s) [{status}]")
+
+
+if __name__ == "__main__":
+    main()
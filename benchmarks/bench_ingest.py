@@ -0,0 +1,55 @@
+"""Measure the latency of adding a 10-document batch as the store grows.
+
+With WAL-based persistence the steady-state cost should stay flat; the
+occasional checkpoint (every max(10k docs, 10% of the store)) is reported
+separately.
+
+Usage:
+    python benchmarks/bench_ingest.py [sizes...]   (default: 1000 10000 50000)
+"""
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import rag_utils
+from app.rag_utils import VectorStore
+
+BATCH = 10
+TRIALS = 20
+
+
+def make_docs(start: int, count: int):
+    return [{'title': f'Doc {i}', 'content': f'synthetic business news article {i} about market {i % 97}'}
+            for i in range(start, start + count)]
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 50000]
+    # Keep checkpoints out of the timed section so steady-state appends are measured
+    rag_utils.CHECKPOINT_MIN_DOCS = 10 ** 9
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(index_dir=tmp, cache_size=0)
+        for size in sizes:
+            while len(store.metadata) < size:
+                store.add_documents(make_docs(len(store.metadata), min(1000, size - len(store.metadata))))
+            store.save()
+
+            timings = []
+            for _ in range(TRIALS):
+                start = time.perf_counter()
+                store.add_documents(make_docs(len(store.metadata), BATCH))
+                timings.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            store.save()
+            checkpoint_ms = (time.perf_counter() - start) * 1000
+            print(f"N={size:>8}: add {BATCH} docs median {statistics.median(timings):.2f} ms "
+                  f"(p95 {sorted(timings)[int(0.95 * TRIALS) - 1]:.2f} ms); checkpoint {checkpoint_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measure BM25 lookup latency of the lexical index at up to 1M documents.
+
+Documents are synthetic bags of ``TOKENS_PER_DOC`` words drawn from a Zipf
+distribution over ``VOCABULARY`` terms, so the query mix covers very common,
+mid-frequency and rare (ticker-like) terms. Postings are generated directly
+with NumPy to keep set-up time reasonable; tokenisation throughput is reported
+separately on real-looking text.
+
+Usage:
+    python benchmarks/bench_lexical.py [documents]   (default: 1000000)
+"""
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.lexical_index import LexicalIndex, MAX_TF, document_postings, term_hash
+
+VOCABULARY = 100_000
+TOKENS_PER_DOC = 80
+BATCH = 50_000
+TRIALS = 50
+QUERIES = {
+    "rare term": "w40000",
+    "mid term": "w800",
+    "common term": "w3",
+    "3 mixed terms": "w40000 w800 w3",
+    "5 mid/rare terms": "w900 w2500 w7000 w15000 w60000",
+}
+
+
+def synthetic_postings(rng, hashes, start, count):
+    terms = np.minimum(rng.zipf(1.1, size=(count, TOKENS_PER_DOC)), VOCABULARY) - 1
+    owners = np.repeat(np.arange(start, start + count, dtype=np.uint32), TOKENS_PER_DOC)
+    tokens = hashes[terms.ravel()]
+    order = np.lexsort((owners, tokens))
+    tokens, owners = tokens[order], owners[order]
+    first = np.flatnonzero(np.r_[True, (tokens[1:] != tokens[:-1]) | (owners[1:] != owners[:-1])])
+    tfs = np.minimum(np.diff(np.r_[first, len(tokens)]), MAX_TF).astype(np.uint8)
+    return tokens[first], owners[first], tfs, np.full(count, TOKENS_PER_DOC, dtype=np.uint32)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = np.random.default_rng(0)
+    hashes = np.array([term_hash(f"w{i}") for i in range(VOCABULARY)], dtype=np.uint64)
+
+    text = ("Apple (NASDAQ: AAPL) reported Q3 revenue of $81.8 billion, up 1.4% year over year, "
+            "as services growth offset weaker iPhone sales in China. ") * 25
+    start = time.perf_counter()
+    document_postings([text] * 500, 0)
+    print(f"tokenisation: {500 / (time.perf_counter() - start):,.0f} docs/s (~{len(text.split())} words each)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LexicalIndex(tmp)
+        start = time.perf_counter()
+        for batch_start in range(0, total, BATCH):
+            count = min(BATCH, total - batch_start)
+            index.add_postings(batch_start, *synthetic_postings(rng, hashes, batch_start, count))
+            if (batch_start + count) % (4 * BATCH) == 0:
+                index.flush()
+        index.flush()
+        postings = sum(len(s) for s in index.segments)
+        print(f"indexed {total:,} docs / {postings:,} postings in {time.perf_counter() - start:.0f}s; "
+              f"{len(index.segments)} segments, {postings * 5 / 2 ** 20:.0f} MB of postings")
+
+        for label, query in QUERIES.items():
+            index.search(query, k=10)
+            timings = []
+            for _ in range(TRIALS):
+                start = time.perf_counter()
+                index.search(query, k=10)
+                timings.append((time.perf_counter() - start) * 1000)
+            matched = sum(len(s.lookup(term_hash(t))[0]) for s in index.segments for t in query.split())
+            print(f"{label:>17}: median {statistics.median(timings):7.2f} ms  ({matched:,} postings)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare cold-start time and memory of pickled vs columnar metadata.
+
+Each measurement runs in a fresh interpreter that opens the metadata and
+fetches five records, reporting wall time (after imports) and resident memory
+growth (Linux only, read from /proc/self/statm).
+
+Usage:
+    python benchmarks/bench_metadata.py [sizes...]   (default: 10000 100000)
+"""
+import pickle
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from app.metadata_store import MetadataStore
+
+PROBE = """
+import os, sys, time, pickle
+sys.path.append({root!r})
+from app.metadata_store import MetadataStore
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+before = rss()
+start = time.perf_counter()
+if {columnar}:
+    metadata = MetadataStore({path!r})
+else:
+    with open({path!r}, "rb") as f:
+        metadata = pickle.load(f)
+hits = [metadata[i] for i in (0, 7, 42, len(metadata) // 2, len(metadata) - 1)]
+elapsed = (time.perf_counter() - start) * 1000
+growth = rss() - before
+print(f"{{elapsed:.1f}} ms, +{{growth / 2 ** 20:.1f}} MB RSS")
+"""
+
+
+def make_docs(count: int):
+    body = "Shares rose after the company reported quarterly revenue above analyst estimates. " * 25
+    return [{'title': f'Article {i}', 'url': f'https://news.example.com/{i}', 'content': f"{i}: {body}",
+             'published_date': '2024-10-14', 'source': 'example.com'} for i in range(count)]
+
+
+def probe(path: str, columnar: bool) -> str:
+    code = PROBE.format(root=str(ROOT), path=path, columnar=columnar)
+    return subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10000, 100000]
+    for size in sizes:
+        docs = make_docs(size)
+        with tempfile.TemporaryDirectory() as tmp:
+            pickle_path = str(Path(tmp) / "meta.pkl")
+            with open(pickle_path, "wb") as f:
+                pickle.dump(docs, f)
+            store = MetadataStore(str(Path(tmp) / "metadata"))
+            store.extend(docs)
+            store.close()
+            print(f"N={size:>8}: meta.pkl {probe(pickle_path, False)} | columnar {probe(store.directory, True)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Time to first token and input tokens of analysis and chat requests, with and without prompt caching.
+
+Streams the requests built by ``NewsAnalyzer.analysis_request`` (a batch of
+articles for one business context) and ``chat_request`` (a multi-turn chat
+over analyzed articles whose full context fits ``CHAT_CONTEXT_TOKENS``; larger
+sets get retrieved passages instead, see bench_chat_context.py). Each workload runs twice: as built, and with every
+``cache_control`` marker removed. "billed" weighs cache writes at 1.25x and
+cache reads at 0.1x of the base input price.
+
+By default the requests go to the local fake API (tests/fake_anthropic.py),
+whose prompt caching follows the API rules but whose latency is a model
+(300 ms + 50 us per uncached input token). Pass --live to measure the real
+API with ANTHROPIC_API_KEY; run it twice more than 5 minutes apart if the
+cache may already be warm.
+
+Usage:
+    python benchmarks/bench_prompt_cache.py [--live] [articles] [turns]   (default: 20 10)
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from anthropic import Anthropic
+
+from app.analyze_news import NewsAnalyzer
+from app.chat import chat_request
+from app.clients import messages_args
+from tests.fake_anthropic import FakeAnthropicServer
+
+
+def without_cache_control(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: without_cache_control(v) for k, v in value.items() if k != "cache_control"}
+    if isinstance(value, list):
+        return [without_cache_control(v) for v in value]
+    return value
+
+
+def stream(client: Anthropic, params: Dict[str, Any]):
+    """(seconds to the first text delta, reply text, usage) of one streamed request"""
+    start = time.perf_counter()
+    first = None
+    with client.messages.stream(**messages_args(params, stream=True)) as response:
+        for _ in response.text_stream:
+            first = first or time.perf_counter() - start
+        message = response.get_final_message()
+    return first, message.content[0].text, message.usage
+
+
+def analysis_workload(client: Anthropic, articles: int, cached: bool) -> List[Any]:
+    analyzer = NewsAnalyzer.__new__(NewsAnalyzer)  # only builds requests
+    runs = []
+    for i in range(articles):
+        article = {'title': f'Article {i}', 'content': f"Foundry capacity update {i}. " * 120}
+        params = analyzer.analysis_request(article, "semiconductor supply chain")
+        runs.append(stream(client, params if cached else without_cache_control(params)))
+    return runs
+
+
+def chat_workload(client: Anthropic, turns: int, cached: bool) -> List[Any]:
+    articles = [{'title': f'Article {i}', 'content': f"Foundry capacity update {i}. " * 120,
+                 'analysis': "## Sentiment\nPOSITIVE\n## Key facts\n- capacity up 12%\n" * 40} for i in range(3)]
+    history, runs = [], []
+    for turn in range(turns):
+        question = f"What does this mean for supplier {turn}?"
+        history.append({"role": "user", "content": question})
+        params = chat_request(question, articles, history)
+        run = stream(client, params if cached else without_cache_control(params))
+        history.append({"role": "assistant", "content": run[1]})
+        runs.append(run)
+    return runs
+
+
+def report(name: str, runs: List[Any]):
+    ttft = [r[0] * 1000 for r in runs]
+    fresh = sum(r[2].input_tokens for r in runs)
+    written = sum(r[2].cache_creation_input_tokens or 0 for r in runs)
+    read = sum(r[2].cache_read_input_tokens or 0 for r in runs)
+    print(f"  {name:<9} TTFT mean {statistics.mean(ttft):7.1f} ms  p50 {statistics.median(ttft):7.1f} ms   "
+          f"input {fresh:>7}  cache write {written:>6}  cache read {read:>7}  "
+          f"billed {fresh + 1.25 * written + 0.1 * read:>9.0f}")
+
+
+def main():
+    args = sys.argv[1:]
+    live = "--live" in args
+    args = [a for a in args if a != "--live"]
+    articles = int(args[0]) if args else 20
+    turns = int(args[1]) if len(args) > 1 else 10
+
+    for label, workload, count in (("analysis batch", analysis_workload, articles), ("chat", chat_workload, turns)):
+        print(f"\n{label}, {count} requests ({'live API' if live else 'fake API, modelled latency'})")
+        for cached in (False, True):
+            name = "cached" if cached else "uncached"
+            if live:
+                report(name, workload(NewsAnalyzer().client, count, cached))
+                continue
+            with FakeAnthropicServer(latency=0.3, prefill_seconds=50e-6) as server:
+                client = Anthropic(api_key="bench", base_url=server.url, max_retries=0)
+                report(name, workload(client, count, cached))
+
+
+if __name__ == "__main__":
+    main()
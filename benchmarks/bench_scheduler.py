@@ -0,0 +1,82 @@
+"""Bulk analysis and chat latency against a throttling API, with and without the adaptive scheduler.
+
+Runs NewsAnalyzer.analyze_articles against the local fake API
+(tests/fake_anthropic.py), which answers at most ``capacity`` requests at once
+and returns 429 ``rate_limit_error`` to the rest. While the bulk run is in
+flight, one chat-sized request is sent at INTERACTIVE priority. Compared:
+
+- no retries: every call is sent at once and a 429 fails the article,
+- fixed limit: retried with backoff, but the concurrency stays at the start value,
+- adaptive: retried with backoff and the AIMD limit backs off on 429s.
+
+Usage:
+    python benchmarks/bench_scheduler.py [articles] [capacity] [latency_s]   (default: 40 4 0.2)
+"""
+import contextlib
+import io
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.analyze_news import NewsAnalyzer
+from app.scheduler import INTERACTIVE, Scheduler
+from tests.fake_anthropic import FakeAnthropicServer
+
+
+def chat_latency(analyzer: NewsAnalyzer, delay: float, out: list):
+    time.sleep(delay)  # once the bulk run has filled the queue
+    start = time.perf_counter()
+    try:
+        analyzer.scheduler.call(analyzer.client.messages.create, priority=INTERACTIVE, model="chat",
+                                max_tokens=100, messages=[{"role": "user", "content": "What changed?"}])
+        out.append(time.perf_counter() - start)
+    except Exception:
+        out.append(None)
+
+
+def run(articles: int, capacity: int, latency: float, scheduler: Scheduler):
+    analyzer = NewsAnalyzer.__new__(NewsAnalyzer)  # skip the API key lookup
+    analyzer.cache, analyzer.scheduler = None, scheduler
+    batch = [{'title': f'Article {i}', 'content': f'Quarterly results {i}', 'url': f'https://example.com/{i}'}
+             for i in range(articles)]
+    chat = []
+    with FakeAnthropicServer(latency=latency, max_in_flight=capacity) as server, \
+            contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        analyzer.client = server.client()
+        chatter = threading.Thread(target=chat_latency, args=(analyzer, latency, chat))
+        chatter.start()
+        start = time.perf_counter()
+        results = analyzer.analyze_articles(batch, "semiconductors", max_concurrency=articles)
+        elapsed = time.perf_counter() - start
+        chatter.join()
+    failed = sum('error' in result for result in results)
+    return elapsed, failed, server.throttled, scheduler.stats()["limit"], chat[0]
+
+
+def main():
+    articles = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    capacity = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.2
+
+    print(f"\n{articles} articles sent at once, API serves {capacity} at a time, {latency * 1000:.0f} ms per request")
+    modes = [
+        ("no retries", Scheduler("bench", max_concurrency=articles, max_attempts=1)),
+        ("fixed limit", Scheduler("bench", max_concurrency=articles, min_concurrency=articles, max_attempts=10,
+                                  backoff_base=latency, backoff_max=10 * latency)),
+        ("adaptive", Scheduler("bench", max_concurrency=articles, max_attempts=10, backoff_base=latency,
+                               backoff_max=10 * latency)),
+    ]
+    with tempfile.TemporaryDirectory() as tmp, contextlib.chdir(tmp):
+        for name, scheduler in modes:
+            elapsed, failed, throttled, limit, chat = run(articles, capacity, latency, scheduler)
+            chat_text = f"{chat:5.2f} s" if chat is not None else "failed "
+            print(f"  {name:<11} {elapsed:6.2f} s  {failed:>3} failed  {throttled:>4} x 429  "
+                  f"final limit {limit:>3}  chat answered in {chat_text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Compare ``VectorStore.search_many`` with looping ``search``.
+
+Both use the same store and queries; the embedding cache is disabled so
+every run embeds its queries.
+
+Usage:
+    python benchmarks/bench_search_many.py [corpus size] [index type]   (default: 20000 flat)
+"""
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.rag_utils import VectorStore
+
+QUERY_COUNTS = (10, 100, 1000)
+K = 10
+SECTORS = ["semiconductors", "banking", "oil and gas", "retail", "autos", "pharma", "airlines",
+           "crypto", "utilities", "telecom", "insurance", "real estate"]
+
+
+def make_docs(count: int):
+    return [{'title': f'Doc {i}', 'url': f'https://example.com/{i}',
+             'content': f'{SECTORS[i % 12]} outlook {i}: earnings, guidance and demand for sector {i % 97} '
+                        f'as analysts weigh {SECTORS[(i * 5) % 12]} exposure'}
+            for i in range(count)]
+
+
+def make_queries(count: int):
+    return [f"{SECTORS[i % 12]} earnings outlook {i}" for i in range(count)]
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    index_type = sys.argv[2] if len(sys.argv) > 2 else "flat"
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(index_dir=tmp, cache_size=0, index_type=index_type)
+        for start in range(0, size, 5000):
+            store.add_documents(make_docs(size)[start:start + 5000], deduplicate=False)
+        store.search_many(make_queries(10), k=K)  # warm up
+
+        print(f"corpus={size} index={index_type} k={K}")
+        for count in QUERY_COUNTS:
+            queries = make_queries(count)
+            start = time.perf_counter()
+            [store.search(query, k=K) for query in queries]
+            loop_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store.search_many(queries, k=K)
+            batch_s = time.perf_counter() - start
+
+            print(f"{count:>5} queries: loop {loop_s * 1000:8.1f} ms, search_many {batch_s * 1000:8.1f} ms "
+                  f"({loop_s / batch_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Compare per-rerun latency and per-session memory of the vector store.
+
+Streamlit re-executes ``app/App.py`` on every widget interaction. Before the
+shared store, each rerun constructed a ``VectorStore`` (reading the index and
+metadata from disk) and each session held its own copy; now each rerun calls
+``get_vector_store()``, which returns the process-wide instance.
+
+Each measurement runs in a fresh interpreter: it simulates a number of
+sessions each performing a number of reruns, and reports the mean rerun time
+and the resident memory growth per session (Linux only, /proc/self/statm).
+
+Usage:
+    python benchmarks/bench_shared_store.py [docs] [sessions] [reruns]   (default: 20000 4 5)
+"""
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+
+from app.rag_utils import VectorStore
+
+PROBE = """
+import os, sys, time
+sys.path.append({root!r})
+from app.rag_utils import VectorStore, get_vector_store
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+before = rss()
+sessions, timings = [], []
+for session in range({sessions}):
+    for rerun in range({reruns}):
+        start = time.perf_counter()
+        store = get_vector_store({path!r}) if {shared} else VectorStore(index_dir={path!r})
+        store.search("quarterly revenue guidance", k=5)
+        timings.append(time.perf_counter() - start)
+    sessions.append(store)  # a session keeps its last store alive
+growth = (rss() - before) / {sessions}
+first = timings[0]
+timings.sort()
+print(f"first {{first * 1000:.1f}} ms, median {{timings[len(timings) // 2] * 1000:.2f}} ms,"
+      f" +{{growth / 2 ** 20:.1f}} MB RSS per session")
+"""
+
+
+def make_docs(count: int):
+    body = "Shares rose after the company reported quarterly revenue above analyst estimates. " * 25
+    return [{'title': f'Article {i}', 'url': f'https://news.example.com/{i}', 'content': f"{i}: {body}",
+             'published_date': '2024-10-14'} for i in range(count)]
+
+
+def probe(path: str, shared: bool, sessions: int, reruns: int) -> str:
+    code = PROBE.format(root=str(ROOT), path=path, shared=shared, sessions=sessions, reruns=reruns)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def main():
+    docs = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    reruns = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(index_dir=tmp, cache_size=0)
+        store.add_documents(make_docs(docs), deduplicate=False)
+        store.save()
+        print(f"\n{docs} documents, {sessions} sessions x {reruns} reruns")
+        print(f"  VectorStore() per rerun:    {probe(tmp, False, sessions, reruns)}")
+        print(f"  get_vector_store() shared:  {probe(tmp, True, sessions, reruns)}")
+
+
+if __name__ == "__main__":
+    main()
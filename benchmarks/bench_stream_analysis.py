@@ -0,0 +1,71 @@
+"""Time until analysis text reaches the UI: blocking analyze_articles vs streaming stream_articles.
+
+Both paths run against the local fake API (tests/fake_anthropic.py) with a
+modelled 300 ms time to first token and a fixed delay per streamed word, so
+only the difference in what the user waits for is measured. Blocking renders
+nothing until every article is done; streaming shows each article's first
+token, then its first complete section.
+
+Usage:
+    python benchmarks/bench_stream_analysis.py [articles] [words] [word_ms] [concurrency]   (default: 8 400 5 4)
+"""
+import contextlib
+import io
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app.analyze_news import NewsAnalyzer
+from app.scheduler import Scheduler
+from tests.fake_anthropic import FakeAnthropicServer
+
+
+def analysis_text(words: int) -> str:
+    sections = ["## Sentiment", "## Key facts", "## Implications", "## Recommendations", "## Stakeholders", "## Trends"]
+    per_section = max(1, words // len(sections))
+    return "\n".join(f"{heading}\n" + " ".join(["capacity"] * per_section) for heading in sections)
+
+
+def main():
+    articles = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    words = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    word_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else 4
+
+    analyzer = NewsAnalyzer.__new__(NewsAnalyzer)  # skip the API key lookup
+    analyzer.cache = None
+    analyzer.scheduler = Scheduler("bench", max_concurrency=concurrency)
+    batch = [{'title': f'Article {i}', 'content': f'Quarterly results {i}', 'url': f'https://example.com/{i}'}
+             for i in range(articles)]
+    text = analysis_text(words)
+
+    print(f"\n{articles} articles, ~{words} words at {word_ms:.0f} ms each, {concurrency} in flight")
+    with FakeAnthropicServer(reply=lambda params: text, latency=0.3, token_seconds=word_ms / 1000) as server, \
+            tempfile.TemporaryDirectory() as tmp, contextlib.chdir(tmp):
+        analyzer.client = server.client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            analyzer.analyze_articles(batch, "semiconductors", max_concurrency=concurrency)
+            blocking = time.perf_counter() - start
+
+            start = time.perf_counter()
+            first_visible, metrics = None, []
+            for event in analyzer.stream_articles(batch, "semiconductors", max_concurrency=concurrency):
+                first_visible = first_visible or time.perf_counter() - start
+                if event['type'] == 'done':
+                    metrics.append(event['metrics'])
+            streaming = time.perf_counter() - start
+
+    print(f"  blocking   first text shown {blocking:6.2f} s  (all articles at once)")
+    print(f"  streaming  first text shown {first_visible:6.2f} s  all done {streaming:6.2f} s")
+    print(f"             per article: first token p50 {statistics.median(m['ttft'] for m in metrics):5.2f} s, "
+          f"first section p50 {statistics.median(m['first_section'] for m in metrics):5.2f} s, "
+          f"complete p50 {statistics.median(m['total'] for m in metrics):5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
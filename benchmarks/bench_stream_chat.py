@@ -0,0 +1,65 @@
+"""Time until a chat reply reaches the UI: blocking get_chat_response vs streaming stream_chat_response.
+
+Both run against the local fake API (tests/fake_anthropic.py) with a modelled
+300 ms time to first token and a fixed delay per streamed word. A third run
+cancels the stream halfway, as when the user sends a new message, and shows
+how soon the call returns.
+
+Usage:
+    python benchmarks/bench_stream_chat.py [words] [word_ms] [turns]   (default: 300 10 5)
+"""
+import contextlib
+import io
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import chat
+from app.chat import get_chat_response, stream_chat_response
+from tests.fake_anthropic import FakeAnthropicServer
+
+ARTICLES = [{'title': f'Article {i}', 'url': f'https://example.com/{i}', 'content': f"Foundry capacity update {i}. " * 50,
+             'analysis': "## Sentiment\nPOSITIVE\n## Key facts\n- capacity up 12%\n" * 10} for i in range(3)]
+
+
+def main():
+    words = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    word_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    turns = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    reply = " ".join(["capacity"] * words)
+
+    print(f"\n{turns} chat turns, replies of {words} words at {word_ms:.0f} ms each")
+    with FakeAnthropicServer(reply=lambda params: reply, latency=0.3, token_seconds=word_ms / 1000) as server, \
+            contextlib.redirect_stdout(io.StringIO()):
+        chat.get_anthropic_client = server.client
+        blocking, first, total, speed, cancelled = [], [], [], [], []
+        for turn in range(turns):
+            question = f"What changed for supplier {turn}?"
+            start = time.perf_counter()
+            get_chat_response(question, ARTICLES, [])
+            blocking.append(time.perf_counter() - start)
+
+            metrics = list(stream_chat_response(question, ARTICLES, []))[-1]['metrics']
+            first.append(metrics['ttft'])
+            total.append(metrics['total'])
+            speed.append(metrics['tokens_per_sec'])
+
+            cancel = threading.Event()
+            start = time.perf_counter()
+            for event in stream_chat_response(question, ARTICLES, [], cancel=cancel):
+                if event['type'] == 'delta' and time.perf_counter() - start > metrics['total'] / 2:
+                    cancel.set()
+            cancelled.append(time.perf_counter() - start)
+
+    print(f"  blocking   first text shown {statistics.median(blocking):6.2f} s  (whole reply at once)")
+    print(f"  streaming  first text shown {statistics.median(first):6.2f} s  complete {statistics.median(total):6.2f} s  "
+          f"{statistics.median(speed):5.0f} tokens/s")
+    print(f"  cancelled  halfway, returned after {statistics.median(cancelled):6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
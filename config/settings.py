@@ -8,6 +8,9 @@ ANTHROPIC_API_KEY = "your API KEY"
 MAX_TOKENS = 10000  # Max tokens for Claude Sonnet
 MAX_RESULTS = 10  # Limit to 10 articles
 SEARCH_DEPTH = "advanced"
+# Analyze the full page text (Tavily raw_content) instead of the search result content; off by default
+# since whole pages cost far more input tokens than the extract chat and the dashboard work from
+ANALYSIS_RAW_CONTENT = os.getenv("ANALYSIS_RAW_CONTENT", "0") == "1"
 
 def get_api_key(key_name: str) -> str:
     """Get API key from session state or environment"""
@@ -23,11 +23,17 @@ setup(
     python_requires=">=3.9",
     install_requires=[
         "streamlit>=1.32.0",
-        "anthropic>=0.18.1",
+        "anthropic>=0.41.0,<2",
         "python-dotenv>=1.0.1",
+        "python-dateutil>=2.9.0",
+        "numpy>=1.24.0",
         "pandas>=1.3.0",
+        "faiss-cpu>=1.7.4",
         "plotly>=5.0.0",
-        "tavily-python>=0.3.1",
+        "tavily-python>=0.8.0,<0.9",
+        "tenacity>=8.0.0",
+        "httpx>=0.23.0",
+        "requests>=2.28.0",
         "yfinance>=0.2.36",
     ],
     entry_points={
@@ -1,8 +1,13 @@
 """Test fixtures and configuration."""
+import os
+
+os.environ["ANALYSIS_CACHE_PATH"] = ""  # never open the shared analysis cache from tests
+
 import pytest
 from unittest.mock import Mock
 from app.analyze_news import NewsAnalyzer
 from app.rag_utils import VectorStore
+from app.scheduler import Scheduler
 
 @pytest.fixture
 def mock_anthropic_client():
@@ -16,4 +21,5 @@ def mock_vector_store():
 def news_analyzer(mock_anthropic_client):
     analyzer = NewsAnalyzer()
     analyzer.client = mock_anthropic_client
+    analyzer.scheduler = Scheduler("test", backoff_base=0.01)  # not the process-wide one
     return analyzer
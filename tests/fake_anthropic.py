@@ -0,0 +1,342 @@
+"""Local stand-in for the Anthropic Messages and Message Batches HTTP APIs.
+
+Point a real SDK client at it so request building, response parsing and
+polling are exercised without network access::
+
+    with FakeAnthropicServer() as server:
+        client = server.client()
+
+``reply(params)`` gives the reply text, or a list of content blocks such as
+``{"type": "tool_use", "name": ..., "input": {...}}``. Replies longer than
+the request's ``max_tokens`` are cut off there (a tool call cut short is
+dropped) and end with ``stop_reason: "max_tokens"``.
+
+Batches stay ``in_progress`` for ``polls_before_end`` status checks, then
+end with every request succeeded unless ``fail(custom_id, attempt)`` returns
+an error type (``"overloaded_error"``, ``"invalid_request_error"``, ...) or
+``"expired"``/``"canceled"`` for that attempt.
+
+Messages report usage like the real API, including prompt caching: the
+prompt prefix up to each ``cache_control`` breakpoint of at least
+``min_cache_tokens`` tokens (about 4 characters each) is written on first use
+and read afterwards. With ``stream: true`` the reply is sent as server-sent
+events. Latency is modelled, not measured: the first token arrives after
+``latency`` plus ``prefill_seconds`` per uncached input token (a tenth of that
+per cached token), and each further chunk after ``token_seconds``. Prompts
+over ``context_window`` tokens are rejected like the real API does.
+
+Throttling: a message request arriving while ``max_in_flight`` others are
+being answered gets ``throttle_status`` (429 ``rate_limit_error`` or 529
+``overloaded_error``) with a ``retry-after`` header of ``retry_after``
+seconds; ``throttled`` counts them.
+
+Connections are kept alive between requests (HTTP/1.1; streams close theirs).
+``connections`` counts the connections opened, each of which waits
+``connect_seconds`` (to model handshake round trips) before its first
+request. Pass ``ssl_context`` to serve HTTPS.
+"""
+import hashlib
+import json
+import re
+import ssl
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from anthropic import Anthropic
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _content(reply: Union[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Content blocks of a reply given as text or as a list of blocks"""
+    if isinstance(reply, str):
+        return [{"type": "text", "text": reply}]
+    return [{**block, "id": f"toolu_{uuid.uuid4().hex[:24]}"} if block["type"] == "tool_use" else block
+            for block in reply]
+
+
+def _output_tokens(content: List[Dict[str, Any]]) -> int:
+    return _tokens("".join(block.get("text") or json.dumps(block.get("input")) for block in content))
+
+
+def _truncated(content: List[Dict[str, Any]], max_tokens: int) -> Optional[List[Dict[str, Any]]]:
+    """Content cut off after ``max_tokens`` output tokens, or None if it fits"""
+    if _output_tokens(content) <= max_tokens:
+        return None
+    kept, budget = [], max_tokens
+    for block in content:
+        if block["type"] != "text":  # a tool call cut short is dropped
+            break
+        kept.append({**block, "text": block["text"][:4 * budget]})
+        budget -= _tokens(block["text"])
+        if budget <= 0:
+            break
+    return kept or [{"type": "text", "text": ""}]
+
+
+def _message(params: Dict[str, Any], content: List[Dict[str, Any]],
+             usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+    truncated = _truncated(content, params["max_tokens"]) if params.get("max_tokens") else None
+    content = truncated or content
+    tool_use = any(block["type"] == "tool_use" for block in content)
+    return {
+        "id": f"msg_{uuid.uuid4().hex[:24]}", "type": "message", "role": "assistant",
+        "model": params.get("model", "fake"), "content": content,
+        "stop_reason": "max_tokens" if truncated else "tool_use" if tool_use else "end_turn", "stop_sequence": None,
+        "usage": {**(usage or {"input_tokens": _tokens(json.dumps(params.get("messages", [])))}),
+                  "output_tokens": _output_tokens(content)},
+    }
+
+
+def _prompt_blocks(params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Prompt content blocks in cache-prefix order: system, then messages"""
+    system = params.get("system") or []
+    blocks = [{"type": "text", "text": system}] if isinstance(system, str) else list(system)
+    for message in params.get("messages", []):
+        content = message["content"]
+        content = [{"type": "text", "text": content}] if isinstance(content, str) else content
+        blocks.extend({**block, "role": message["role"]} for block in content)
+    return blocks
+
+
+def _user_text(params: Dict[str, Any]) -> str:
+    content = params["messages"][-1]["content"]
+    return content if isinstance(content, str) else " ".join(block.get("text", "") for block in content)
+
+
+class FakeAnthropicServer:
+    def __init__(self, reply: Optional[Callable[[Dict[str, Any]], Union[str, List[Dict[str, Any]]]]] = None,
+                 fail: Optional[Callable[[str, int], Optional[str]]] = None, polls_before_end: int = 1,
+                 min_cache_tokens: int = 1024, latency: float = 0.0, prefill_seconds: float = 0.0,
+                 token_seconds: float = 0.0, context_window: int = 200_000, max_in_flight: Optional[int] = None,
+                 throttle_status: int = 429, retry_after: float = 0.0, connect_seconds: float = 0.0,
+                 ssl_context: Optional[ssl.SSLContext] = None):
+        self.reply = reply or (lambda params: f"Analysis of: {_user_text(params)[:60]}")
+        self.fail = fail or (lambda custom_id, attempt: None)
+        self.polls_before_end = polls_before_end
+        self.min_cache_tokens = min_cache_tokens
+        self.latency = latency
+        self.prefill_seconds = prefill_seconds
+        self.token_seconds = token_seconds
+        self.context_window = context_window
+        self.max_in_flight = max_in_flight
+        self.throttle_status = throttle_status
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.throttled = 0
+        self.connect_seconds = connect_seconds
+        self.connections = 0
+        self.messages: List[Dict[str, Any]] = []  # params of every /v1/messages call
+        self.usage: List[Dict[str, int]] = []  # input usage of every /v1/messages call
+        self.prompt_cache = set()
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        if ssl_context is not None:
+            self._server.socket = ssl_context.wrap_socket(self._server.socket, server_side=True)
+        scheme = "https" if ssl_context is not None else "http"
+        self.url = f"{scheme}://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> "FakeAnthropicServer":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def client(self) -> Anthropic:
+        """SDK client for this server"""
+        return Anthropic(api_key="test", base_url=self.url, max_retries=0)
+
+    def submitted(self) -> List[List[str]]:
+        """custom_ids of every batch, in submission order"""
+        return [[r["custom_id"] for r in batch["requests"]] for batch in self.batches.values()]
+
+    def _input_usage(self, params: Dict[str, Any]) -> Dict[str, int]:
+        digest = hashlib.sha256(params.get("model", "").encode("utf-8"))
+        total, breakpoints = 0, []
+        for block in _prompt_blocks(params):
+            digest.update(json.dumps({k: v for k, v in block.items() if k != "cache_control"},
+                                     sort_keys=True).encode("utf-8"))
+            total += _tokens(block.get("text", ""))
+            if block.get("cache_control"):
+                breakpoints.append((digest.hexdigest(), total))
+        with self._lock:
+            read = max((tokens for key, tokens in breakpoints if key in self.prompt_cache), default=0)
+            cacheable = [(key, tokens) for key, tokens in breakpoints
+                         if tokens > read and tokens >= self.min_cache_tokens]
+            self.prompt_cache.update(key for key, _ in cacheable)
+        written = max((tokens for _, tokens in cacheable), default=read) - read
+        return {"input_tokens": total - read - written, "cache_creation_input_tokens": written,
+                "cache_read_input_tokens": read}
+
+    def _time_to_first_token(self, usage: Dict[str, int]) -> float:
+        uncached = usage["input_tokens"] + usage["cache_creation_input_tokens"]
+        return self.latency + self.prefill_seconds * (uncached + 0.1 * usage["cache_read_input_tokens"])
+
+    def _batch_json(self, batch: Dict[str, Any]) -> Dict[str, Any]:
+        ended = batch["polls"] > self.polls_before_end
+        counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        if ended:
+            for line in batch["results"]:
+                counts[line["result"]["type"]] += 1
+        else:
+            counts["processing"] = len(batch["requests"])
+        return {
+            "id": batch["id"], "type": "message_batch", "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts, "created_at": batch["created_at"], "expires_at": batch["expires_at"],
+            "ended_at": _now() if ended else None, "archived_at": None, "cancel_initiated_at": None,
+            "results_url": f"{self.url}/v1/messages/batches/{batch['id']}/results" if ended else None,
+        }
+
+    def _create_batch(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        results = []
+        with self._lock:
+            for request in requests:
+                custom_id = request["custom_id"]
+                attempt = self.attempts[custom_id] = self.attempts.get(custom_id, 0) + 1
+                failure = self.fail(custom_id, attempt)
+                if failure in ("expired", "canceled"):
+                    result = {"type": failure}
+                elif failure:
+                    result = {"type": "errored", "error": {"type": "error", "request_id": None,
+                                                           "error": {"type": failure, "message": failure}}}
+                else:
+                    result = {"type": "succeeded", "message": _message(request["params"], _content(self.reply(request["params"])))}
+                results.append({"custom_id": custom_id, "result": result})
+            batch = {"id": f"msgbatch_{uuid.uuid4().hex[:24]}", "requests": requests, "results": results[::-1],
+                     "polls": 0, "created_at": _now(),
+                     "expires_at": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()}
+            self.batches[batch["id"]] = batch
+        return self._batch_json(batch)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes on a kept-alive connection
+
+            def setup(self):
+                super().setup()
+                with fake._lock:
+                    fake.connections += 1
+                time.sleep(fake.connect_seconds)
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status: int, body: Any, content_type: str = "application/json",
+                      headers: Optional[Dict[str, str]] = None):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, params: Dict[str, Any], content: List[Dict[str, Any]], usage: Dict[str, int]):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")  # the stream has no length; its end closes the connection
+                self.end_headers()
+                message = _message(params, content, usage)
+                content = message["content"]  # as cut off at max_tokens
+                final = {"stop_reason": message["stop_reason"], "stop_sequence": None}
+                message.update(content=[], stop_reason=None)
+                message["usage"]["output_tokens"] = 1
+                events = [{"type": "message_start", "message": message}]
+                for index, block in enumerate(content):
+                    if block["type"] == "text":
+                        chunks = re.findall(r"\S*\s*", block["text"])[:-1] or [""]
+                        deltas = [{"type": "text_delta", "text": chunk} for chunk in chunks]
+                        start = {"type": "text", "text": ""}
+                    else:
+                        deltas = [{"type": "input_json_delta", "partial_json": json.dumps(block["input"])}]
+                        start = {**block, "input": {}}
+                    events.append({"type": "content_block_start", "index": index, "content_block": start})
+                    events.extend({"type": "content_block_delta", "index": index, "delta": delta} for delta in deltas)
+                    events.append({"type": "content_block_stop", "index": index})
+                events += [{"type": "message_delta", "delta": final, "usage": {"output_tokens": _output_tokens(content)}},
+                           {"type": "message_stop"}]
+                first_delta = True
+                for event in events:
+                    if event["type"] == "content_block_delta":
+                        if not first_delta:  # the first chunk arrives with the TTFT
+                            time.sleep(fake.token_seconds)
+                        first_delta = False
+                    try:
+                        self.wfile.write(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):  # the client stopped reading the stream
+                        return
+
+            def do_POST(self):
+                params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/v1/messages":
+                    with fake._lock:
+                        throttled = fake.max_in_flight is not None and fake.in_flight >= fake.max_in_flight
+                        if throttled:
+                            fake.throttled += 1
+                        else:
+                            fake.in_flight += 1
+                            fake.peak_in_flight = max(fake.peak_in_flight, fake.in_flight)
+                    if throttled:
+                        error = "rate_limit_error" if fake.throttle_status == 429 else "overloaded_error"
+                        body = {"type": "error", "error": {"type": error, "message": error}}
+                        return self._send(fake.throttle_status, body, headers={"retry-after": str(fake.retry_after)})
+                    try:
+                        return self._answer(params)
+                    finally:
+                        with fake._lock:
+                            fake.in_flight -= 1
+                if self.path == "/v1/messages/batches":
+                    return self._send(200, fake._create_batch(params["requests"]))
+                self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+
+            def _answer(self, params: Dict[str, Any]):
+                usage = fake._input_usage(params)
+                prompt_tokens = sum(usage.values())
+                if prompt_tokens + params.get("max_tokens", 0) > fake.context_window:
+                    message = f"prompt is too long: {prompt_tokens} tokens > {fake.context_window} maximum"
+                    return self._send(400, {"type": "error",
+                                            "error": {"type": "invalid_request_error", "message": message}})
+                with fake._lock:
+                    fake.messages.append(params)
+                    fake.usage.append(usage)
+                content = _content(fake.reply(params))
+                time.sleep(fake._time_to_first_token(usage))
+                if params.get("stream"):
+                    return self._stream(params, content, usage)
+                words = sum(len(re.findall(r"\S+", block.get("text", ""))) for block in content)
+                time.sleep(fake.token_seconds * words)
+                return self._send(200, _message(params, content, usage))
+
+            def do_GET(self):
+                match = re.fullmatch(r"/v1/messages/batches/([\w-]+)(/results)?", self.path)
+                batch = fake.batches.get(match.group(1)) if match else None
+                if batch is None:
+                    return self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": self.path}})
+                if match.group(2):
+                    lines = "".join(json.dumps(line) + "\n" for line in batch["results"])
+                    return self._send(200, lines.encode("utf-8"), "application/binary")
+                with fake._lock:
+                    batch["polls"] += 1
+                self._send(200, fake._batch_json(batch))
+
+        return Handler
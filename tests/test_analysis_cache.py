@@ -0,0 +1,55 @@
+"""Tests for the persistent analysis result cache."""
+import time
+
+from unittest.mock import Mock
+
+from app.analysis_cache import AnalysisCache
+from app.analyze_news import ANALYSIS_MODEL
+
+
+def test_analyze_article_serves_repeat_analyses_from_cache(news_analyzer, mock_anthropic_client, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    mock_anthropic_client.messages.create.return_value.content = [Mock(text="Test analysis result")]
+    news_analyzer.cache = AnalysisCache(str(tmp_path / "cache.sqlite"))
+    article = {'title': 'Test Article', 'content': 'Chip demand  rises', 'source': 'test.com', 'url': 'http://test.com'}
+
+    first = news_analyzer.analyze_article(article, "semis")
+    # Same content (up to whitespace) under another title and source, from a new process
+    news_analyzer.cache = AnalysisCache(str(tmp_path / "cache.sqlite"))
+    second = news_analyzer.analyze_article({**article, 'title': 'Repost', 'content': 'Chip demand rises'}, "semis")
+    news_analyzer.analyze_article(article, "autos")
+
+    assert mock_anthropic_client.messages.create.call_count == 2
+    assert second == {**first, 'title': 'Repost', 'content': 'Chip demand rises'}
+    assert news_analyzer.cache.stats()["hits"] == 1 and news_analyzer.cache.stats()["misses"] == 2
+
+    mock_anthropic_client.messages.create.side_effect = RuntimeError("overloaded")
+    assert 'error' in news_analyzer.analyze_article({**article, 'content': 'other'}, "semis")
+    assert news_analyzer.cache.stats()["entries"] == 2  # failures are not cached
+
+
+def test_key_covers_context_model_and_prompt_version():
+    key = AnalysisCache.make_key("text", "semis", ANALYSIS_MODEL, 1)
+    assert key == AnalysisCache.make_key(" text\n", "semis ", ANALYSIS_MODEL, 1)
+    assert len({key, AnalysisCache.make_key("text", "autos", ANALYSIS_MODEL, 1),
+                AnalysisCache.make_key("text", "semis", "other-model", 1),
+                AnalysisCache.make_key("text", "semis", ANALYSIS_MODEL, 2)}) == 4
+
+
+def test_ttl_and_lru_eviction(tmp_path, monkeypatch):
+    cache = AnalysisCache(str(tmp_path / "cache.sqlite"), ttl_days=1, max_entries=3)
+    now = [1_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+
+    for i in range(3):
+        cache.put(f"k{i}", {"analysis": f"a{i}"})
+        now[0] += 1
+    assert cache.get("k0") == {"analysis": "a0"}  # k1 is now the least recently used
+    cache.put("k3", {"analysis": "a3"})
+    assert cache.get("k1") is None and cache.stats()["entries"] == 3
+
+    now[0] += 86400  # k0 and k2 are now more than a day old, k3 exactly one day
+    assert cache.get("k0") is None and cache.get("k3") == {"analysis": "a3"}
+    cache.put("k4", {"analysis": "a4"})
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 3, 2, 2)
@@ -0,0 +1,42 @@
+"""Tests for structured analysis validation."""
+import pytest
+
+from app.analysis_schema import empty_fields, structured_fields, validate_analysis
+
+VALID = {
+    "sentiment": "positive",
+    "sentiment_score": 0.8,
+    "key_facts": ["Revenue up 12%", " "],
+    "stakeholders": ["TSMC"],
+    "impact": {"market": 0.9, "technology": 0.4, "financial": 1},
+}
+
+
+def test_validate_analysis_normalizes_fields():
+    assert validate_analysis(VALID) == {
+        "sentiment": "POSITIVE",
+        "sentiment_score": 0.8,
+        "key_facts": ["Revenue up 12%"],
+        "stakeholders": ["TSMC"],
+        "impact": {"market": 0.9, "technology": 0.4, "financial": 1.0},
+    }
+
+
+@pytest.mark.parametrize("change", [
+    {"sentiment": "BULLISH"},
+    {"sentiment_score": 1.5},
+    {"sentiment_score": True},
+    {"key_facts": "Revenue up"},
+    {"impact": {"market": 0.9, "technology": 0.4}},
+    {"stakeholders": None},
+])
+def test_validate_analysis_rejects_schema_violations(change):
+    with pytest.raises(ValueError):
+        validate_analysis({**VALID, **change})
+    assert structured_fields({**VALID, **change}) == empty_fields()
+
+
+def test_missing_tool_call_gives_empty_fields():
+    with pytest.raises(ValueError, match="missing fields: impact"):
+        validate_analysis({k: v for k, v in VALID.items() if k != "impact"})
+    assert structured_fields(None) == empty_fields()
@@ -1,6 +1,13 @@
 """Tests for news analysis functionality."""
+import threading
+import time
+
 import pytest
-from app.analyze_news import NewsAnalyzer
+from unittest.mock import Mock
+from app import analyze_news
+from app.analysis_cache import AnalysisCache
+from app.analyze_news import NewsAnalyzer, first_section_complete
+from tests.fake_anthropic import FakeAnthropicServer
 
 def test_analyze_article(news_analyzer, mock_anthropic_client):
     # Setup mock response
@@ -24,3 +31,144 @@ def test_analyze_article(news_analyzer, mock_anthropic_client):
     assert result['source'] == 'test.com'
     assert result['analysis'] == "Test analysis result"
     assert 'error' not in result
+
+def test_analyze_articles_concurrently_keeps_order_and_isolates_errors(news_analyzer, mock_anthropic_client):
+    lock = threading.Lock()
+    in_flight = {"now": 0, "peak": 0}
+
+    def create(**kwargs):
+        text = kwargs["messages"][0]["content"][0]["text"]
+        with lock:
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+        try:
+            number = int(text.split("body ")[1].split("\n")[0])
+            time.sleep(0.01 * (6 - number))  # later articles finish first
+            if number == 2:
+                raise RuntimeError("overloaded")
+            return Mock(content=[Mock(text=f"analysis {number}")])
+        finally:
+            with lock:
+                in_flight["now"] -= 1
+
+    mock_anthropic_client.messages.create.side_effect = create
+    articles = [{'title': f'Article {i}', 'content': f'body {i}', 'url': f'http://test.com/{i}'} for i in range(6)]
+
+    results = news_analyzer.analyze_articles(articles, "Test context", max_concurrency=3)
+
+    assert [r['title'] for r in results] == [a['title'] for a in articles]
+    assert results[2]['error'] == "Analysis failed: overloaded"
+    assert [r['analysis'] for i, r in enumerate(results) if i != 2] == [f"analysis {i}" for i in (0, 1, 3, 4, 5)]
+    assert 1 < in_flight["peak"] <= 3
+
+def test_stream_articles_interleaves_deltas_and_reports_latency(news_analyzer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    reply = lambda params: "# Analysis\n## Sentiment\nPOSITIVE outlook for chips\n## Key facts\n- one\n- two"
+    articles = [{'title': f'Article {i}', 'content': f'body {i}', 'url': f'http://test.com/{i}'} for i in range(3)]
+
+    with FakeAnthropicServer(reply=reply, token_seconds=0.01) as server:
+        news_analyzer.client = server.client()
+        events = list(news_analyzer.stream_articles(articles, "Test context", max_concurrency=3))
+
+    deltas = [e['index'] for e in events if e['type'] == 'delta']
+    assert deltas != sorted(deltas)  # the three analyses stream side by side
+    done = {e['index']: e for e in events if e['type'] == 'done'}
+    assert sorted(done) == [0, 1, 2]
+    for index, event in done.items():
+        text = "".join(e['text'] for e in events if e['type'] == 'delta' and e['index'] == index)
+        assert event['result']['analysis'] == text == reply(None)
+        assert event['result']['title'] == f'Article {index}'
+        metrics = event['metrics']
+        assert 0 < metrics['ttft'] < metrics['first_section'] < metrics['total']
+
+
+def test_stream_article_reports_errors_in_the_done_event(news_analyzer, mock_anthropic_client):
+    mock_anthropic_client.messages.stream.side_effect = RuntimeError("overloaded")
+    events = list(news_analyzer.stream_article({'title': 'Test Article', 'content': 'Test content'}, "Test context"))
+    assert [e['type'] for e in events] == ['done']
+    assert events[0]['result']['error'] == "Analysis failed: overloaded"
+
+
+def test_first_section_complete():
+    assert not first_section_complete("# Analysis\n## Sentiment\nPOSI")
+    assert not first_section_complete("# Analysis\n## Sentiment\n")
+    assert first_section_complete("# Analysis\n## Sentiment\nPOSITIVE\n## Key")
+
+
+def test_structured_fields_are_extracted_at_analysis_time(news_analyzer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    findings = {"sentiment": "NEGATIVE", "sentiment_score": 0.2, "key_facts": ["Fab delayed"],
+                "stakeholders": ["Intel"], "impact": {"market": 0.7, "technology": 0.5, "financial": 0.6}}
+    reply = lambda params: [{"type": "text", "text": "## Sentiment\nNEGATIVE"},
+                            {"type": "tool_use", "name": "record_analysis", "input": findings}]
+    article = {'title': 'Test Article', 'content': 'Test content', 'url': 'http://test.com'}
+
+    with FakeAnthropicServer(reply=reply) as server:
+        news_analyzer.client = server.client()
+        result = news_analyzer.analyze_article(article, "Test context")
+        streamed = list(news_analyzer.stream_article(article, "Test context"))[-1]['result']
+
+    assert server.messages[0]["tools"][0]["name"] == "record_analysis"
+    for analysis in (result, streamed):
+        assert analysis['analysis'] == "## Sentiment\nNEGATIVE"
+        assert {k: analysis[k] for k in findings} == findings
+
+
+def test_analysis_cut_off_at_max_tokens_is_flagged_and_not_cached(news_analyzer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analyze_news, "ANALYSIS_MAX_TOKENS", 50)
+    news_analyzer.cache = AnalysisCache(str(tmp_path / "cache.sqlite"))
+    findings = {"sentiment": "POSITIVE", "sentiment_score": 0.8, "key_facts": [], "stakeholders": [],
+                "impact": {"market": 0.5, "technology": 0.5, "financial": 0.5}}
+    reply = lambda params: [{"type": "text", "text": "## Sentiment\nPOSITIVE\n" + "Demand rose. " * 40},
+                            {"type": "tool_use", "name": "record_analysis", "input": findings}]
+    article = {'title': 'Test Article', 'content': 'Test content', 'url': 'http://test.com'}
+
+    with FakeAnthropicServer(reply=reply) as server:
+        news_analyzer.client = server.client()
+        result = news_analyzer.analyze_article(article, "Test context")
+        streamed = list(news_analyzer.stream_article(article, "Test context"))[-1]
+
+    assert server.messages[0]["max_tokens"] == 50
+    assert len(server.messages) == 2  # the truncated analysis was not served from the cache
+    assert not streamed['metrics']['cached']
+    for analysis in (result, streamed['result']):
+        assert analysis['analysis'].startswith("## Sentiment\nPOSITIVE")
+        assert analysis['sentiment'] == "UNKNOWN" and analysis['impact'] == {}
+        assert "50-token limit" in analysis['extraction_error']
+        assert 'error' not in analysis
+
+
+def test_long_articles_are_condensed_per_chunk_then_analyzed(news_analyzer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analyze_news, "ANALYSIS_MAX_ARTICLE_TOKENS", 500)
+    monkeypatch.setattr(analyze_news, "ANALYSIS_CHUNK_TOKENS", 200)
+    monkeypatch.setattr(analyze_news, "ANALYSIS_RAW_CONTENT", True)
+    raw = "\n\n".join(f"## Section {i}\n" + f"Fab {i} output rose. " * 30 for i in range(6))
+    short = {'title': 'Short', 'content': 'Fab output rose.', 'raw_content': 'Fab output rose.', 'url': 'u1'}
+    long = {'title': 'Long', 'content': 'snippet', 'raw_content': raw, 'url': 'u2'}
+
+    def reply(params):
+        text = params["messages"][0]["content"]
+        return f"- notes on {text.split(':')[0]}" if isinstance(text, str) else "## Sentiment\nPOSITIVE"
+
+    with FakeAnthropicServer(reply=reply) as server:
+        news_analyzer.client = server.client()
+        assert 'error' not in news_analyzer.analyze_article(short, "Test context")
+        result = news_analyzer.analyze_article(long, "Test context")
+
+    chunk_calls = [p for p in server.messages if p["model"] == analyze_news.ANALYSIS_CHUNK_MODEL]
+    assert len(chunk_calls) == 6  # one chunk per section
+    final = server.messages[-1]["messages"][0]["content"][0]["text"]
+    assert server.messages[0]["messages"][0]["content"][0]["text"] == "News Article: Fab output rose.\nBusiness Context: Test context"
+    assert final.startswith("News Article (notes on its 6 parts, in order):")
+    assert "Part 6:\n- notes on Part 6 of 6" in final and "output rose" not in final
+    assert result['analysis'] == "## Sentiment\nPOSITIVE" and result['content'] == 'snippet'
+
+
+def test_search_content_is_analyzed_unless_raw_content_is_enabled(monkeypatch):
+    article = {'content': 'snippet', 'raw_content': 'whole page'}
+    assert analyze_news.article_text(article) == 'snippet'
+    monkeypatch.setattr(analyze_news, "ANALYSIS_RAW_CONTENT", True)
+    assert analyze_news.article_text(article) == 'whole page'
+    assert analyze_news.article_text({'content': 'snippet'}) == 'snippet'
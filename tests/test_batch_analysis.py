@@ -0,0 +1,97 @@
+"""Tests for the resumable batch analysis mode, run against the local fake batch server."""
+import json
+
+import pytest
+
+from app.analysis_cache import AnalysisCache
+from app.batch_analysis import request_id, run_batch_analysis
+from tests.fake_anthropic import FakeAnthropicServer
+
+
+def _articles(n):
+    return [{'title': f'Article {i}', 'content': f'body {i}', 'source': 'test.com', 'url': f'http://test.com/{i}'}
+            for i in range(n)]
+
+
+@pytest.fixture
+def analyzer(news_analyzer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # analysis files go to a scratch dir
+    return news_analyzer
+
+
+def test_batch_results_match_analyze_article_shape(analyzer, tmp_path):
+    articles = _articles(4)
+    with FakeAnthropicServer(polls_before_end=2) as server:
+        analyzer.client = server.client()
+        results = analyzer.analyze_articles_batch(articles, "semis", state_path=str(tmp_path / "state.json"),
+                                                  poll_interval=0)
+
+    assert len(server.submitted()) == 1
+    assert [r['title'] for r in results] == [a['title'] for a in articles]
+    assert [r['analysis'] for r in results] == [f"Analysis of: News Article: body {i}\nBusiness Context: semis"
+                                                for i in range(4)]
+    assert set(results[0]) == set(analyzer.analysis_result(articles[0], "text"))
+    assert next(iter(server.batches.values()))["requests"][0]["params"] == analyzer.analysis_request(articles[0], "semis")
+
+
+def test_retryable_failures_are_resubmitted_and_permanent_ones_reported(analyzer, tmp_path):
+    articles = _articles(5)
+    ids = [request_id(a, "semis") for a in articles]
+    failures = {ids[1]: "overloaded_error", ids[2]: "expired", ids[3]: "invalid_request_error"}
+
+    def fail(custom_id, attempt):
+        return failures.get(custom_id) if attempt == 1 else None
+
+    with FakeAnthropicServer(fail=fail) as server:
+        analyzer.client = server.client()
+        results = run_batch_analysis(analyzer, articles, "semis", state_path=str(tmp_path / "state.json"),
+                                     poll_interval=0)
+
+    assert server.submitted() == [ids, [ids[1], ids[2]]]
+    assert [('error' in r) for r in results] == [False, False, False, True, False]
+    assert results[3]['error'] == "Analysis failed: invalid_request_error"
+
+
+def test_rerun_resumes_in_flight_batch_and_skips_finished_articles(analyzer, tmp_path):
+    articles = _articles(3)
+    state_path = tmp_path / "state.json"
+    with FakeAnthropicServer(fail=lambda custom_id, attempt: "overloaded_error") as server:
+        analyzer.client = server.client()
+        run_batch_analysis(analyzer, articles[:2], "semis", state_path=str(state_path), poll_interval=0,
+                           max_rounds=1)
+
+        # Simulate a crash after submitting: the batch id is checkpointed before polling
+        server.fail = lambda custom_id, attempt: None
+        in_flight = analyzer.client.messages.batches.create(requests=[
+            {"custom_id": request_id(a, "semis"), "params": analyzer.analysis_request(a, "semis")}
+            for a in articles[:2]
+        ])
+        state = json.loads(state_path.read_text())
+        state["batch_id"] = in_flight.id
+        state_path.write_text(json.dumps(state))
+
+        results = run_batch_analysis(analyzer, articles, "semis", state_path=str(state_path), poll_interval=0)
+
+    ids = [request_id(a, "semis") for a in articles]
+    assert server.submitted() == [ids[:2], ids[:2], [ids[2]]]  # resumed the in-flight batch, then only the new article
+    assert all('error' not in r for r in results)
+    assert json.loads(state_path.read_text())["batch_id"] is None
+
+
+def test_batch_reads_and_fills_the_analysis_cache(analyzer, tmp_path):
+    analyzer.cache = AnalysisCache(str(tmp_path / "cache.sqlite"))
+    articles = _articles(3)
+    ids = [request_id(a, "semis") for a in articles]
+    with FakeAnthropicServer() as server:
+        analyzer.client = server.client()
+        interactive = analyzer.analyze_article(articles[0], "semis")
+        results = run_batch_analysis(analyzer, articles, "semis", state_path=str(tmp_path / "first.json"),
+                                     poll_interval=0)
+        cached = analyzer.analyze_article(articles[1], "semis")
+        rerun = run_batch_analysis(analyzer, articles, "semis", state_path=str(tmp_path / "second.json"),
+                                   poll_interval=0)
+
+    assert server.submitted() == [ids[1:]]  # article 0 came from the cache, the rerun from the batch results
+    assert len(server.messages) == 1  # only the first interactive analysis called the API
+    assert results[0]['analysis'] == interactive['analysis']
+    assert cached['analysis'] == results[1]['analysis'] == rerun[1]['analysis']
@@ -0,0 +1,84 @@
+"""Tests for chat request construction and streaming."""
+import threading
+
+from app import chat
+from app.chat import chat_request, stream_chat_response, with_sources
+from app.clients import messages_args
+from tests.fake_anthropic import FakeAnthropicServer
+
+
+def _articles(n):
+    return [{'title': f'Article {i}', 'content': f'Chip demand story {i}. ' * 40, 'analysis': 'POSITIVE ' * 50}
+            for i in range(n)]
+
+
+def test_chat_turns_share_a_cached_article_prefix():
+    articles = _articles(5)
+    history = []
+    with FakeAnthropicServer() as server:
+        client = server.client()
+        for turn in range(3):
+            question = f"Question {turn}?"
+            history.append({"role": "user", "content": question})
+            params = chat_request(question, articles, history)
+            history.append({"role": "assistant", "content": client.messages.create(**messages_args(params)).content[0].text})
+
+    assert [p["system"] for p in server.messages] == [server.messages[0]["system"]] * 3
+    assert [len(p["messages"]) for p in server.messages] == [1, 3, 5]
+    assert server.messages[2]["messages"][-1]["content"][0]["text"].endswith("Question 2?")
+    prefix = server.usage[0]["cache_creation_input_tokens"]
+    assert prefix > 1024
+    assert [u["cache_read_input_tokens"] for u in server.usage] == [0, prefix, prefix]
+
+
+def test_chat_history_window_starts_with_a_user_message():
+    history = [{"role": "user" if i % 2 == 0 else "assistant", "content": f"m{i}"} for i in range(8)]
+    params = chat_request("next", _articles(1), history + [{"role": "user", "content": "next"}])
+    assert [m["content"] for m in params["messages"][:-1]] == ["m4", "m5", "m6", "m7"]
+
+
+def test_large_article_sets_send_retrieved_passages_and_cite_sources():
+    articles = [{'title': f'Article {i}', 'url': f'http://test.com/{i}',
+                 'content': f'Chip demand story {i} with lithium prices. ' * 40 if i == 7 else f'Chip demand story {i}. ' * 40,
+                 'analysis': 'POSITIVE ' * 50} for i in range(100)]
+    first = chat_request("What about lithium prices?", articles, [])
+    second = chat_request("What changed for Article 42?", articles, [])
+
+    assert first["system"] == second["system"]  # only the instructions, the same for every question
+    context = first["messages"][-1]["content"][0]["text"]
+    assert "[8] Article 7 (content)" in context
+    assert len(context) < 40000
+    assert "Article 42" in second["messages"][-1]["content"][0]["text"]
+
+    answer = with_sources("Lithium prices rose [8], unlike [3] and [999].", articles)
+    assert answer.endswith("**Sources**\n- [3] [Article 2](http://test.com/2)\n- [8] [Article 7](http://test.com/7)")
+
+
+def test_stream_chat_response_yields_deltas_and_reports_speed(monkeypatch):
+    articles = _articles(2)
+    with FakeAnthropicServer(reply=lambda params: "Demand is rising [1]. " * 20, token_seconds=0.002) as server:
+        monkeypatch.setattr(chat, "get_anthropic_client", server.client)
+        events = list(stream_chat_response("Demand?", articles, []))
+
+    deltas = [e['text'] for e in events if e['type'] == 'delta']
+    done = events[-1]
+    assert len(deltas) > 1 and [e['type'] for e in events[len(deltas):]] == ['done']
+    assert done['text'] == with_sources("".join(deltas), articles)
+    metrics = done['metrics']
+    assert 0 < metrics['ttft'] < metrics['total'] and not metrics['cancelled']
+    assert metrics['tokens'] > 0 and metrics['tokens_per_sec'] > 0
+
+
+def test_cancelled_stream_stops_early_with_the_partial_reply(monkeypatch):
+    cancel = threading.Event()
+    with FakeAnthropicServer(reply=lambda params: "word " * 200, token_seconds=0.002) as server:
+        monkeypatch.setattr(chat, "get_anthropic_client", server.client)
+        events = []
+        for event in stream_chat_response("Demand?", _articles(1), [], cancel=cancel):
+            events.append(event)
+            if len(events) == 3:
+                cancel.set()
+
+    assert len(events) == 4
+    assert events[-1]['metrics']['cancelled']
+    assert events[-1]['text'] == "word " * 3
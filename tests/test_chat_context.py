@@ -0,0 +1,35 @@
+"""Tests for retrieving article passages as chat context."""
+from app.chat_context import PassageIndex, article_passages, get_passage_index
+
+TOPICS = ["lithium battery supply", "cloud data center spending", "foundry wafer capacity", "retail holiday sales",
+          "airline fuel hedging", "pharmaceutical drug pricing", "copper mining output", "streaming subscriber growth"]
+
+
+def _articles(n):
+    return [{'title': f'{TOPICS[i % len(TOPICS)].title()} report {i}', 'url': f'http://test.com/{i}',
+             'content': f"The {TOPICS[i % len(TOPICS)]} outlook changed this quarter. " * 60,
+             'analysis': f"## Sentiment\nNEUTRAL\n## Implications\nWatch {TOPICS[i % len(TOPICS)]} closely. " * 20}
+            for i in range(n)]
+
+
+def test_passages_cover_content_and_analysis_of_every_article():
+    passages = article_passages(_articles(3), max_tokens=100)
+    assert {p["source"] for p in passages} == {1, 2, 3}
+    assert {p["kind"] for p in passages} == {"content", "analysis"}
+    assert max(p["tokens"] for p in passages) <= 100
+
+
+def test_select_returns_relevant_passages_within_budget():
+    index = PassageIndex(_articles(40))
+    selected = index.select("What happened to copper mining output?", max_tokens=1000, max_passages=6)
+
+    assert 0 < len(selected) <= 6
+    assert sum(p["tokens"] for p in selected) <= 1000
+    assert all("copper" in p["title"].lower() for p in selected)
+    assert [p["source"] for p in selected] == sorted(p["source"] for p in selected)
+
+
+def test_index_is_reused_for_the_same_articles():
+    articles = _articles(5)
+    assert get_passage_index(articles) is get_passage_index([dict(a) for a in articles])
+    assert get_passage_index(articles[:4]) is not get_passage_index(articles)
@@ -0,0 +1,29 @@
+"""Tests for token-budgeted article chunking."""
+from app.chunking import chunk_text, count_tokens, split_sections
+
+
+def test_count_tokens():
+    assert count_tokens("") == 0
+    assert count_tokens("Revenue rose 12%.") == 6
+    assert count_tokens("internationalization") == 5
+
+
+def test_chunks_respect_the_budget_and_keep_all_text():
+    text = "\n\n".join(f"Paragraph {i}. " + "Demand for chips kept rising. " * (i % 7 + 1) for i in range(60))
+    chunks = chunk_text(text, 120)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 120 for chunk in chunks)
+    assert " ".join(" ".join(chunks).split()) == " ".join(text.split())
+
+
+def test_chunks_start_at_sections_and_split_long_paragraphs_between_sentences():
+    filing = ("ITEM 1. BUSINESS\n" + "We design chips. " * 20 + "\n\n"
+              "Item 7. Management's Discussion\n" + "Revenue grew strongly this year. " * 60 + "\n\n"
+              "Operator: Next question.\nJane Doe (Analyst): What about margins?")
+    assert [starts for starts, _ in split_sections(filing)] == [True, True, True, True]
+
+    chunks = chunk_text(filing, 150)
+    assert chunks[0].startswith("ITEM 1. BUSINESS") and "Item 7" not in chunks[0]
+    assert chunks[1].startswith("Item 7. Management's Discussion")
+    assert all(chunk.rstrip().endswith((".", "?")) for chunk in chunks)
+    assert all(count_tokens(chunk) <= 150 for chunk in chunks)
@@ -0,0 +1,99 @@
+"""Tests for the shared, pooled API clients."""
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import pytest
+
+from app import clients
+from app.clients import messages_args, new_anthropic_client, new_tavily_client, stream_attempts
+from app.scheduler import BULK, Scheduler
+from tests.fake_anthropic import FakeAnthropicServer
+
+REQUEST = {"model": "claude-test", "max_tokens": 10, "messages": [{"role": "user", "content": "Hello"}]}
+
+
+def test_one_shared_client_per_api_key(monkeypatch):
+    keys = {"ANTHROPIC_API_KEY": "key-a", "TAVILY_API_KEY": "tvly-a"}
+    monkeypatch.setattr(clients, "get_api_key", lambda name: keys[name])
+    monkeypatch.setattr(clients, "_shared_clients", {})
+
+    claude = clients.get_anthropic_client()
+    assert clients.get_anthropic_client() is claude
+    assert clients.get_tavily_client() is clients.get_tavily_client()
+    keys["ANTHROPIC_API_KEY"] = "key-b"
+    assert clients.get_anthropic_client() is not claude
+
+
+def test_reused_client_keeps_its_connection_alive():
+    with FakeAnthropicServer() as server:
+        client = new_anthropic_client("test", connections=2, base_url=server.url)
+        for _ in range(5):
+            client.messages.create(**REQUEST)
+        reused = server.connections
+        for _ in range(5):
+            new_anthropic_client("test", connections=2, base_url=server.url).messages.create(**REQUEST)
+
+    assert reused == 1
+    assert server.connections == 1 + 5
+
+
+def test_pool_caps_connections_at_its_size():
+    with FakeAnthropicServer(latency=0.05) as server:
+        client = new_anthropic_client("test", connections=2, base_url=server.url)
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(lambda _: client.messages.create(**REQUEST), range(12)))
+
+    assert len(server.messages) == 12
+    assert server.connections == 2
+
+
+def test_fields_the_sdk_does_not_take_are_sent_in_the_body():
+    with FakeAnthropicServer() as server:
+        client = new_anthropic_client("test", connections=1, base_url=server.url)
+        client.messages.create(**messages_args({**REQUEST, "temperature": 0.7}))
+        with client.messages.stream(**messages_args({**REQUEST, "temperature": 0}, stream=True)) as stream:
+            stream.get_final_message()
+
+    assert [params.get("temperature") for params in server.messages] == [0.7, 0]
+
+
+class _DroppedStream:
+    """Stream context yielding ``texts``, then losing the connection"""
+    def __init__(self, texts):
+        self.texts = texts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def text_stream(self):
+        yield from self.texts
+        raise ConnectionError("connection lost")
+
+
+def _stream_text(texts):
+    client, text = Mock(), ""
+    client.messages.stream.side_effect = lambda **kwargs: _DroppedStream(texts)
+    with pytest.raises(ConnectionError):
+        for attempt, opened in stream_attempts(client, Scheduler("test", backoff_base=0.001), REQUEST, BULK,
+                                               lambda: bool(text)):
+            with attempt, opened as stream:
+                for delta in stream.text_stream:
+                    text += delta
+    return client.messages.stream.call_count, text
+
+
+def test_streams_are_retried_only_before_their_first_text():
+    attempts, _ = _stream_text([])
+    assert attempts == Scheduler("test").max_attempts
+
+    attempts, text = _stream_text(["Demand ", "rose"])
+    assert attempts == 1 and text == "Demand rose"
+
+
+def test_tavily_session_pools_connections():
+    client = new_tavily_client("tvly-test", connections=4)
+    assert client.session.get_adapter("https://api.tavily.com")._pool_maxsize == 4
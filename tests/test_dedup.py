@@ -0,0 +1,49 @@
+"""Tests for ingest-time duplicate detection."""
+from app.dedup import NUM_PERM, minhash
+from app.rag_utils import VectorStore
+
+WIRE_STORY = (
+    "Shares of Acme Corp jumped 12 percent on Tuesday after the company reported third quarter "
+    "revenue of 4.2 billion dollars, beating analyst expectations, and raised its full year "
+    "guidance citing strong demand for its cloud software and a recovery in hardware sales."
+)
+
+def _similarity(a, b):
+    return (minhash(a) == minhash(b)).sum() / NUM_PERM
+
+def test_minhash_estimates_jaccard():
+    edited = "(Reuters) - " + WIRE_STORY + " Reporting by Jane Doe."
+    unrelated = "The central bank left interest rates unchanged and signalled two cuts later this year."
+
+    assert _similarity(WIRE_STORY, edited) >= 0.8
+    assert _similarity(WIRE_STORY, unrelated) < 0.2
+    assert not minhash("too short").any()
+
+def test_add_documents_drops_exact_and_near_duplicates(tmp_path):
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    first = store.add_documents([{'title': 'Acme', 'url': 'https://reuters.com/acme', 'content': WIRE_STORY}])
+    assert first == {'added': 1, 'duplicates': {'url': 0, 'content': 0, 'near': 0}}
+
+    report = store.add_documents([
+        {'title': 'Acme again', 'url': 'https://reuters.com/acme', 'content': 'refetched'},
+        {'title': 'Acme copy', 'url': 'https://yahoo.com/acme', 'content': WIRE_STORY.upper()},
+        {'title': 'Acme wire', 'url': 'https://cnbc.com/acme', 'content': WIRE_STORY + " (Reuters)"},
+        {'title': 'Rates', 'url': 'https://ft.com/rates', 'content': 'Central bank holds rates'},
+        {'title': 'Rates dup', 'url': 'https://ft.com/rates', 'content': 'Central bank holds rates'},
+    ])
+
+    assert report == {'added': 1, 'duplicates': {'url': 2, 'content': 1, 'near': 1}}
+    assert [d['title'] for d in store.metadata[:]] == ['Acme', 'Rates']
+
+def test_duplicates_detected_after_reopen(tmp_path):
+    VectorStore(index_dir=str(tmp_path), cache_size=0).add_documents(
+        [{'title': 'Acme', 'url': 'https://reuters.com/acme', 'content': WIRE_STORY}])
+
+    reopened = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    report = reopened.add_documents([{'title': 'Acme', 'url': 'https://other.com/x', 'content': WIRE_STORY}])
+
+    assert report['added'] == 0 and report['duplicates']['content'] == 1
+
+    edited = f"(Reuters) - {WIRE_STORY} Reporting by Jane Doe."
+    report = reopened.add_documents([{'title': 'Acme', 'url': 'https://other.com/y', 'content': edited}])
+    assert report['duplicates']['near'] == 1
@@ -0,0 +1,67 @@
+"""Tests for the BM25 inverted index and hybrid search."""
+import math
+import pytest
+from app.lexical_index import LexicalIndex, reciprocal_rank_fusion, tokenize
+from app.rag_utils import VectorStore
+
+TEXTS = [f"Apple Q3 revenue {i} beat estimates as $AAPL rose {i % 7}" if i % 5 == 0
+         else f"oil prices {i} per barrel as OPEC output {i % 11} held" for i in range(320)]
+
+
+def _bm25(texts, query, k):
+    docs = [tokenize(t) for t in texts]
+    average = sum(map(len, docs)) / len(docs)
+    scores = {}
+    for term in dict.fromkeys(tokenize(query)):
+        df = sum(term in d for d in docs)
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(docs):
+            tf = d.count(term)
+            if tf:
+                norm = 1.2 * (1 - 0.75 + 0.75 * len(d) / average)
+                scores[i] = scores.get(i, 0.0) + idf * tf * 2.2 / (tf + norm)
+    return sorted(scores, key=lambda i: (-scores[i], i))[:k]
+
+
+def test_bm25_matches_reference_across_runs_segments_and_reopen(tmp_path):
+    index = LexicalIndex(str(tmp_path))
+    for start in range(0, 150, 23):
+        index.add(start, TEXTS[start:min(start + 23, 150)])
+    index.flush()
+    index.add(150, TEXTS[150:300])
+    index.flush()  # second segment is merged into the first
+    index.add(300, TEXTS[300:])  # still in memory
+    assert len(index.segments) == 1
+
+    for query in ["aapl q3 revenue", "opec barrel 17", "rose 3"]:
+        scores, ids = index.search(query, k=8)
+        assert ids.tolist() == _bm25(TEXTS, query, 8)
+
+    reopened = LexicalIndex(str(tmp_path))
+    assert len(reopened) == 300
+    reopened.add(300, TEXTS[300:])
+    assert reopened.search("aapl q3", k=8)[1].tolist() == _bm25(TEXTS, "aapl q3", 8)
+
+
+def test_reciprocal_rank_fusion():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]], k=3) == [1, 3, 2]
+
+
+def test_hybrid_search_finds_exact_tokens(tmp_path):
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    docs = [{'title': f'Market wrap {i}', 'url': f'https://example.com/{i}',
+             'content': f'stocks and bonds moved as investors weighed rates and earnings, session {i}'}
+            for i in range(40)]
+    docs.append({'title': 'Zentrix guidance', 'url': 'https://example.com/zx',
+                 'content': 'ZXQ raised guidance; Q3 revenue grew 14% on strong bookings'})
+    store.add_documents(docs)
+
+    assert store.search("ZXQ Q3 revenue", k=1, mode="lexical")[0]['url'] == 'https://example.com/zx'
+    assert store.search("ZXQ Q3 revenue", k=3, mode="hybrid")[0]['url'] == 'https://example.com/zx'
+    assert store.search("ZXQ", k=3, mode="lexical", sources="other.com") == []
+    with pytest.raises(ValueError):
+        store.search("ZXQ", mode="keyword")
+
+    # Not checkpointed: the lexical index is rebuilt from the WAL on reopen
+    reopened = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    assert reopened.search("ZXQ", k=1, mode="lexical")[0]['url'] == 'https://example.com/zx'
@@ -0,0 +1,75 @@
+"""Tests for the reader-writer lock."""
+import threading
+import time
+
+from app.locks import ReadWriteLock
+
+
+def test_readers_share_and_writers_exclude():
+    lock = ReadWriteLock()
+    inside = []
+    peak = {"readers": 0, "writers_with_others": 0}
+    guard = threading.Lock()
+
+    def reader():
+        for _ in range(50):
+            with lock.read():
+                with guard:
+                    inside.append("r")
+                    peak["readers"] = max(peak["readers"], inside.count("r"))
+                time.sleep(0.0005)
+                with guard:
+                    inside.remove("r")
+
+    def writer():
+        for _ in range(20):
+            with lock.write():
+                with guard:
+                    if inside:
+                        peak["writers_with_others"] += 1
+                    inside.append("w")
+                time.sleep(0.0005)
+                with guard:
+                    inside.remove("w")
+
+    threads = [threading.Thread(target=reader) for _ in range(4)] + [threading.Thread(target=writer) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak["readers"] > 1
+    assert peak["writers_with_others"] == 0
+
+
+def test_waiting_writer_is_not_starved():
+    lock = ReadWriteLock()
+    reader_in = threading.Event()
+    release_reader = threading.Event()
+    order = []
+
+    def long_reader():
+        with lock.read():
+            reader_in.set()
+            release_reader.wait()
+
+    def writer():
+        with lock.write():
+            order.append("writer")
+
+    def late_reader():
+        with lock.read():
+            order.append("late reader")
+
+    first = threading.Thread(target=long_reader)
+    first.start()
+    reader_in.wait()
+    w = threading.Thread(target=writer)
+    w.start()
+    time.sleep(0.05)  # let the writer queue up
+    late = threading.Thread(target=late_reader)
+    late.start()
+    time.sleep(0.05)
+    release_reader.set()
+    for thread in (first, w, late):
+        thread.join()
+    assert order == ["writer", "late reader"]
@@ -0,0 +1,55 @@
+"""Tests for the columnar metadata store."""
+import pickle
+from app.metadata_store import MetadataStore, article_id, tickers_of
+from app.rag_utils import VectorStore
+
+def test_columns_and_lazy_records(tmp_path):
+    store = MetadataStore(str(tmp_path))
+    store.extend([
+        {'title': 'A', 'url': 'https://www.reuters.com/a', 'published_date': '2024-10-14T12:00:00Z'},
+        {'title': 'B', 'url': 'https://bloomberg.com/b', 'source': 'Bloomberg.com'},
+    ])
+
+    reopened = MetadataStore(str(tmp_path))
+
+    assert len(reopened) == 2
+    assert reopened[1]['title'] == 'B'
+    assert list(reopened.column("timestamp")) == [1728907200, 0]
+    assert [reopened.sources[i] for i in reopened.column("source_id")] == ['reuters.com', 'bloomberg.com']
+    assert reopened.column("article_id")[0] == article_id({'url': 'https://www.reuters.com/a'})
+
+def test_partial_append_is_trimmed_on_open(tmp_path):
+    store = MetadataStore(str(tmp_path))
+    store.extend([{'title': 'A'}, {'title': 'B'}])
+    store.close()
+    # Simulate a crash after only some columns of a third row were written
+    with open(tmp_path / "article_id.bin", "ab") as f:
+        f.write(b"\0" * 8)
+
+    reopened = MetadataStore(str(tmp_path))
+    reopened.extend([{'title': 'C'}])
+
+    assert [d['title'] for d in reopened[:]] == ['A', 'B', 'C']
+
+def test_legacy_pickle_is_migrated(tmp_path):
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    docs = [{'title': f'Doc {i}', 'content': f'article number {i}'} for i in range(3)]
+    store.add_documents(docs)
+    store.save()
+    store.metadata.close()
+    # Rebuild the directory layout of an older release
+    for path in (tmp_path / "metadata").iterdir():
+        path.unlink()
+    with open(tmp_path / "meta.pkl", "wb") as f:
+        pickle.dump(docs, f)
+
+    migrated = VectorStore(index_dir=str(tmp_path), cache_size=0)
+
+    assert [d['title'] for d in migrated.metadata[:]] == ['Doc 0', 'Doc 1', 'Doc 2']
+    assert not (tmp_path / "meta.pkl").exists()
+    assert migrated.search("article number 2", k=1)[0]['title'] == 'Doc 2'
+
+def test_tickers_from_tags_and_text():
+    doc = {'title': 'Apple rallies', 'tickers': ['aapl'],
+           'content': 'Apple (NASDAQ: AAPL) and Nvidia (Nasdaq:NVDA) rose; $TSLA fell, while US$5 was unchanged.'}
+    assert tickers_of(doc) == ['AAPL', 'NVDA', 'TSLA']
@@ -0,0 +1,391 @@
+"""Tests for the local embedding backend and vector store."""
+import threading
+
+import numpy as np
+import pytest
+from app.embeddings import get_embedder
+from app.rag_utils import VectorStore, get_vector_store
+
+@pytest.fixture
+def vector_store(tmp_path):
+    return VectorStore(index_dir=str(tmp_path / "faiss_index"))
+
+def test_hashing_embedder_batch_shape_and_norm():
+    embedder = get_embedder("hashing", 256)
+    vectors = embedder.embed(["Apple beats Q3 revenue estimates", "Oil prices fall", ""])
+
+    assert vectors.shape == (3, 256)
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0, atol=1e-5)
+    assert not vectors[2].any()
+    # Batching must not change a text's embedding
+    assert np.allclose(embedder.embed(["Oil prices fall"])[0], vectors[1])
+
+def test_hashing_embedder_similarity():
+    embedder = get_embedder("hashing", 1536)
+    a, b, c = embedder.embed([
+        "Nvidia reports record data center revenue driven by AI chips",
+        "AI chip demand lifts Nvidia data center revenue to a record",
+        "Central bank holds interest rates steady amid inflation worries",
+    ])
+    assert a @ b > a @ c
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_embedder("does-not-exist")
+
+def test_vector_store_add_and_search(vector_store):
+    vector_store.add_documents([
+        {'title': 'Chips', 'content': 'Nvidia AI chip sales surge on data center demand'},
+        {'title': 'Rates', 'content': 'Federal Reserve keeps interest rates unchanged'},
+    ])
+
+    results = vector_store.search("interest rates decision by the Fed", k=5)
+
+    assert [r['title'] for r in results] == ['Rates', 'Chips']
+
+def test_embedding_cache_hits_across_instances(tmp_path):
+    index_dir = str(tmp_path / "faiss_index")
+    store = VectorStore(index_dir=index_dir)
+    first = store._get_embeddings(["Tesla deliveries beat estimates", "Oil  prices fall"])
+    assert store.embedding_cache.stats()["misses"] == 2
+
+    # A new instance (e.g. a Streamlit rerun) reads the same on-disk cache
+    rerun = VectorStore(index_dir=index_dir)
+    second = rerun._get_embeddings(["Oil prices fall", "Tesla deliveries beat estimates"])
+    stats = rerun.embedding_cache.stats()
+
+    assert stats["hits"] == 2 and stats["misses"] == 2
+    assert np.array_equal(second, first[::-1])
+
+def test_embedding_cache_evicts_least_recently_used(tmp_path):
+    from app.embedding_cache import EmbeddingCache
+    cache = EmbeddingCache(str(tmp_path), dim=4, capacity=2)
+    keys = [EmbeddingCache.make_key(t, "test", 4) for t in ("a", "b", "c")]
+    cache.put_many(keys[:2], np.eye(4, dtype=np.float32)[:2])
+    cache.get_many([keys[0]])  # "a" is now more recent than "b"
+    cache.put_many([keys[2]], np.eye(4, dtype=np.float32)[2:3])
+
+    _, missing = cache.get_many(keys)
+
+    assert missing == [1]
+    assert cache.stats()["evictions"] == 1
+
+def test_embedding_cache_instances_sharing_a_directory_never_return_a_reused_slot(tmp_path):
+    from app.embedding_cache import EmbeddingCache
+    first = EmbeddingCache(str(tmp_path), dim=4, capacity=1)
+    second = EmbeddingCache(str(tmp_path), dim=4, capacity=1)
+    a, b = (EmbeddingCache.make_key(t, "test", 4) for t in ("a", "b"))
+    first.put_many([a], np.eye(4, dtype=np.float32)[:1])
+    second.put_many([b], np.eye(4, dtype=np.float32)[1:2])  # evicts "a" from the shared slot
+
+    _, missing = first.get_many([a])
+    vectors, _ = second.get_many([b])
+
+    assert missing == [0]
+    assert np.array_equal(vectors[0], np.eye(4)[1])
+    assert first.stats()["hits"] == 1  # the stats live in the shared files
+
+def _docs(n):
+    topics = ["chip", "oil", "bank", "retail", "auto", "pharma", "airline", "crypto"]
+    return [{'title': f'Doc {i}', 'content': f'{topics[i % 8]} news item {i} about {topics[(i * 3) % 8]} markets'}
+            for i in range(n)]
+
+def test_ivf_index_trains_once_enough_vectors(tmp_path):
+    from app import ann_index
+    store = VectorStore(index_dir=str(tmp_path), index_type="ivf_flat", nlist=4, cache_size=0)
+    store.add_documents(_docs(100))
+    assert ann_index.index_type_of(store.index) == "flat"
+
+    store.add_documents(_docs(200)[100:])
+
+    assert ann_index.index_type_of(store.index) == "ivf_flat"
+    assert store.index.ntotal == 200
+    assert store.search(_docs(200)[42]['content'], k=1, nprobe=4)[0]['title'] == 'Doc 42'
+
+def test_auto_sized_ivf_index_is_retrained_as_the_corpus_grows(tmp_path, monkeypatch):
+    from app import ann_index
+    monkeypatch.setattr(ann_index, "MIN_POINTS_PER_CENTROID", 1)  # train on a few dozen vectors
+    store = VectorStore(index_dir=str(tmp_path), index_type="ivf_flat", nlist=None, cache_size=0)
+    store.add_documents(_docs(20))
+    assert ann_index.nlist_of(store.index) == ann_index.auto_nlist(20)
+
+    store.add_documents(_docs(60)[20:])  # 3x: not yet worth retraining
+    assert ann_index.nlist_of(store.index) == ann_index.auto_nlist(20)
+
+    store.add_documents(_docs(80)[60:])  # 4x
+    assert ann_index.nlist_of(store.index) == ann_index.auto_nlist(80)
+    assert store.index.ntotal == 80
+    assert store.search(_docs(80)[42]['content'], k=1, nprobe=64)[0]['title'] == 'Doc 42'
+
+    reopened = VectorStore(index_dir=str(tmp_path), index_type="ivf_flat", nlist=None, cache_size=0)
+    assert ann_index.nlist_of(reopened.index) == ann_index.auto_nlist(80)
+
+def test_existing_index_migrates_to_hnsw(tmp_path):
+    from app import ann_index
+    flat = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    flat.add_documents(_docs(50))
+    expected = [r['title'] for r in flat.search("oil markets", k=3)]
+
+    hnsw = VectorStore(index_dir=str(tmp_path), index_type="hnsw", cache_size=0)
+
+    assert ann_index.index_type_of(hnsw.index) == "hnsw"
+    assert hnsw.index.ntotal == 50
+    assert [r['title'] for r in hnsw.search("oil markets", k=3, ef_search=128)] == expected
+
+def test_add_documents_appends_to_wal_without_rewriting_index(tmp_path):
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    store.add_documents(_docs(20))
+    store.save()
+    index_mtime = (tmp_path / "news.idx").stat().st_mtime_ns
+
+    store.add_documents(_docs(30)[20:])
+
+    assert (tmp_path / "news.idx").stat().st_mtime_ns == index_mtime
+    assert store.wal.pending_docs == 10
+    reopened = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    assert reopened.ntotal == 30 and len(reopened.metadata) == 30
+    assert reopened.metadata[25]['title'] == 'Doc 25'
+
+def test_wal_recovery_discards_torn_tail_and_partial_checkpoint(tmp_path):
+    import faiss
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    store.add_documents(_docs(10))
+    store.save()
+    store.add_documents(_docs(15)[10:])
+    # Crash mid-checkpoint: news.idx was renamed into place, meta.pkl and the WAL were not touched
+    faiss.write_index(store.index, str(tmp_path / "news.idx"))
+    # ...followed by a torn write at the end of the log
+    with open(tmp_path / "wal.log", "ab") as f:
+        f.write(b"WAL1\x05\x00")
+
+    recovered = VectorStore(index_dir=str(tmp_path), cache_size=0)
+
+    assert recovered.ntotal == len(recovered.metadata) == 15
+    assert [d['title'] for d in recovered.metadata[10:]] == [f'Doc {i}' for i in range(10, 15)]
+    assert not (tmp_path / "wal.log").read_bytes().endswith(b"WAL1\x05\x00")
+    recovered.add_documents(_docs(16)[15:])
+    assert VectorStore(index_dir=str(tmp_path), cache_size=0).ntotal == 16
+
+def _news(n, offset=0):
+    sources = ["https://www.reuters.com/a", "https://bloomberg.com/b", "https://cnbc.com/c"]
+    tickers = ["AAPL", "MSFT", "NVDA", "JPM"]
+    return [{'title': f'Story {i}', 'url': f'{sources[i % 3]}/{i}',
+             'published_date': f'2024-03-{1 + i % 28:02d}T12:00:00Z',
+             'content': f'markets story {i} on earnings (NASDAQ: {tickers[i % 4]}) and outlook {i * 7}'}
+            for i in range(offset, offset + n)]
+
+
+@pytest.mark.parametrize("exact_max", [0, 10_000])
+def test_filtered_search_returns_k_matching_documents(tmp_path, monkeypatch, exact_max):
+    monkeypatch.setattr("app.rag_utils.EXACT_FILTER_MAX", exact_max)
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0, index_type="ivf_flat", nlist=4)
+    store.add_documents(_news(300))
+
+    results = store.search("markets earnings", k=10, sources="reuters.com",
+                           published_after="2024-03-10", published_before="2024-03-20")
+    assert len(results) == 10
+    for doc in results:
+        assert "reuters.com" in doc["url"]
+        assert "2024-03-10" <= doc["published_date"] < "2024-03-20"
+
+    results = store.search("markets earnings", k=5, tickers=["nvda"], sources=["www.cnbc.com"])
+    assert len(results) == 5
+    assert all("NVDA" in doc["content"] and "cnbc.com" in doc["url"] for doc in results)
+
+    # Rows added after the filter index was built are still filtered correctly
+    store.add_documents(_news(12, offset=300))
+    results = store.search("markets", k=50, tickers="JPM", published_after="2024-03-28")
+    assert sorted(doc["title"] for doc in results) == sorted(
+        doc["title"] for doc in _news(312) if "JPM" in doc["content"] and doc["published_date"] >= "2024-03-28")
+    assert store.search("markets", sources="unknown.example") == []
+
+
+def test_search_many_matches_individual_searches(tmp_path):
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0)
+    store.add_documents(_news(60))
+    queries = ["earnings outlook", "AAPL story 12", "markets story 41 outlook 287"]
+
+    batched = store.search_many(queries, k=3, sources="bloomberg.com")
+    assert batched == [store.search(q, k=3, sources="bloomberg.com") for q in queries]
+    assert store.search_many([]) == []
+
+
+@pytest.mark.parametrize("compression", ["fp16", "sq8"])
+def test_compressed_index_with_reranking(tmp_path, compression):
+    docs = _news(1200)
+    baseline = VectorStore(index_dir=str(tmp_path / "flat"), cache_size=0)
+    baseline.add_documents(docs)
+    store = VectorStore(index_dir=str(tmp_path / compression), cache_size=0, compression=compression)
+    store.add_documents(docs)
+
+    stats = store.memory_stats()
+    assert stats['compression'] == compression and stats['documents'] == 1200
+    assert stats['bytes_per_doc'] == {"fp16": 2, "sq8": 1}[compression] * 1536
+    assert baseline.memory_stats()['bytes_per_doc'] == 4 * 1536
+
+    # Synthetic stories tie a lot, so compare exact distances rather than ids
+    def distances(vector_store, query):
+        hits = vector_store.search(query, k=5)
+        vectors = baseline.embedder.embed([doc['content'] for doc in hits])
+        return ((vectors - baseline.embedder.embed([query])) ** 2).sum(axis=1)
+
+    queries = ["NVDA earnings outlook", "markets story 77", "AAPL outlook 35"]
+    expected = [distances(baseline, q) for q in queries]
+    assert all(np.allclose(distances(store, q), e, atol=1e-5) for q, e in zip(queries, expected))
+
+    # Exact vectors survive a reopen and stay aligned with the index
+    reopened = VectorStore(index_dir=str(tmp_path / compression), cache_size=0, compression=compression)
+    assert len(reopened.exact_vectors) == reopened.index.ntotal == 1200
+    assert all(np.allclose(distances(reopened, q), e, atol=1e-5) for q, e in zip(queries, expected))
+
+
+def test_shared_store_reused_until_changed_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.rag_utils._shared_stores", {})
+    index_dir = str(tmp_path)
+    shared = get_vector_store(index_dir)
+    shared.add_documents(_news(5))
+    assert get_vector_store(index_dir) is shared
+
+    # Another process checkpoints new documents into the same directory
+    writer = VectorStore(index_dir=index_dir, cache_size=0)
+    writer.add_documents(_news(5, offset=5))
+    writer.save()
+
+    reloaded = get_vector_store(index_dir)
+    assert reloaded is not shared
+    assert shared.metadata._blob.closed
+    assert len(reloaded.metadata) == 10
+    assert get_vector_store(index_dir) is reloaded
+
+
+def test_shared_store_is_not_reloaded_during_its_own_ingest(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.rag_utils._shared_stores", {})
+    index_dir = str(tmp_path)
+    shared = get_vector_store(index_dir)
+    shared.add_documents(_news(2))
+    appended, publish = threading.Event(), threading.Event()
+    append = shared.wal.append
+
+    def slow_append(*args):
+        append(*args)
+        appended.set()
+        publish.wait(5)  # the WAL is on disk, the batch not yet published
+
+    monkeypatch.setattr(shared.wal, "append", slow_append)
+    ingest = threading.Thread(target=shared.add_documents, args=(_news(3, offset=2),))
+    ingest.start()
+    assert appended.wait(5)
+    assert get_vector_store(index_dir) is shared
+    publish.set()
+    ingest.join()
+
+    assert get_vector_store(index_dir) is shared
+    reopened = VectorStore(index_dir=index_dir, cache_size=0)
+    assert reopened.index.ntotal == len(reopened.metadata) == 5
+
+
+def test_concurrent_searches_and_ingests_see_consistent_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.rag_utils.CHECKPOINT_MIN_DOCS", 60)
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0, index_type="ivf_flat", nlist=4)
+    store.add_documents(_news(40))
+    errors = []
+    writers_done = threading.Event()
+
+    def write(offset):
+        try:
+            for batch in range(10):
+                store.add_documents(_news(20, offset=offset + batch * 20))
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            while not writers_done.is_set():
+                for mode in ("vector", "lexical", "hybrid"):
+                    for row in store.search_many(["markets earnings", "outlook"], k=5, mode=mode, tickers="NVDA"):
+                        # Every hit is a fully published row that matches the filter
+                        assert all("(NASDAQ: NVDA)" in doc["content"] for doc in row)
+                with store.lock.read():
+                    assert store.index.ntotal == len(store.metadata) == len(store.lexical)
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(offset,)) for offset in (1000, 2000)]
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+
+    assert not errors, errors
+    assert len(store.metadata) == store.index.ntotal == 440
+    reopened = VectorStore(index_dir=str(tmp_path), cache_size=0, index_type="ivf_flat", nlist=4)
+    assert len(reopened.metadata) == 440
+
+
+def test_search_does_not_wait_for_ingest_embedding(tmp_path):
+    class SlowEmbedder:
+        name, dim = "slow", 64
+
+        def __init__(self):
+            self.inner = get_embedder("hashing", 64)
+            self.embedding_batch = threading.Event()
+            self.release = threading.Event()
+
+        def embed(self, texts):
+            if len(texts) > 1:  # document batches, not single queries
+                self.embedding_batch.set()
+                self.release.wait(5)
+            return self.inner.embed(texts)
+
+    embedder = SlowEmbedder()
+    store = VectorStore(index_dir=str(tmp_path), cache_size=0, embedder=embedder)
+    embedder.release.set()
+    store.add_documents(_news(10))
+    embedder.release.clear()
+    embedder.embedding_batch.clear()
+
+    ingest = threading.Thread(target=store.add_documents, args=(_news(10, offset=10),))
+    ingest.start()
+    assert embedder.embedding_batch.wait(5)
+    assert len(store.search("markets outlook", k=3)) == 3  # answered while the ingest is stuck
+    embedder.release.set()
+    ingest.join()
+    assert len(store.metadata) == 20
+
+
+@pytest.mark.parametrize("index_type,compression", [("flat", "none"), ("hnsw", "sq8"), ("ivf_flat", "none")])
+def test_memory_mapped_index_is_searchable_and_copied_on_write(tmp_path, index_type, compression):
+    options = dict(cache_size=0, index_type=index_type, nlist=4, compression=compression)
+    store = VectorStore(index_dir=str(tmp_path), mmap=False, **options)
+    store.add_documents(_news(1200))
+    store.save()
+    queries = ["markets earnings outlook", "story 17"]
+    expected = [[d["url"] for d in row] for row in store.search_many(queries, k=5)]
+
+    mapped = VectorStore(index_dir=str(tmp_path), mmap=True, **options)
+    assert mapped._index_mapped
+    assert [[d["url"] for d in row] for row in mapped.search_many(queries, k=5)] == expected
+
+    # The first write swaps in an in-memory copy instead of touching the mapping
+    mapped.add_documents(_news(5, offset=5000))
+    assert not mapped._index_mapped
+    new_doc = _news(1, offset=5003)[0]
+    assert mapped.index.ntotal == 1205
+    assert mapped.search(new_doc["content"], k=1)[0]["title"] == "Story 5003"
+
+    # Replaying the WAL keeps the checkpoint mapped, with the tail in a delta searched next to it
+    replayed = VectorStore(index_dir=str(tmp_path), mmap=True, **options)
+    assert replayed._index_mapped
+    assert replayed.index.ntotal == 1200 and replayed.ntotal == 1205
+    assert replayed.search(new_doc["content"], k=1)[0]["title"] == "Story 5003"
+    assert replayed.search(new_doc["content"], k=1, tickers="JPM")[0]["title"] == "Story 5003"
+    assert [len(row) for row in replayed.search_many(queries, k=5)] == [5, 5]
+    replayed.add_documents(_news(1, offset=6000))
+    assert not replayed._index_mapped and replayed.index.ntotal == 1206
+    replayed.save()
+    assert len(VectorStore(index_dir=str(tmp_path), mmap=True, **options).metadata) == 1206
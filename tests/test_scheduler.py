@@ -0,0 +1,96 @@
+"""Tests for the shared API scheduler: rate budgets, priority lanes, adaptive concurrency and retries."""
+import threading
+import time
+
+import pytest
+from tavily.errors import UsageLimitExceededError
+
+from app.scheduler import BULK, INTERACTIVE, Scheduler, TokenBucket, is_retryable, is_throttle
+from tests.fake_anthropic import FakeAnthropicServer
+
+
+def _articles(n):
+    return [{'title': f'Article {i}', 'content': f'body {i}', 'source': 'test.com', 'url': f'http://test.com/{i}'}
+            for i in range(n)]
+
+
+@pytest.fixture
+def analyzer(news_analyzer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # analysis files go to a scratch dir
+    return news_analyzer
+
+
+def test_token_bucket_refills_at_its_per_minute_rate():
+    now = [0.0]
+    bucket = TokenBucket(60, clock=lambda: now[0])  # one unit per second
+
+    assert bucket.delay(60) == 0
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1.0)
+    now[0] = 30.0
+    assert bucket.delay(30) == 0
+    assert bucket.delay(40) == pytest.approx(10.0)
+    assert bucket.delay(500) == pytest.approx(30.0)  # larger than the bucket: waits for a full one
+
+
+def test_interactive_calls_are_admitted_before_queued_bulk_calls():
+    scheduler = Scheduler("test", max_concurrency=1)
+    order = []
+
+    def run(name, priority):
+        with scheduler.slot(priority):
+            order.append(name)
+
+    with scheduler.slot(BULK):
+        threads = [threading.Thread(target=run, args=("bulk", BULK))]
+        threads[0].start()
+        while scheduler.stats()["queued"] < 1:
+            time.sleep(0.001)
+        threads.append(threading.Thread(target=run, args=("chat", INTERACTIVE)))
+        threads[1].start()
+        while scheduler.stats()["queued"] < 2:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+
+    assert order == ["chat", "bulk"]
+
+
+def test_throttled_analyses_are_retried_and_concurrency_backs_off(analyzer):
+    analyzer.scheduler = Scheduler("test", max_concurrency=8, backoff_base=0.02)
+    with FakeAnthropicServer(latency=0.05, max_in_flight=2) as server:
+        analyzer.client = server.client()
+        results = analyzer.analyze_articles(_articles(8), "semis", max_concurrency=8)
+
+    stats = analyzer.scheduler.stats()
+    assert [('error' in r) for r in results] == [False] * 8
+    assert server.throttled > 0 and stats["throttled"] == server.throttled
+    assert stats["retries"] == server.throttled
+    assert stats["limit"] < 8
+
+
+def test_overloaded_stream_is_retried_before_its_first_token(analyzer):
+    analyzer.scheduler = Scheduler("test", max_concurrency=4, backoff_base=0.02)
+    with FakeAnthropicServer(latency=0.05, max_in_flight=1, throttle_status=529) as server:
+        analyzer.client = server.client()
+        done = [event for event in analyzer.stream_articles(_articles(3), "semis", max_concurrency=3)
+                if event['type'] == 'done']
+
+    assert len(done) == 3 and not any('error' in event['result'] for event in done)
+    assert server.throttled > 0 and server.peak_in_flight == 1
+
+
+def test_client_errors_are_not_retried(analyzer):
+    with FakeAnthropicServer(context_window=100) as server:
+        analyzer.client = server.client()
+        result = analyzer.analyze_article(_articles(1)[0], "semis")
+
+    assert "prompt is too long" in result['error']
+    assert analyzer.scheduler.stats()["calls"] == 1
+    assert analyzer.scheduler.stats()["retries"] == 0
+
+
+def test_tavily_usage_limit_counts_as_throttling():
+    error = UsageLimitExceededError("rate limit")
+    assert is_throttle(error) and is_retryable(error)
+    assert not is_retryable(ValueError("bad query"))
@@ -0,0 +1,112 @@
+"""Tests for the time-sharded vector store."""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from app.rag_utils import VectorStore
+from app.sharded_store import ShardedVectorStore, shard_bounds, shard_start
+
+
+def _article(i, published):
+    return {'title': f'Story {i}', 'url': f'https://reuters.com/{i}', 'published_date': published,
+            'content': f'markets story {i} on chip earnings and guidance {i * 13}'}
+
+
+def _march(n):
+    # 2024-03-04 is a Monday: days 4-10 and 11-17 are two weekly shards
+    return [_article(i, f'2024-03-{4 + i % 14:02d}T12:00:00Z') for i in range(n)]
+
+
+def test_shard_periods():
+    ts = int(datetime(2024, 3, 7, 15, tzinfo=timezone.utc).timestamp())
+    assert shard_start(ts, "day").strftime("%Y%m%d") == "20240307"
+    assert shard_start(ts, "week").strftime("%Y%m%d") == "20240304"
+    assert shard_start(ts, "month").strftime("%Y%m%d") == "20240301"
+    start, end = shard_bounds("20240201", "month")
+    assert end - start == 29 * 86400
+
+
+def test_documents_routed_to_weekly_shards(tmp_path):
+    store = ShardedVectorStore(index_dir=str(tmp_path), period="week", cache_size=0)
+    report = store.add_documents(_march(56))
+
+    assert report["added"] == 56
+    assert store.shard_names() == ["20240304", "20240311"]
+    with pytest.raises(ValueError):
+        ShardedVectorStore(index_dir=str(tmp_path), period="day", cache_size=0)
+
+
+def test_search_only_touches_overlapping_shards(tmp_path):
+    store = ShardedVectorStore(index_dir=str(tmp_path), period="week", cache_size=0)
+    store.add_documents(_march(56))
+    store.save()
+
+    reopened = ShardedVectorStore(index_dir=str(tmp_path), period="week", cache_size=0)
+    results = reopened.search("chip earnings", k=5, published_after="2024-03-12", published_before="2024-03-14")
+    assert len(results) == 5
+    assert all("2024-03-12" <= r["published_date"] < "2024-03-14" for r in results)
+    # The first week was never opened
+    assert reopened._shards["20240304"] is None
+
+
+@pytest.mark.parametrize("mode", ["vector", "lexical", "hybrid"])
+def test_merged_results_match_unsharded_store(tmp_path, mode):
+    documents = _march(56)
+    sharded = ShardedVectorStore(index_dir=str(tmp_path / "sharded"), period="week", cache_size=0)
+    sharded.add_documents(documents)
+    single = VectorStore(index_dir=str(tmp_path / "single"), cache_size=0)
+    single.add_documents(documents)
+
+    queries = ["story 7 chip earnings", "guidance 91"]
+    got = sharded.search_many(queries, k=5, mode="vector" if mode == "hybrid" else mode)
+    expected = single.search_many(queries, k=5, mode="vector" if mode == "hybrid" else mode)
+    if mode == "vector":
+        # Synthetic articles tie on distance, so compare distances rather than ids
+        def distances(query, row):
+            vectors = single.embedder.embed([d["content"] for d in row])
+            return np.round(((vectors - single.embedder.embed([query])[0]) ** 2).sum(axis=1), 5).tolist()
+        assert [distances(q, row) for q, row in zip(queries, got)] == \
+            [distances(q, row) for q, row in zip(queries, expected)]
+    else:
+        # BM25 statistics are per shard; the exact-token match still ranks first
+        assert [row[0]["url"] for row in got] == [row[0]["url"] for row in expected]
+    assert all(len(row) == 5 for row in sharded.search_many(queries, k=5, mode=mode))
+
+
+def test_retention_evicts_expired_shards(tmp_path):
+    today = datetime.now(timezone.utc)
+    recent = [_article(i, (today - timedelta(days=i)).isoformat()) for i in range(3)]
+    old = [_article(100 + i, (today - timedelta(days=40 + i)).isoformat()) for i in range(3)]
+
+    store = ShardedVectorStore(index_dir=str(tmp_path), period="day", retention_days=30, cache_size=0)
+    report = store.add_documents(recent + old)
+    assert report["added"] == 3 and report["expired"] == 3
+    assert len(store.shard_names()) == 3
+
+    # 29 days later the oldest day has aged out and its directory is gone
+    oldest = store.shard_names()[0]
+    evicted = store.evict_expired(now=time.time() + 29 * 86400)
+    assert evicted == [oldest]
+    assert not os.path.exists(os.path.join(store.shards_dir, oldest))
+    assert all("Story 2" != r["title"] for r in store.search("markets story", k=10))
+
+
+def test_duplicates_are_detected_across_shards(tmp_path, monkeypatch):
+    store = ShardedVectorStore(index_dir=str(tmp_path), period="day", cache_size=0)
+    undated = {'title': 'Chip outlook', 'url': 'https://reuters.com/chips', 'content': 'chip makers raise guidance'}
+    assert store.add_documents([undated])["added"] == 1
+
+    # The same search result fetched two days later goes to another ingest-day shard
+    later = time.time() + 2 * 86400
+    monkeypatch.setattr("app.sharded_store.time.time", lambda: later)
+    report = store.add_documents([undated, {**undated, 'url': 'https://reuters.com/chips-copy'}])
+
+    assert report["added"] == 0
+    assert report["duplicates"] == {"url": 1, "content": 1, "near": 0}
+    assert len(store.shard_names()) == 1
+    assert len(store.search("chip makers guidance", k=10)) == 1
+    # Reopening rebuilds the check from the shards on disk
+    reopened = ShardedVectorStore(index_dir=str(tmp_path), period="day", cache_size=0)
+    assert reopened.add_documents([undated])["added"] == 0